@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for update_alt_text_from_csv.py (no external deps)
+
+Generates a synthetic corpus shaped like the real page JSON (page.image, a
+contentpic block with imageSrc and TipTap prose holding image nodes, plus a
+past-prime-ministers/ subfolder) and a matching alt-text CSV, then times each
+stage of the updater and an end-to-end run.
+
+How to run:
+  python bench_alt_text_updater.py
+  python bench_alt_text_updater.py --files 5000 --depth 4 --images 12 --csv-rows 20000
+  python bench_alt_text_updater.py --save bench.json        # record the numbers
+  python bench_alt_text_updater.py --baseline bench.json    # exit 1 if a stage got slower than the tolerance
+  python bench_alt_text_updater.py --keep ./bench-corpus    # keep the generated corpus for inspection
+
+Stages (per-file stages are summed over all files):
+  csv_load   build the AltMatcher from the CSV
+  read       read each file as text
+  parse      json.loads
+  walk       alt/src update pass (no pruning)
+  prune      duplicate-shape prune pass
+  serialize  json.dumps(indent=2)
+  write      write the serialized document to a scratch copy
+  report     write the summary JSON and flat CSV report
+  end_to_end update_alts_rel() writing a scratch copy of the corpus (a real
+             write run; the copy is made before the clock starts)
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import update_alt_text_from_csv as updater  # noqa: E402
+
+PER_FILE_STAGES = ("read", "parse", "walk", "prune", "serialize", "write")
+
+FIRST_NAMES = ["chan", "chee", "david", "desmond", "edwin", "gan", "jeffrey", "lee", "goh", "tan",
+               "vivian", "grace", "indranee", "josephine", "ong", "masagos", "lawrence", "faishal"]
+LAST_NAMES = ["chun-sing", "hong-tat", "neo", "lee", "tong", "kim-yong", "siow", "hsien-loong",
+              "chok-tong", "see-leng", "balakrishnan", "fu", "rajah", "teo", "ye-kung", "zulkifli"]
+WORDS = ("the minister chairs council community youth education public service national "
+         "committee singapore cohesive society development students learning").split()
+
+# ---------------- Corpus generator ----------------
+
+def _image_names(rng: random.Random, count: int) -> list:
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(FIRST_NAMES)}-{rng.choice(LAST_NAMES)}-{rng.randrange(10 ** 6)}")
+    return sorted(names)
+
+def _write_csv(path: Path, names: list, rng: random.Random) -> list:
+    """Write a CSV mixing the shapes seen in real exports; return the srcs it covers."""
+    known_srcs = []
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        for i, name in enumerate(names):
+            alt = f"Portrait of {name.replace('-', ' ').title()}, {' '.join(rng.sample(WORDS, 4))}"
+            kind = i % 4
+            if kind == 0:    # 3-column: new relative path, alt, original link
+                orig = f"https://www.example.gov.sg/-/media/cabinet/{name}.ashx"
+                w.writerow([f"/images/the-cabinet/updated/{name}.jpg", alt, orig])
+                known_srcs.append(orig)
+            elif kind == 1:  # 2-column relative path
+                w.writerow([f"updated/{name}.jpg", alt])
+                known_srcs.append(f"/images/the-cabinet/updated/{name}.jpg")
+            elif kind == 2:  # 2-column absolute path
+                w.writerow([f"/images/past-ministers/{name}.png", alt])
+                known_srcs.append(f"/images/past-ministers/{name}.png")
+            else:            # 2-column CMS export name, matched by slug
+                pretty = name.rsplit("-", 1)[0].replace("-", " ").title()
+                w.writerow([f"{pretty}_20250523 jpg.png", alt])
+                known_srcs.append(f"/images/the-cabinet/{name.rsplit('-', 1)[0]}.jpg")
+    return known_srcs
+
+def _text(rng: random.Random) -> dict:
+    return {"type": "text", "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 40)))}
+
+def _prose(rng: random.Random, depth: int, images: list) -> dict:
+    """TipTap prose; images are spread over paragraphs, nested up to depth levels."""
+    content = []
+    for _ in range(rng.randint(2, 4)):
+        content.append({"type": "paragraph", "attrs": {"dir": "ltr"}, "content": [_text(rng)]})
+    for src in images:
+        node = {"type": "image", "attrs": {"src": src, "alt": ""}}
+        for _ in range(rng.randint(0, depth)):
+            node = {"type": "blockquote", "content": [node, {"type": "paragraph", "content": [_text(rng)]}]}
+        content.insert(rng.randint(0, len(content)), node)
+    return {"type": "prose", "content": content}
+
+def generate_corpus(
+    root: Path,
+    *,
+    files: int = 500,
+    depth: int = 3,
+    images: int = 6,
+    csv_rows: int = 1000,
+    hit_ratio: float = 0.7,
+    seed: int = 1,
+) -> None:
+    """Write alt-text-output.csv and jsonFiles/ under root."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    json_root = root / "jsonFiles"
+    (json_root / "past-prime-ministers").mkdir(parents=True, exist_ok=True)
+    known = _write_csv(root / "alt-text-output.csv", _image_names(rng, csv_rows), rng)
+    unknown = [f"/images/misc/{n}.jpg" for n in _image_names(rng, max(1, csv_rows // 4))]
+
+    def pick() -> str:
+        return rng.choice(known) if known and rng.random() < hit_ratio else rng.choice(unknown)
+
+    for i in range(files):
+        slug = f"page-{i:06d}"
+        title = " ".join(rng.sample(WORDS, 3)).title()
+        hero = pick()
+        inline = [pick() for _ in range(max(0, images - 2))]
+        split = len(inline) // 2
+        doc = {
+            "page": {
+                "contentPageHeader": {"summary": title, "showThumbnail": False},
+                "title": title,
+                "permalink": f"/pmo-speed-run/{slug}",
+                "lastModified": "2025-09-09T13:14:23.544Z",
+                "image": {"alt": "", "src": hero},
+            },
+            "layout": "content",
+            "content": [
+                {
+                    "type": "contentpic",
+                    "content": _prose(rng, depth, inline[:split]),
+                    "imageAlt": "",
+                    "imageSrc": hero,
+                },
+                _prose(rng, depth, inline[split:]),
+            ],
+            "version": "0.1.0",
+        }
+        folder = json_root / "past-prime-ministers" if i % 10 == 9 else json_root
+        (folder / f"{slug}.json").write_text(json.dumps(doc, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+# ---------------- Timing ----------------
+
+def _rates(seconds: float, files: int, nbytes: int) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "files_per_sec": round(files / seconds, 1) if seconds > 0 else None,
+        "mb_per_sec": round(nbytes / seconds / 1e6, 2) if seconds > 0 else None,
+    }
+
+def run_stages(root: Path, *, rewrite_src: bool, workers: int) -> dict:
+    csv_path = root / "alt-text-output.csv"
+    json_root = root / "jsonFiles"
+    paths = sorted(json_root.rglob("*.json"))
+    total_bytes = sum(p.stat().st_size for p in paths)
+    clock = time.perf_counter
+
+    t = clock()
+    matcher = updater.AltMatcher.from_csv(csv_path)
+    csv_seconds = clock() - t
+
+    spent = dict.fromkeys(PER_FILE_STAGES, 0.0)
+    details = {}
+    scratch = Path(tempfile.mkdtemp(prefix="alt-bench-out-"))
+    try:
+        for path in paths:
+            t0 = clock()
+            raw = path.read_text(encoding="utf-8")
+            t1 = clock()
+            data = json.loads(raw)
+            t2 = clock()
+            updates = []
+            updater.walk_image_nodes(data, matcher, rewrite_src=rewrite_src, updates=updates, prune=False)
+            t3 = clock()
+            updater.walk_image_nodes(data, None)
+            t4 = clock()
+            out = json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+            t5 = clock()
+            (scratch / path.name).write_text(out, encoding="utf-8")
+            t6 = clock()
+            for name, a, b in zip(PER_FILE_STAGES, (t0, t1, t2, t3, t4, t5), (t1, t2, t3, t4, t5, t6)):
+                spent[name] += b - a
+            if updates:
+                details[str(path)] = list(dict.fromkeys(updates))
+
+        t = clock()
+        report = updater.ReportWriter(scratch)
+        for fpath, triples in details.items():
+            report.add(fpath, triples)
+        report.close()
+        summary = {"csv": str(csv_path), "json_root": str(json_root), "details_file": str(report.details_path)}
+        updater.write_reports(scratch, summary)
+        report_seconds = clock() - t
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    # End to end, through the real entry point: a write run on a scratch copy,
+    # so the corpus stays unchanged for the next repeat
+    scratch = Path(tempfile.mkdtemp(prefix="alt-bench-e2e-"))
+    try:
+        shutil.copytree(json_root, scratch / "jsonFiles")
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = clock()
+            updater.update_alts_rel(
+                dry_run=False,
+                rewrite_src=rewrite_src,
+                workers=workers,
+                csv_sources=[csv_path],
+                json_root=scratch / "jsonFiles",
+                reports_dir=scratch / "reports",
+            )
+            e2e_seconds = clock() - t
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    stages = {"csv_load": _rates(csv_seconds, len(paths), csv_path.stat().st_size)}
+    for name in PER_FILE_STAGES:
+        stages[name] = _rates(spent[name], len(paths), total_bytes)
+    stages["report"] = _rates(report_seconds, len(paths), total_bytes)
+    stages["end_to_end"] = _rates(e2e_seconds, len(paths), total_bytes)
+    return {
+        "files": len(paths),
+        "bytes": total_bytes,
+        "changed_files": len(details),
+        "updates": sum(len(v) for v in details.values()),
+        "stages": stages,
+    }
+
+def best_of(results: list) -> dict:
+    """Keep the fastest time per stage across repeats (least disturbed by noise)."""
+    best = dict(results[0])
+    best["stages"] = {
+        name: min((r["stages"][name] for r in results), key=lambda s: s["seconds"])
+        for name in results[0]["stages"]
+    }
+    return best
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Return a line per stage whose files/sec fell more than tolerance below baseline."""
+    regressions = []
+    for name, base in baseline.get("stages", {}).items():
+        cur = current["stages"].get(name)
+        if not cur or not base.get("files_per_sec") or not cur.get("files_per_sec"):
+            continue
+        ratio = cur["files_per_sec"] / base["files_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{name}: {cur['files_per_sec']} files/s vs baseline {base['files_per_sec']} ({ratio:.0%})")
+    return regressions
+
+def print_table(result: dict) -> None:
+    print("Alt-text Updater benchmark")
+    print("--------------------------")
+    print(f"Corpus:     {result['files']} files, {result['bytes'] / 1e6:.1f} MB, "
+          f"{result['changed_files']} changed, {result['updates']} updates")
+    print(f"{'stage':<12}{'seconds':>10}{'files/s':>12}{'MB/s':>10}")
+    for name, s in result["stages"].items():
+        print(f"{name:<12}{s['seconds']:>10.3f}{s['files_per_sec'] or 0:>12.1f}{s['mb_per_sec'] or 0:>10.2f}")
+
+# ---------------- Runner ----------------
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the alt-text updater on a synthetic corpus.")
+    ap.add_argument("--files", type=int, default=500, help="number of page JSON files (default 500)")
+    ap.add_argument("--depth", type=int, default=3, help="max extra nesting around inline images (default 3)")
+    ap.add_argument("--images", type=int, default=6, help="image references per page (default 6)")
+    ap.add_argument("--csv-rows", type=int, default=1000, help="rows in the alt-text CSV (default 1000)")
+    ap.add_argument("--hit-ratio", type=float, default=0.7, help="share of srcs the CSV covers (default 0.7)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=3, help="runs per stage; the best is kept (default 3)")
+    ap.add_argument("--rewrite-src", action="store_true", help="benchmark with ALT_REWRITE_SRC behaviour")
+    ap.add_argument("--workers", type=int, default=1, help="workers for the end-to-end run (default 1)")
+    ap.add_argument("--keep", type=Path, help="generate the corpus here and keep it")
+    ap.add_argument("--save", type=Path, help="write results as JSON to this file")
+    ap.add_argument("--baseline", type=Path, help="compare against results saved with --save")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown vs baseline (default 0.15)")
+    args = ap.parse_args(argv)
+
+    params = {k: getattr(args, k) for k in ("files", "depth", "images", "csv_rows", "hit_ratio", "seed",
+                                             "rewrite_src", "workers")}
+    root = args.keep or Path(tempfile.mkdtemp(prefix="alt-bench-"))
+    try:
+        generate_corpus(root, files=args.files, depth=args.depth, images=args.images,
+                        csv_rows=args.csv_rows, hit_ratio=args.hit_ratio, seed=args.seed)
+        runs = [run_stages(root, rewrite_src=args.rewrite_src, workers=args.workers)
+                for _ in range(max(1, args.repeat))]
+    finally:
+        if args.keep is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    result = best_of(runs)
+    result["params"] = params
+    result["python"] = sys.version.split()[0]
+    print_table(result)
+
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved:      {args.save}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("params") != params:
+            print("[WARN] Baseline was recorded with different corpus parameters")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"Baseline:   no stage slower than {args.tolerance:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Load test for the alt-text HTTP service (no external deps)
+
+Posts page JSON files to POST /apply from several concurrent keep-alive
+connections and reports throughput and latency percentiles (p50/p90/p99/max).
+
+How to run:
+  python update_alt_text_from_csv.py --serve 8765 &                 # in another terminal
+  python loadtest_alt_service.py --url http://127.0.0.1:8765 --concurrency 8 --requests 5000
+  python loadtest_alt_service.py --spawn                            # start (and stop) a service itself
+  python loadtest_alt_service.py --spawn --csv my.csv --json-root pages/ --save load.json
+
+Request bodies are the *.json files under --json-root (default: jsonFiles/ next
+to this script), sent round-robin. Latency is measured per request, from send
+to the last byte of the response.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+HERE = Path(__file__).resolve().parent
+
+def load_bodies(json_root: Path, limit: int) -> list:
+    """Up to limit valid JSON files (invalid ones would only measure the 400 path)."""
+    bodies = []
+    for p in sorted(json_root.rglob("*.json")):
+        raw = p.read_bytes()
+        try:
+            json.loads(raw)
+        except ValueError:
+            continue
+        bodies.append(raw)
+        if len(bodies) >= limit:
+            break
+    return bodies
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+def run_load(url: str, bodies: list, *, concurrency: int, requests: int, warmup: int) -> dict:
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    path = (parts.path.rstrip("/") or "") + "/apply"
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine, failed = [], []
+        try:
+            while True:
+                i = next(counter)
+                if i >= warmup + requests:
+                    break
+                body = bodies[i % len(bodies)]
+                t = time.perf_counter()
+                try:
+                    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                    resp = conn.getresponse()
+                    resp.read()
+                    status = resp.status
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    conn = http.client.HTTPConnection(host, port, timeout=30)
+                    status = repr(e)
+                elapsed = time.perf_counter() - t
+                if i < warmup:
+                    continue
+                if status == 200:
+                    mine.append(elapsed)
+                else:
+                    failed.append(status)
+        finally:
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+                errors.extend(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda s: round(s * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": str(errors[0]) if errors else None,
+        "requests_per_sec": round((len(latencies) + len(errors)) / wall, 1) if wall > 0 else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p90": ms(percentile(latencies, 90)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else 0.0,
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        },
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def spawn_service(csv: list) -> tuple:
+    """Start update_alt_text_from_csv.py --serve on a free port; returns (process, url)."""
+    port = _free_port()
+    cmd = [sys.executable, str(HERE / "update_alt_text_from_csv.py"), "--serve", f"127.0.0.1:{port}"]
+    for c in csv or ():
+        cmd += ["--csv", c]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Service exited early (code {proc.returncode})")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc, url
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise SystemExit("Service did not start within 30s")
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Load-test the alt-text HTTP service.")
+    ap.add_argument("--url", default="http://127.0.0.1:8765", help="service base URL (default %(default)s)")
+    ap.add_argument("--spawn", action="store_true", help="start a service on a free port for the test")
+    ap.add_argument("--csv", action="append", help="CSV for --spawn (repeatable; default: the service's own)")
+    ap.add_argument("--json-root", type=Path, default=HERE / "jsonFiles", help="request bodies (default jsonFiles/)")
+    ap.add_argument("--max-files", type=int, default=1000, help="distinct bodies to load (default 1000)")
+    ap.add_argument("--concurrency", type=int, default=8, help="parallel connections (default 8)")
+    ap.add_argument("--requests", type=int, default=2000, help="measured requests (default 2000)")
+    ap.add_argument("--warmup", type=int, default=100, help="unmeasured requests first (default 100)")
+    ap.add_argument("--save", type=Path, help="write results as JSON to this file")
+    args = ap.parse_args(argv)
+
+    bodies = load_bodies(args.json_root, args.max_files)
+    if not bodies:
+        print(f"No *.json request bodies under {args.json_root}")
+        return 1
+
+    proc = None
+    url = args.url
+    if args.spawn:
+        proc, url = spawn_service(args.csv)
+    try:
+        result = run_load(url, bodies, concurrency=args.concurrency, requests=args.requests, warmup=args.warmup)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    result["params"] = {"url": url, "bodies": len(bodies), "concurrency": args.concurrency,
+                        "requests": args.requests, "warmup": args.warmup}
+
+    lat = result["latency_ms"]
+    print(f"Requests:   {result['requests']} ok, {result['errors']} errors "
+          f"({args.concurrency} connections, {len(bodies)} distinct bodies)")
+    print(f"Throughput: {result['requests_per_sec']} req/s")
+    print(f"Latency:    p50 {lat['p50']} ms   p90 {lat['p90']} ms   p99 {lat['p99']} ms   max {lat['max']} ms")
+    if result["first_error"]:
+        print(f"[WARN] First error: {result['first_error']}")
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved:      {args.save}")
+    return 1 if result["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,8 +6,9 @@ set -euo pipefail
 : "${ALT_DRY_RUN:=1}"        # always preview
 : "${ALT_BACKUP:=0}"         # no backup needed for dry-run
 : "${ALT_REWRITE_SRC:=1}"    # preview src rewrites by default
+: "${ALT_PREVIEW:=html}"     # reports/alt-text-preview.html: every changed field, before and after
 
-export ALT_DRY_RUN ALT_BACKUP ALT_REWRITE_SRC
+export ALT_DRY_RUN ALT_BACKUP ALT_REWRITE_SRC ALT_PREVIEW
 
 # Prefer python3, fallback to python
 if command -v python3 >/dev/null 2>&1; then PY=python3; else PY=python; fi
@@ -0,0 +1,951 @@
+"""
+Tests for update_alt_text_from_csv.py (run with: python -m pytest -q)
+
+  - walk_image_nodes against a verbatim copy of the baseline update-then-prune
+    passes, on randomized nested documents;
+  - the HTTP service's answers to good and bad /apply requests;
+  - the streaming rewrite (bytes, updates and ops) against the in-memory path,
+    with chunks small enough to split every token;
+  - JSON Lines batch mode and the numeric ALT_* environment variables;
+  - whole runs over a small tree: sharded and merged, parallel, pipelined,
+    streamed, incremental, and without dedupe or prefilter, each against a
+    plain serial run; CSV precedence, snapshot restore, and watch and targeted
+    runs with several CSVs.
+"""
+
+import copy
+import csv
+import hashlib
+import http.client
+import json
+import random
+import re
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+
+import pytest
+
+import update_alt_text_from_csv as alt
+
+CSV_ROWS = [
+    ["image", "alt", "orig"],
+    ["/images/new/alpha-one.jpg", "Alt for alpha-one é", "https://cms.example.com/-/media/alpha-one.ashx?h=1"],
+    ["/images/rel/beta_two.png", "Alt for beta_two"],
+    ["Gamma Three 2024 jpg.png", "Slug alt gamma"],
+    ["/images/new/delta.jpg", "Alt for \"delta\"", "https://cms.example.com/-/media/delta.ashx"],
+    ["/images/rel/eps-ilon.png", "Alt for eps-ilon"],
+]
+
+# Mapped by path, filename, slug and original link, plus srcs no row knows
+SRCS = [
+    "/images/new/alpha-one.jpg", "https://cms.example.com/-/media/alpha-one.ashx", "/misc/alpha-one.png",
+    "/images/rel/beta_two.png", "/x/beta_two.webp?w=1#f", "/media/gamma-three.jpg",
+    "https://cms.example.com/-/media/delta.ashx", "/images/new/delta.jpg", "/images/rel/eps-ilon.png",
+    "/images/unknown.png", "/docs/readme.txt", "",
+]
+
+def _write_csv(path: Path, rows: List[List[str]]) -> Path:
+    path.write_text("\n".join(",".join(json.dumps(c) if "," in c or '"' in c else c for c in row)
+                              for row in rows) + "\n", encoding="utf-8")
+    return path
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return _write_csv(tmp_path / "alt-text-output.csv", CSV_ROWS)
+
+@pytest.fixture
+def matcher(csv_path):
+    return alt.AltMatcher.from_csv(csv_path)
+
+# ------------- Reference: the baseline two-pass walk -------------
+# Verbatim from the baseline update_alt_text_from_csv.py, before walk_image_nodes:
+# the CSV loader, the matching helpers, the recursive update pass and the
+# recursive prune pass that followed it. Nothing is shared with the code under test.
+
+def norm_url(u: str) -> str:
+    if not u:
+        return ""
+    parts = urlsplit(u)
+    normalized = unquote(parts.scheme + "://" + parts.netloc + parts.path if parts.scheme else parts.path)
+    return normalized
+
+def path_only(u: str) -> str:
+    """Return decoded URL path only (no scheme/host/query/fragment)."""
+    try:
+        return unquote(urlsplit(u or "").path or "")
+    except Exception:
+        return u or ""
+
+def is_image_path(p: str) -> bool:
+    p = (p or "").lower()
+    return any(p.endswith(ext) for ext in (".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg"))
+
+def basename(p: str) -> str:
+    try:
+        return Path(norm_url(p)).name
+    except Exception:
+        return p or ""
+
+def to_slug(s: str) -> str:
+    s = (s or "").lower()
+    s = re.sub(r"\.[a-z0-9]+$", "", s)   # remove extension
+    s = re.sub(r"[0-9]", "", s)          # remove digits
+    s = re.sub(r"[^a-z]+", "", s)        # keep letters only
+    return s
+
+def load_alt_mapping(csv_path: Path) -> Tuple[
+    Dict[str, str],  # by_relpath: path -> alt
+    Dict[str, str],  # by_basename: filename -> alt
+    Dict[str, str],  # by_slug: slug -> alt
+    Dict[str, Tuple[str, str]],  # by_orig_map: orig_path -> (new_rel_path, alt)
+    Dict[str, str],  # alt_by_origpath: orig_path -> alt
+    Dict[str, str],  # alt_by_origbase: orig_basename -> alt
+]:
+    """
+    Returns mappings for matching:
+      - by_relpath: normalized relative path (e.g., /images/x.jpg) -> alt
+      - by_basename: basename (e.g., x.jpg) -> alt
+      - by_slug: fuzzy slug (letters only) -> alt
+      - by_orig_map: original link path (e.g., /-//media/.../x.ashx) -> (new_relative_path, alt)
+      - alt_by_origpath: original link path -> alt
+      - alt_by_origbase: original link basename -> alt
+
+    CSV accepted formats:
+      2 columns (no header required):
+        col0: image name/path/url
+        col1: alt
+      3 columns:
+        col0: new relative path (for rewrite), e.g. /photos/.../x.jpg
+        col1: alt
+        col2: original link (url or path), e.g. https://.../x.ashx
+    """
+    by_relpath, by_basename, by_slug = {}, {}, {}
+    by_orig_map: Dict[str, Tuple[str, str]] = {}
+    alt_by_origpath, alt_by_origbase = {}, {}
+
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found: {csv_path}")
+
+    with csv_path.open(newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        rows = list(reader)
+
+    if not rows:
+        return by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase
+
+    # Detect and skip a header-like first row
+    start_idx = 0
+    if len(rows[0]) >= 2 and ("alt" in (rows[0][1] or "").lower() or "image" in (rows[0][0] or "").lower()):
+        start_idx = 1
+
+    for row in rows[start_idx:]:
+        if not row or len(row) < 2:
+            continue
+
+        # 2-column mode
+        if len(row) == 2 or (len(row) >= 3 and not (row[2] or "").strip()):
+            raw_path = (row[0] or "").strip()
+            alt = (row[1] or "").strip()
+            if not raw_path or not alt:
+                continue
+
+            parts = urlsplit(raw_path)
+            rel = parts.path if parts.scheme else raw_path
+            rel = path_only(rel)
+
+            # Map by exact relative path if it looks like an image path or starts with /
+            if rel and (rel.startswith("/") or is_image_path(rel)):
+                by_relpath[rel] = alt
+
+            b = basename(raw_path)
+            if b:
+                by_basename[b.lower()] = alt
+                sl = to_slug(b)
+                if sl:
+                    by_slug[sl] = alt
+
+        # 3-column mode: [new_rel_path, alt, original_link]
+        else:
+            new_rel = path_only((row[0] or "").strip())
+            alt = (row[1] or "").strip()
+            orig_raw = (row[2] or "").strip()
+            orig_path = path_only(orig_raw)
+            if not alt or not orig_path:
+                continue
+
+            # record mapping from original path -> alt
+            alt_by_origpath[orig_path] = alt
+            ob = basename(orig_raw)
+            if ob:
+                alt_by_origbase[ob.lower()] = alt
+
+            # if new_rel exists, set mapping for rewrite and also allow normal matching by rel
+            if new_rel:
+                by_orig_map[orig_path] = (new_rel, alt)
+                if new_rel.startswith("/") or is_image_path(new_rel):
+                    by_relpath[new_rel] = alt
+
+            # also add filename/slug variants for convenience
+            if new_rel:
+                b = basename(new_rel)
+            else:
+                b = basename(orig_raw)
+            if b:
+                by_basename[b.lower()] = alt
+                sl = to_slug(b)
+                if sl:
+                    by_slug[sl] = alt
+
+    return by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase
+
+def _tiptap_has_attrs_src(node: dict) -> bool:
+    return isinstance(node.get("attrs"), dict) and "src" in node["attrs"]
+
+def set_alt_in_node(node: Any, alt: str, *, force: bool = False) -> bool:
+    """
+    Update only the existing shape:
+      - TipTap: node.type=="image" with attrs.src -> update attrs.alt
+      - Top-level image node: node.type=="image" with src -> update node.alt
+      - page.image{src,alt}, imageSrc/imageAlt, or plain src/alt pairs
+    Never create attrs if it didn't exist.
+    """
+    changed = False
+    if not isinstance(node, dict):
+        return False
+
+    # Prefer explicit image-node handling
+    if node.get("type") == "image":
+        if _tiptap_has_attrs_src(node):
+            attrs = dict(node["attrs"])
+            if attrs.get("alt") != alt:
+                attrs["alt"] = alt
+                node["attrs"] = attrs
+                changed = True
+            return changed
+        elif "src" in node and (force or is_image_path(str(node.get("src")))):
+            if node.get("alt") != alt:
+                node["alt"] = alt
+                changed = True
+            return changed
+        # fall through to other shapes if neither applies
+
+    # Case 1: page.image.src / page.image.alt
+    if "image" in node and isinstance(node["image"], dict) and "src" in node["image"]:
+        if node["image"].get("alt") != alt:
+            node["image"]["alt"] = alt
+            changed = True
+
+    # Case 2: sibling keys imageSrc/imageAlt
+    if "imageSrc" in node:
+        if node.get("imageAlt") != alt:
+            node["imageAlt"] = alt
+            changed = True
+
+    # Case 3: plain src/alt pair
+    if "src" in node and (force or is_image_path(str(node.get("src")))):
+        if node.get("alt") != alt:
+            node["alt"] = alt
+            changed = True
+
+    return changed
+
+def set_src_and_alt_in_node(node: Any, new_src: str, alt: str) -> bool:
+    """
+    Rewrite src to new_src and set alt, touching only the existing shape.
+    Never create attrs if it didn't exist.
+    """
+    changed = False
+    if not isinstance(node, dict):
+        return False
+
+    # Prefer explicit image-node handling
+    if node.get("type") == "image":
+        if _tiptap_has_attrs_src(node):
+            attrs = dict(node["attrs"])
+            if attrs.get("src") != new_src:
+                attrs["src"] = new_src
+                changed = True
+            if attrs.get("alt") != alt:
+                attrs["alt"] = alt
+                changed = True
+            node["attrs"] = attrs
+            return changed
+        elif "src" in node:
+            if node.get("src") != new_src:
+                node["src"] = new_src
+                changed = True
+            if node.get("alt") != alt:
+                node["alt"] = alt
+                changed = True
+            return changed
+        # fall through to other shapes if neither applies
+
+    # Case 1: page.image.{src,alt}
+    if "image" in node and isinstance(node["image"], dict) and "src" in node["image"]:
+        if node["image"].get("src") != new_src:
+            node["image"]["src"] = new_src
+            changed = True
+        if node["image"].get("alt") != alt:
+            node["image"]["alt"] = alt
+            changed = True
+
+    # Case 2: imageSrc/imageAlt
+    if "imageSrc" in node:
+        if node.get("imageSrc") != new_src:
+            node["imageSrc"] = new_src
+            changed = True
+        if node.get("imageAlt") != alt:
+            node["imageAlt"] = alt
+            changed = True
+
+    # Case 3: plain src/alt
+    if "src" in node:
+        if node.get("src") != new_src:
+            node["src"] = new_src
+            changed = True
+        if node.get("alt") != alt:
+            node["alt"] = alt
+            changed = True
+
+    return changed
+
+def match_alt_for_src(
+    img_src: str,
+    by_relpath: Dict[str, str],
+    by_basename: Dict[str, str],
+    by_slug: Dict[str, str],
+    alt_by_origpath: Dict[str, str],
+    alt_by_origbase: Dict[str, str],
+) -> str:
+    """Find an alt for a given src without rewriting the src."""
+    if not img_src:
+        return ""
+    k_rel = path_only(img_src)
+    k_base = basename(img_src).lower()
+    k_slug = to_slug(k_base)
+
+    # Prefer explicit original-link mappings first (when present)
+    if k_rel in alt_by_origpath:
+        return alt_by_origpath[k_rel]
+    if k_base in alt_by_origbase:
+        return alt_by_origbase[k_base]
+
+    if k_rel in by_relpath:
+        return by_relpath[k_rel]
+    if k_base in by_basename:
+        return by_basename[k_base]
+    if k_slug in by_slug:
+        return by_slug[k_slug]
+    return ""
+
+def update_image_alts_in_json(
+    data: Any,
+    by_relpath: Dict[str, str],
+    by_basename: Dict[str, str],
+    by_slug: Dict[str, str],
+    by_orig_map: Dict[str, Tuple[str, str]],
+    alt_by_origpath: Dict[str, str],
+    alt_by_origbase: Dict[str, str],
+    *,
+    rewrite_src: bool,
+    updates: Optional[List[Tuple[str, str, Optional[str]]]] = None,  # (old_src, alt, new_src_if_rewritten)
+) -> Tuple[Any, bool]:
+    """
+    Traverse JSON, possibly rewrite src (if rewrite_src=True and CSV maps it),
+    and set alt text. Returns (new_data, changed?).
+    """
+    changed = False
+    if updates is None:
+        updates = []
+
+    if isinstance(data, dict):
+        target_src = None
+
+        # Identify a src-bearing node
+        if "image" in data and isinstance(data["image"], dict) and "src" in data["image"]:
+            target_src = data["image"]["src"]
+
+        elif "imageSrc" in data:
+            target_src = data.get("imageSrc")
+
+        elif data.get("type") == "image":
+            attrs = data.get("attrs")
+            # TipTap shape first
+            if isinstance(attrs, dict) and "src" in attrs:
+                target_src = attrs.get("src")
+            # Fallback: many docs use top-level src/alt with type:"image"
+            elif "src" in data:
+                target_src = data.get("src")
+
+        elif "src" in data:
+            candidate = data.get("src")
+            k_rel  = path_only(str(candidate))
+            k_base = basename(str(candidate)).lower()
+            k_slug = to_slug(k_base)
+            # Accept if it looks like an image OR we can match via any mapping (including basename/slug)
+            if (is_image_path(str(candidate)) or
+                k_rel in by_orig_map or
+                k_rel in alt_by_origpath or
+                k_base in alt_by_origbase or
+                k_base in by_basename or
+                k_slug in by_slug):
+                target_src = candidate
+
+        # Now act on the src if present
+        if target_src:
+            old_src = str(target_src)
+            k_rel = path_only(old_src)
+
+            # Prefer rewrite when toggled and mapping exists
+            if rewrite_src and k_rel in by_orig_map:
+                new_rel, alt = by_orig_map[k_rel]
+                if set_src_and_alt_in_node(data, new_rel, alt):
+                    changed = True
+                    updates.append((old_src, alt, new_rel))
+            else:
+                # Just set alt (try orig-link maps first, then normal maps)
+                alt = match_alt_for_src(old_src, by_relpath, by_basename, by_slug, alt_by_origpath, alt_by_origbase)
+                if alt:
+                    # force=True allows alt update even if src isn't a "known image" ext
+                    if set_alt_in_node(data, alt, force=True):
+                        changed = True
+                        updates.append((old_src, alt, None))
+
+        # Recurse
+        for k, v in list(data.items()):
+            new_v, ch = update_image_alts_in_json(
+                v, by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase,
+                rewrite_src=rewrite_src, updates=updates
+            )
+            if ch:
+                data[k] = new_v
+                changed = True
+        return data, changed
+
+    elif isinstance(data, list):
+        out = []
+        any_changed = False
+        for item in data:
+            new_item, ch = update_image_alts_in_json(
+                item, by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase,
+                rewrite_src=rewrite_src, updates=updates
+            )
+            out.append(new_item)
+            any_changed = any_changed or ch
+        return out, any_changed
+
+    else:
+        return data, False
+
+def _prune_duplicate_image_shapes(data: Any) -> Tuple[Any, bool]:
+    """
+    Remove redundant TipTap attrs when they exactly duplicate top-level image fields.
+    Only prunes nodes with type:"image" that have both shapes present and identical.
+    """
+    changed = False
+
+    if isinstance(data, dict):
+        if data.get("type") == "image" and "src" in data and isinstance(data.get("attrs"), dict):
+            a = data["attrs"]
+            if "src" in a:
+                same_src = a.get("src") == data.get("src")
+                same_alt = a.get("alt") == data.get("alt")
+                if same_src and same_alt:
+                    data.pop("attrs", None)
+                    changed = True
+        for k, v in list(data.items()):
+            new_v, ch = _prune_duplicate_image_shapes(v)
+            if ch:
+                data[k] = new_v
+                changed = True
+        return data, changed
+
+    if isinstance(data, list):
+        out = []
+        for item in data:
+            new_item, ch = _prune_duplicate_image_shapes(item)
+            out.append(new_item)
+            changed = changed or ch
+        return out, changed
+
+    return data, changed
+
+@pytest.fixture
+def baseline_maps(csv_path):
+    return load_alt_mapping(csv_path)
+
+def two_pass(data: Any, maps: tuple, rewrite_src: bool) -> Tuple[Any, bool, List[tuple]]:
+    """What the baseline process_json_file did to a document: (new data, changed, updates)."""
+    updates: List[tuple] = []
+    new_data, changed = update_image_alts_in_json(data, *maps, rewrite_src=rewrite_src, updates=updates)
+    new_data, pruned = _prune_duplicate_image_shapes(new_data)
+    return new_data, changed or pruned, updates
+
+# ------------- Randomized documents -------------
+
+def _image_shape(rng: random.Random) -> dict:
+    src = rng.choice(SRCS)
+    alt_text = rng.choice([None, "", "old alt", "Alt for alpha-one é"])
+    kind = rng.randrange(7)
+    if kind == 0:
+        node = {"image": {"src": src}}
+        if alt_text is not None:
+            node["image"]["alt"] = alt_text
+    elif kind == 1:
+        node = {"imageSrc": src}
+        if alt_text is not None:
+            node["imageAlt"] = alt_text
+    elif kind == 2:  # TipTap
+        node = {"type": "image", "attrs": {"src": src}}
+        if alt_text is not None:
+            node["attrs"]["alt"] = alt_text
+    elif kind == 3:  # top-level image node
+        node = {"type": "image", "src": src}
+        if alt_text is not None:
+            node["alt"] = alt_text
+    elif kind == 4:  # both shapes, identical: prunable
+        node = {"type": "image", "src": src, "alt": alt_text or "", "attrs": {"src": src, "alt": alt_text or ""}}
+    elif kind == 5:  # both shapes, different srcs
+        node = {"type": "image", "src": src, "attrs": {"src": rng.choice(SRCS), "alt": "x"}}
+    else:  # plain src/alt pair
+        node = {"src": src}
+        if alt_text is not None:
+            node["alt"] = alt_text
+    if rng.random() < 0.3:
+        node["content"] = [_random_value(rng, 2)]
+    return node
+
+def _random_value(rng: random.Random, depth: int) -> Any:
+    roll = rng.random()
+    if depth <= 0 or roll < 0.2:
+        return rng.choice(["text", 1, 2.5, None, True, "/images/new/alpha-one.jpg"])
+    if roll < 0.45:
+        return _image_shape(rng)
+    if roll < 0.7:
+        return [_random_value(rng, depth - 1) for _ in range(rng.randrange(4))]
+    node = {"type": rng.choice(["paragraph", "prose", "image", "contentpic"])}
+    for i in range(rng.randrange(4)):
+        node[rng.choice(["content", "items", f"k{i}", "image", "attrs"])] = _random_value(rng, depth - 1)
+    return node
+
+def random_doc(seed: int) -> Any:
+    rng = random.Random(seed)
+    return {"page": _random_value(rng, 4), "content": [_random_value(rng, 5) for _ in range(rng.randrange(1, 6))]}
+
+# ------------- walk_image_nodes -------------
+
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_walk_matches_two_pass(matcher, baseline_maps, rewrite_src):
+    for seed in range(400):
+        doc = random_doc(seed)
+        expected, expected_changed, expected_updates = two_pass(copy.deepcopy(doc), baseline_maps, rewrite_src)
+        got = copy.deepcopy(doc)
+        updates: List[tuple] = []
+        changed = alt.walk_image_nodes(got, matcher, rewrite_src=rewrite_src, updates=updates)
+        assert updates == expected_updates, f"seed {seed}"
+        assert changed == expected_changed, f"seed {seed}"
+        assert json.dumps(got, ensure_ascii=False, indent=2) == \
+            json.dumps(expected, ensure_ascii=False, indent=2), f"seed {seed}"
+
+def test_walk_covers_every_shape(baseline_maps):
+    """The randomized documents exercise updates, rewrites and prunes."""
+    updates: List[tuple] = []
+    pruned_docs = 0
+    for seed in range(400):
+        data, _ = update_image_alts_in_json(random_doc(seed), *baseline_maps, rewrite_src=True, updates=updates)
+        pruned_docs += _prune_duplicate_image_shapes(data)[1]
+    assert len(updates) > 400
+    assert sum(1 for u in updates if u[2] is not None) > 50
+    assert pruned_docs > 20
+
+def test_walk_deeper_than_recursion_limit(matcher):
+    depth = sys.getrecursionlimit() * 3
+    doc: Any = {"type": "image", "src": "/images/rel/eps-ilon.png", "alt": "Alt for eps-ilon",
+                "attrs": {"src": "/images/rel/eps-ilon.png", "alt": "old"}}
+    for i in range(depth):
+        doc = {"content": [doc]} if i % 2 else [doc]
+    updates: List[tuple] = []
+    assert alt.walk_image_nodes(doc, matcher, rewrite_src=False, updates=updates)
+    assert updates == [("/images/rel/eps-ilon.png", "Alt for eps-ilon", None)]
+    node = doc
+    while not (isinstance(node, dict) and node.get("type") == "image"):
+        node = node["content"][0] if isinstance(node, dict) else node[0]
+    # The TipTap attrs get the alt first, then duplicate the top-level shape and are pruned
+    assert node == {"type": "image", "src": "/images/rel/eps-ilon.png", "alt": "Alt for eps-ilon"}
+
+# ------------- HTTP service -------------
+
+@pytest.fixture
+def service(csv_path):
+    service = alt.AltService([csv_path])
+    server = alt.make_server(service, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    service.port = server.server_address[1]
+    yield service
+    server.shutdown()
+    server.server_close()
+
+def _post(port: int, body: bytes, content_length: str = None) -> Tuple[int, dict]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.putrequest("POST", "/apply")
+        conn.putheader("Content-Length", str(len(body)) if content_length is None else content_length)
+        conn.endheaders()
+        conn.send(body)
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read())
+    finally:
+        conn.close()
+
+def test_service_applies_mapping(service):
+    status, payload = _post(service.port, json.dumps({"imageSrc": "/images/rel/eps-ilon.png"}).encode())
+    assert status == 200
+    assert payload["document"] == {"imageSrc": "/images/rel/eps-ilon.png", "imageAlt": "Alt for eps-ilon"}
+    assert payload["changed"] is True
+
+def test_service_rejects_bad_content_length(service):
+    status, payload = _post(service.port, b"", content_length="abc")
+    assert status == 400 and "Content-Length" in payload["error"]
+    assert _post(service.port, b"{}")[0] == 200  # the server keeps serving
+
+def test_service_rejects_deeply_nested_body(service):
+    depth = sys.getrecursionlimit() * 10
+    status, payload = _post(service.port, b"[" * depth + b"]" * depth)
+    assert status == 400 and "invalid JSON" in payload["error"]
+
+def test_service_answers_internal_errors(service, monkeypatch):
+    def fail(body, rewrite_src=None):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(service, "apply", fail)
+    status, payload = _post(service.port, b"{}")
+    assert status == 500 and "boom" in payload["error"]
+
+# ------------- Streaming rewrite -------------
+
+def _run_both(tmp_path, text: str, matcher, rewrite_src: bool = False):
+    """(streaming result, in-memory result, streamed bytes, in-memory bytes) for one document."""
+    streamed, in_memory = tmp_path / "streamed.json", tmp_path / "in_memory.json"
+    for path in (streamed, in_memory):
+        path.write_bytes(text.encode("utf-8"))
+    got = alt._process_json_file_streaming(streamed, matcher, write=True, rewrite_src=rewrite_src)
+    expected = alt.process_json_file(in_memory, matcher, write=True, rewrite_src=rewrite_src)
+    return got, expected, streamed.read_bytes(), in_memory.read_bytes()
+
+def _assert_same_as_in_memory(tmp_path, text: str, matcher, rewrite_src: bool = False) -> None:
+    got, expected, streamed, in_memory = _run_both(tmp_path, text, matcher, rewrite_src)
+    assert got is not None, "the streaming path fell back"
+    assert (got[0], list(got[1])) == (expected[0], list(expected[1]))
+    assert streamed == in_memory
+
+STREAM_DOCS = {
+    "numbers": '{"n":[0,-0,1.5,-12.5e+10,1E5,3e-7,2.50,12345678901234567890,-0.0],'
+               '"imageSrc":"/images/rel/eps-ilon.png","z":123456789.125}',
+    "escapes": '{"t\\u00e9xt":"caf\\u00e9 \\ud83d\\ude00 \\"q\\" back\\\\slash \\/ \\n\\t\\r\\b\\f",'
+               '"image":{"src":"/images/rel/eps-ilon.png","alt":"old \\u00e9"},'
+               '"s":"\\u0041\\u00df\\u4e2d","raw":"é 中 😀"}',
+    "empty containers": '{"a":{},"b":[],"c":[[],{}],"image":{"src":"/images/rel/beta_two.png"},'
+                        '"content":[{"type":"image","src":"/images/rel/eps-ilon.png","attrs":{},"marks":[]}],'
+                        '"d":{"e":[{}]}}',
+    "added keys": '[{"src":"/images/rel/eps-ilon.png"},{"imageSrc":"/images/rel/beta_two.png"},'
+                  '{"image":{"src":"/images/new/delta.jpg"}},{"type":"image","src":"/misc/alpha-one.png"},'
+                  '{"type":"image","attrs":{"src":"/images/rel/eps-ilon.png"}}]',
+    "prune": '{"content":[{"type":"image","src":"/images/rel/eps-ilon.png","alt":"Alt for eps-ilon",'
+             '"attrs":{"src":"/images/rel/eps-ilon.png","alt":"old"}},'
+             '{"type":"image","src":"/images/rel/beta_two.png","alt":"","attrs":{"src":"/images/rel/beta_two.png","alt":""}}]}',
+    "whitespace": ' {\n\t"a" :  [ 1 , 2 ,\r\n 3 ] ,"imageSrc"\n:\n"/images/rel/eps-ilon.png" , "b" : { } }\n\n',
+}
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("name", sorted(STREAM_DOCS))
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_streaming_matches_in_memory(tmp_path, matcher, monkeypatch, chunk, name, rewrite_src):
+    """Tokens split across every possible chunk boundary still give the in-memory bytes."""
+    monkeypatch.setattr(alt, "_STREAM_CHUNK", chunk)
+    _assert_same_as_in_memory(tmp_path, STREAM_DOCS[name], matcher, rewrite_src)
+
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_streaming_matches_in_memory_randomized(tmp_path, matcher, monkeypatch, rewrite_src):
+    monkeypatch.setattr(alt, "_STREAM_CHUNK", 3)
+    for seed in range(150):
+        doc = random_doc(seed)
+        indent = None if seed % 2 else 2
+        _assert_same_as_in_memory(tmp_path, json.dumps(doc, ensure_ascii=seed % 3 == 0, indent=indent),
+                                  matcher, rewrite_src)
+
+def test_streaming_falls_back_on_duplicate_keys(tmp_path, matcher, monkeypatch):
+    monkeypatch.setattr(alt, "_STREAM_CHUNK", 4)
+    text = '{"a":1,"imageSrc":"/images/rel/eps-ilon.png","a":2}'
+    got, expected, streamed, in_memory = _run_both(tmp_path, text, matcher)
+    assert got is None
+    assert streamed == text.encode("utf-8")  # left untouched for the in-memory path
+    assert expected[0] and json.loads(in_memory) == {"a": 2, "imageSrc": "/images/rel/eps-ilon.png",
+                                                      "imageAlt": "Alt for eps-ilon"}
+    # process_json_file takes that fallback itself and ends up with the in-memory bytes
+    path = tmp_path / "fallback.json"
+    path.write_bytes(text.encode("utf-8"))
+    assert alt.process_json_file(path, matcher, write=True, rewrite_src=False, stream_min_bytes=0) == expected
+    assert path.read_bytes() == in_memory
+
+def _ops_both(tmp_path, text: str, matcher, rewrite_src: bool) -> Tuple[list, list]:
+    """Ops recorded by the streaming and the in-memory path for one document (no writes)."""
+    path = tmp_path / "doc.json"
+    path.write_bytes(text.encode("utf-8"))
+    streamed: List[tuple] = []
+    assert alt._process_json_file_streaming(path, matcher, write=False, rewrite_src=rewrite_src,
+                                            ops=streamed) is not None
+    in_memory: List[tuple] = []
+    alt.process_json_file(path, matcher, write=False, rewrite_src=rewrite_src, ops=in_memory)
+    return streamed, in_memory
+
+@pytest.mark.parametrize("name", sorted(STREAM_DOCS))
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_streaming_records_the_same_ops(tmp_path, matcher, monkeypatch, name, rewrite_src):
+    monkeypatch.setattr(alt, "_STREAM_CHUNK", 3)
+    streamed, in_memory = _ops_both(tmp_path, STREAM_DOCS[name], matcher, rewrite_src)
+    assert in_memory and streamed == in_memory
+
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_streaming_records_the_same_ops_randomized(tmp_path, matcher, monkeypatch, rewrite_src):
+    monkeypatch.setattr(alt, "_STREAM_CHUNK", 5)
+    for seed in range(150):
+        streamed, in_memory = _ops_both(tmp_path, json.dumps(random_doc(seed)), matcher, rewrite_src)
+        assert streamed == in_memory, seed
+
+# ------------- JSONL batch mode -------------
+
+def test_jsonl_keeps_line_numbers(tmp_path, matcher):
+    """Blank, invalid and too-deep lines pass through, so output line N is input line N."""
+    deep = "[" * (sys.getrecursionlimit() * 3) + "]" * (sys.getrecursionlimit() * 3)
+    lines = [
+        '{"imageSrc":"/images/rel/eps-ilon.png"}',
+        "",
+        "   ",
+        "{not json",
+        deep,
+        '{"a": 1}',
+        '{"image": {"src": "/images/rel/beta_two.png"}}',
+    ]
+    source, dest = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    source.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    summary = alt.update_jsonl(source, dest, matcher=matcher, chunk_size=3)
+
+    out = dest.read_text(encoding="utf-8").split("\n")
+    assert out[-1] == "" and len(out) - 1 == len(lines)
+    assert json.loads(out[0]) == {"imageSrc": "/images/rel/eps-ilon.png", "imageAlt": "Alt for eps-ilon"}
+    assert out[1:6] == lines[1:6]
+    assert json.loads(out[6]) == {"image": {"src": "/images/rel/beta_two.png", "alt": "Alt for beta_two"}}
+    assert summary["records"] == 5
+    assert (summary["changed_records"], summary["invalid_records"]) == (2, 2)
+
+def test_jsonl_chunk_reports_deep_record(matcher):
+    deep = b"{\"a\":" * (sys.getrecursionlimit() * 3) + b"1" + b"}" * (sys.getrecursionlimit() * 3)
+    result = alt._update_jsonl_chunk([b"\r\n", deep + b"\r\n"], matcher, rewrite_src=False)
+    assert result.lines == [b"\n", deep + b"\n"]
+    assert result.errors == [(1, "nested too deeply")]
+    assert result.blank == 1
+
+# ------------- Command line -------------
+
+@pytest.mark.parametrize("name", ["ALT_WORKERS", "ALT_PIPELINE", "ALT_FUZZY"])
+def test_malformed_env_int_names_the_variable(monkeypatch, name):
+    monkeypatch.setenv(name, "four")
+    with pytest.raises(SystemExit) as exc:
+        alt.build_arg_parser()
+    assert str(exc.value) == f"{name} expects a whole number, got 'four'"
+
+def test_malformed_env_float_names_the_variable(monkeypatch):
+    monkeypatch.setenv("ALT_WATCH_INTERVAL", "abc")
+    with pytest.raises(SystemExit) as exc:
+        alt.build_arg_parser()
+    assert str(exc.value) == "ALT_WATCH_INTERVAL expects a number, got 'abc'"
+
+def test_env_numbers_are_read(monkeypatch):
+    monkeypatch.setenv("ALT_WORKERS", " 4 ")
+    monkeypatch.setenv("ALT_WATCH_INTERVAL", "2.5")
+    monkeypatch.delenv("ALT_FUZZY", raising=False)
+    args = alt.build_arg_parser().parse_args([])
+    assert (args.workers, args.fuzzy, args.interval) == (4, 0, 2.5)
+
+# ------------- Multi-file runs -------------
+
+# Overrides one alt of CSV_ROWS (a conflict) and maps a src it doesn't know
+SECOND_CSV_ROWS = [
+    ["image", "alt"],
+    ["/images/rel/beta_two.png", "Second alt for beta_two"],
+    ["/images/unknown.png", "Alt for unknown"],
+]
+
+@pytest.fixture
+def site(tmp_path):
+    """jsonFiles/ of random pages, with a subfolder, byte-identical copies and a page without images."""
+    json_root = tmp_path / "site" / "jsonFiles"
+    (json_root / "sub").mkdir(parents=True)
+    for i in range(24):
+        folder = json_root / "sub" if i % 4 == 3 else json_root
+        (folder / f"page-{i:03d}.json").write_text(
+            json.dumps(random_doc(i), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    for i in range(3):
+        shutil.copyfile(json_root / f"page-{i:03d}.json", json_root / "sub" / f"copy-{i}.json")
+    (json_root / "plain.json").write_text('{"title": "No images here"}\n', encoding="utf-8")
+    return json_root
+
+def _copy_site(site: Path, root: Path) -> Tuple[Path, Path]:
+    """(jsonFiles/, reports/) of a fresh copy of the site under root."""
+    shutil.copytree(site, root / "jsonFiles")
+    return root / "jsonFiles", root / "reports"
+
+def _tree(json_root: Path) -> dict:
+    return {p.relative_to(json_root).as_posix(): p.read_bytes() for p in sorted(json_root.rglob("*.json"))}
+
+def _full_run(site: Path, root: Path, csvs: List[Path], **kwargs) -> Tuple[dict, Path, dict]:
+    """(tree, reports/, summary) of update_alts_rel over a fresh copy of the site."""
+    json_root, reports = _copy_site(site, root)
+    summary = alt.update_alts_rel(csv_sources=csvs, json_root=json_root, reports_dir=reports, **kwargs)
+    return _tree(json_root), reports, summary
+
+@pytest.fixture
+def csvs(tmp_path, csv_path):
+    return [csv_path, _write_csv(tmp_path / "second.csv", SECOND_CSV_ROWS)]
+
+REPORT_FILES = ("alt-text-update-summary.json", alt.ReportWriter.CSV_NAME, alt.ReportWriter.DETAILS_NAME,
+                "alt-text-csv-conflicts.csv", alt.PREVIEW_NAME)
+
+def _reports(reports: Path) -> dict:
+    """A run's top-level reports, with its folder replaced so runs in different folders compare equal."""
+    root = str(reports.parent)
+    found = {}
+    for name in REPORT_FILES:
+        if (reports / name).exists():
+            text = (reports / name).read_text(encoding="utf-8").replace(root, "<root>")
+            found[name] = json.loads(text) if name.endswith(".json") else text
+    return found
+
+def test_watch_with_two_csvs(tmp_path, site, csv_path, monkeypatch):
+    """The first run and a CSV reload both handle several CSVs, ending where a full run does."""
+    second = _write_csv(tmp_path / "second.csv", SECOND_CSV_ROWS)
+    edited_rows = SECOND_CSV_ROWS + [["/images/new/delta.jpg", "Edited delta"]]
+    monkeypatch.setattr(alt.time, "sleep", lambda seconds: _write_csv(second, edited_rows))
+    json_root, reports = _copy_site(site, tmp_path / "watched")
+    alt.watch(csv_sources=[csv_path, second], polls=1, interval=0, json_root=json_root, reports_dir=reports)
+    monkeypatch.undo()
+
+    expected, full_reports, summary = _full_run(site, tmp_path / "full", [csv_path, second])
+    assert summary["csv_conflicts"] > 0
+    assert _tree(json_root) == expected
+    assert (reports / "alt-text-csv-conflicts.csv").read_bytes() == \
+        (full_reports / "alt-text-csv-conflicts.csv").read_bytes()
+    assert any(json.loads(line)["reason"] == "csv"
+               for line in (reports / "alt-text-watch-log.jsonl").read_text(encoding="utf-8").splitlines())
+
+def test_targeted_with_two_csvs(tmp_path, site, csv_path):
+    """Targeted runs with several CSVs give the tree and conflicts report of a full run."""
+    second = _write_csv(tmp_path / "second.csv", SECOND_CSV_ROWS)
+    json_root, reports = _copy_site(site, tmp_path / "targeted")
+    for rows in (SECOND_CSV_ROWS, SECOND_CSV_ROWS + [["/images/new/delta.jpg", "Edited delta"]]):
+        _write_csv(second, rows)
+        summary = alt.update_alts_targeted(csv_sources=[csv_path, second], json_root=json_root, reports_dir=reports)
+        expected, full_reports, full_summary = _full_run(site, tmp_path / f"full-{len(rows)}", [csv_path, second])
+        assert _tree(json_root) == expected
+        assert summary["csv_conflicts"] == full_summary["csv_conflicts"] > 0
+        assert (reports / "alt-text-csv-conflicts.csv").read_bytes() == \
+            (full_reports / "alt-text-csv-conflicts.csv").read_bytes()
+
+def _preview(reports: Path) -> List[dict]:
+    """The preview JSONL with file paths made relative to the run's jsonFiles/."""
+    items = [json.loads(line) for line in (reports / alt.PREVIEW_NAME).read_text(encoding="utf-8").splitlines()]
+    for item in items:
+        item["file"] = Path(item["file"]).relative_to(reports.parent / "jsonFiles").as_posix()
+    return items
+
+def test_dry_run_streams_large_files(tmp_path, site, csv_path):
+    """Dry runs still stream files over stream_min_bytes, with the same preview as the in-memory path."""
+    _, in_memory, _ = _full_run(site, tmp_path / "in-memory", [csv_path], dry_run=True)
+    tree, streamed, summary = _full_run(site, tmp_path / "streamed", [csv_path], dry_run=True,
+                                        stream_min_bytes=0, metrics=True, dedupe=False, prefilter=False)
+    assert tree == _tree(site)
+    assert summary["metrics"]["counters"]["streamed_files"] == len(tree)
+    assert _preview(in_memory) and _preview(streamed) == _preview(in_memory)
+
+@pytest.mark.parametrize("dry_run", [False, True])
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_sharded_run_merges_to_the_serial_run(tmp_path, site, csvs, dry_run, rewrite_src):
+    expected, serial, _ = _full_run(site, tmp_path / "serial", csvs, dry_run=dry_run, rewrite_src=rewrite_src)
+    json_root, reports = _copy_site(site, tmp_path / "sharded")
+    scanned = []
+    for k in range(3):
+        summary = alt.update_alts_rel(csv_sources=csvs, json_root=json_root, reports_dir=reports,
+                                      shard=(k, 3), dry_run=dry_run, rewrite_src=rewrite_src)
+        scanned.append(summary["total_json_files_scanned"])
+    alt.merge_shard_reports(3, reports_dir=reports)
+    assert all(scanned) and sum(scanned) == len(expected)
+    assert _tree(json_root) == expected
+    assert _reports(reports) == _reports(serial)
+
+@pytest.mark.parametrize("options", [
+    dict(dedupe=False), dict(prefilter=False), dict(dedupe=False, prefilter=False),
+    dict(workers=2), dict(pipeline=2), dict(stream_min_bytes=0),
+], ids=["no-dedupe", "no-prefilter", "neither", "workers", "pipeline", "streamed"])
+@pytest.mark.parametrize("rewrite_src", [False, True])
+def test_run_options_leave_the_same_output(tmp_path, site, csvs, options, rewrite_src):
+    """Options that only change how files are processed give the default run's tree and reports."""
+    expected, serial, _ = _full_run(site, tmp_path / "serial", csvs, rewrite_src=rewrite_src)
+    tree, reports, _ = _full_run(site, tmp_path / "other", csvs, rewrite_src=rewrite_src, **options)
+    assert tree == expected
+    assert _reports(reports) == _reports(serial)
+
+def test_site_exercises_dedupe_and_prefilter(tmp_path, site, csvs):
+    _, _, summary = _full_run(site, tmp_path / "run", csvs, metrics=True)
+    counters = summary["metrics"]["counters"]
+    assert counters["duplicate_files"] >= 3
+    assert counters["prefiltered_files"] >= 1
+    assert 0 < summary["changed_files"] < summary["total_json_files_scanned"]
+
+def test_incremental_run_replays_the_manifest(tmp_path, site, csvs):
+    """A repeated dry run takes every file from the manifest and reports the same changes."""
+    json_root, reports = _copy_site(site, tmp_path / "incremental")
+    first = alt.update_alts_rel(csv_sources=csvs, json_root=json_root, reports_dir=reports,
+                                incremental=True, dry_run=True)
+    first_reports = _reports(reports)
+    second = alt.update_alts_rel(csv_sources=csvs, json_root=json_root, reports_dir=reports,
+                                 incremental=True, dry_run=True)
+    assert first["cached_files"] == 0 and second["cached_files"] == second["total_json_files_scanned"]
+    assert second["changed_files"] > 0 and _tree(json_root) == _tree(site)
+    second_reports = _reports(reports)
+    for found in (first_reports, second_reports):
+        found["alt-text-update-summary.json"].pop("cached_files")
+    assert second_reports == first_reports
+
+def test_precedence_first_matches_reversed_csvs(tmp_path, site, csvs):
+    last, _, _ = _full_run(site, tmp_path / "last", csvs)
+    first, _, _ = _full_run(site, tmp_path / "first", csvs[::-1], precedence="first")
+    assert first == last != _full_run(site, tmp_path / "other", csvs[::-1])[0]
+
+def test_backup_snapshot_restores_the_original_tree(tmp_path, site, csvs):
+    json_root, reports = _copy_site(site, tmp_path / "backed-up")
+    backups = tmp_path / "backed-up" / "backup_jsonFiles"
+    summary = alt.update_alts_rel(csv_sources=csvs, json_root=json_root, reports_dir=reports,
+                                  backup_dir=backups, backup=True)
+    assert summary["backup_snapshot"] and _tree(json_root) != _tree(site)
+    alt.restore_snapshot(json_root=json_root, backup_dir=backups)
+    assert _tree(json_root) == _tree(site)
+
+def test_snapshot_keeps_the_bytes_read_ahead(tmp_path):
+    """A file edited between the read-ahead and the backup is stored as it was read."""
+    json_root = tmp_path / "jsonFiles"
+    json_root.mkdir()
+    page = json_root / "page.json"
+    page.write_bytes(b'{"v": 1}\n')
+    read = page.read_bytes()
+    page.write_bytes(b'{"v": 2}\n')
+    snapshot = alt.SnapshotBackup.start(tmp_path / "backup", json_root)
+    assert snapshot.save(page, read)
+    digest = hashlib.sha256(read).hexdigest()
+    assert (tmp_path / "backup" / "objects" / digest[:2] / f"{digest}.json").read_bytes() == read
+    assert (snapshot.snapshot_dir / "page.json").read_bytes() == read
+    page.write_bytes(b'{"v": 3}\n')  # the object is a copy, not the page's inode
+    assert (snapshot.snapshot_dir / "page.json").read_bytes() == read
@@ -15,27 +15,70 @@ How to run:
 
 Optional environment toggles:
   ALT_DRY_RUN=1        # preview only, do not write
-  ALT_BACKUP=1         # write .bak files before saving
+  ALT_BACKUP=1         # snapshot the originals of rewritten files into backup_jsonFiles/snapshots/<time>/
+  ALT_RESTORE=name     # put a snapshot's files back into jsonFiles/ ("latest" = newest snapshot), then exit
   ALT_REWRITE_SRC=1    # if an image src matches the CSV "original link", rewrite src to the CSV "relative path"
+  ALT_WORKERS=N        # process JSON files with N worker processes (0 = one per CPU); reports match a serial run
+  ALT_INCREMENTAL=1    # skip files unchanged since the last run with the same CSV mapping (reports/alt-text-manifest.json)
+  ALT_STREAM_MIN_BYTES=N  # stream-rewrite files of N bytes or more instead of loading them whole (0 = all files)
+  ALT_METRICS=1        # add per-stage timings, counters and the slowest files to the summary
+  ALT_PROFILE=1        # profile the run (cProfile; "sample" = low-overhead sampler), ranked in reports/alt-text-profile.txt
+  ALT_METRICS_FILE=p   # also write those metrics as JSON to file p (implies ALT_METRICS=1)
+  ALT_PATCH=1          # don't rewrite JSON files; write JSON Patch ops for the touched fields to reports/
+  ALT_PREVIEW=html     # also render the dry-run preview (reports/alt-text-preview.jsonl) as HTML, or "diff"
+  ALT_PIPELINE=N       # read up to N files ahead and write behind in background threads (single-process runs)
+  ALT_FUZZY=N          # match slugs within N typos; list unmatched srcs with suggestions in reports/
+  ALT_MAPPING_CACHE=1  # keep the parsed CSV in reports/alt-text-mapping.cache; reused while the CSV is unchanged
+  ALT_CSV=a.csv:dir:*.csv  # merge these CSVs (files, folders, globs; ";" separated on Windows) instead of one
+  ALT_CSV_PRECEDENCE=last  # with ALT_CSV: "last" (later CSVs win) or "first" (earlier CSVs win); conflicts go to reports/
+  ALT_WATCH=1          # keep running: reprocess only changed JSON files, or files whose srcs a CSV edit affects
+  ALT_WATCH_INTERVAL=s # seconds between checks in watch mode (default 1)
+  ALT_DEDUPE=0         # process byte-identical files separately (default: once per run, result reused)
+  ALT_PREFILTER=0      # parse every file (default: skip files whose bytes show they cannot need changes)
+  ALT_SHARD=K/N        # process only shard K (0..N-1) of N; reports go to reports/shards/K-of-N/
+  ALT_MERGE_SHARDS=N   # combine the reports of shards 0..N-1 into the reports of one full run
+  ALT_JSONL_IN=path    # update a JSON Lines stream ("-" = stdin) instead of jsonFiles/; ALT_JSONL_OUT=path (default stdout)
+  ALT_SERVE=8765       # run an HTTP service instead: POST a page JSON to /apply, get it back updated
+  ALT_TARGETED=1       # process only files edited, or referencing srcs whose CSV entry changed, since the last targeted run
+  ALT_INDEX=1          # only update the image reference index (reports/alt-text-index.sqlite), then exit
+  ALT_INDEX_QUERY=q    # update the index, then print CSV for q: uses:<src> | no-alt | no-csv
 """
 
 import os
 import json
 import csv
+import filecmp
+import glob
+import hashlib
+import heapq
+import html
+import itertools
+import marshal
+import queue
 import re
 import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
 from pathlib import Path
 from urllib.parse import urlsplit, unquote
-from typing import Tuple, Dict, Any, List, Optional
+from typing import Tuple, Dict, Any, List, Optional, Iterable, Iterator, NamedTuple, Sequence, Union
+
+Update = Tuple[str, str, Optional[str]]  # (old_src, alt, new_src_if_rewritten)
+PatchOp = Tuple[str, str, Any, Any]      # (op, json_pointer, old_value, new_value)
 
 # ---------------- Helpers ----------------
 
 def norm_url(u: str) -> str:
     if not u:
         return ""
-    parts = urlsplit(u)
-    normalized = unquote(parts.scheme + "://" + parts.netloc + parts.path if parts.scheme else parts.path)
-    return normalized
+    return _norm_parts(urlsplit(u))
+
+def _norm_parts(parts) -> str:
+    return unquote(parts.scheme + "://" + parts.netloc + parts.path if parts.scheme else parts.path)
 
 def path_only(u: str) -> str:
     """Return decoded URL path only (no scheme/host/query/fragment)."""
@@ -50,16 +93,24 @@ def is_image_path(p: str) -> bool:
 
 def basename(p: str) -> str:
     try:
-        return Path(norm_url(p)).name
+        return _path_name(norm_url(p))
     except Exception:
         return p or ""
 
+def _path_name(p: str) -> str:
+    """Path(p).name; plain "a/b/c.jpg" paths skip building a Path object."""
+    name = p.rpartition("/")[2]
+    if not name or name in (".", "..") or "\\" in p or ":" in p or p.startswith("//"):
+        return Path(p).name
+    return name
+
+_EXT_RE = re.compile(r"\.[a-z0-9]+$")
+_NON_LETTERS_RE = re.compile(r"[^a-z]+")
+
 def to_slug(s: str) -> str:
     s = (s or "").lower()
-    s = re.sub(r"\.[a-z0-9]+$", "", s)   # remove extension
-    s = re.sub(r"[0-9]", "", s)          # remove digits
-    s = re.sub(r"[^a-z]+", "", s)        # keep letters only
-    return s
+    s = _EXT_RE.sub("", s)               # remove extension
+    return _NON_LETTERS_RE.sub("", s)    # keep letters only (digits go too)
 
 def _script_dir() -> Path:
     try:
@@ -80,17 +131,92 @@ def find_csv(default_name: str = "alt-text-output.csv") -> Path:
             return c
     return default
 
-def find_json_root() -> Path:
+def find_csv_sources(spec: str) -> List[Path]:
+    """
+    The CSVs named by spec, in order: entries separated by os.pathsep, each a
+    file, a folder (its *.csv files, by name) or a glob pattern (matches by name).
+    Relative entries are resolved against the script's folder.
+    """
     d = _script_dir()
-    jf = d / "jsonFiles"
-    if jf.exists():
-        return jf
-    jf.mkdir(exist_ok=True)
-    return jf
+    sources: List[Path] = []
+    for part in spec.split(os.pathsep):
+        part = part.strip()
+        if not part:
+            continue
+        p = d / part
+        if p.is_dir():
+            sources.extend(sorted(p.glob("*.csv")))
+        elif glob.has_magic(part):
+            sources.extend(sorted(Path(m) for m in glob.glob(str(p))))
+        else:
+            sources.append(p)
+    return sources
+
+def resolve_csv_paths(csv_sources: Union[str, Sequence[Path], None] = None) -> List[Path]:
+    """CSV paths from a find_csv_sources spec, an explicit list of paths, or find_csv() when empty."""
+    if not csv_sources:
+        return [find_csv()]
+    if isinstance(csv_sources, str):
+        return find_csv_sources(csv_sources)
+    return [Path(p) for p in csv_sources]
+
+def find_json_root() -> Path:
+    """jsonFiles/ next to the script (it may not exist; nothing is created)."""
+    return _script_dir() / "jsonFiles"
+
+def _display_path(p: Path, base: Path) -> str:
+    try:
+        return p.relative_to(base).as_posix()
+    except ValueError:
+        return str(p)
 
 # ---------- CSV loader (2 or 3 columns) ----------
 
-def load_alt_mapping(csv_path: Path) -> Tuple[
+class MappingConflict(NamedTuple):
+    mapping: str        # by_relpath | by_basename | by_slug | by_orig_map | alt_by_origpath | alt_by_origbase
+    key: str
+    kept_alt: str       # the value the matcher uses
+    kept_source: str    # CSV it came from
+    other_alt: str      # a different value given for the same key
+    other_source: str
+
+MAPPING_NAMES = ("by_relpath", "by_basename", "by_slug", "by_orig_map", "alt_by_origpath", "alt_by_origbase")
+
+class _TrackedMap(dict):
+    """A mapping under construction that remembers each key's source and any conflicting values."""
+    __slots__ = ("name", "loader", "origin")
+
+    def __init__(self, name: str, loader: "_ConflictLog"):
+        super().__init__()
+        self.name = name
+        self.loader = loader
+        self.origin: Dict[str, int] = {}
+
+    def __setitem__(self, key, value):
+        old = self.get(key, _UNSET)
+        source = self.loader.source
+        if old is not _UNSET and old != value:
+            seen = self.loader.seen.setdefault((self.name, key), {old: self.origin[key]})
+            seen.setdefault(value, source)
+        self.origin[key] = source
+        dict.__setitem__(self, key, value)
+
+class _ConflictLog:
+    def __init__(self):
+        self.source = 0
+        self.seen: Dict[Tuple[str, str], Dict[Any, int]] = {}  # (mapping, key) -> {value: source index}
+
+_UNSET = object()
+
+def _conflict_value(value: Any) -> str:
+    return f"{value[1]} (rewrite to {value[0]})" if isinstance(value, tuple) else value
+
+def load_alt_mapping(
+    csv_path: Union[Path, Sequence[Path]],
+    *,
+    precedence: str = "last",
+    conflicts: Optional[List[MappingConflict]] = None,
+) -> Tuple[
     Dict[str, str],  # by_relpath: path -> alt
     Dict[str, str],  # by_basename: filename -> alt
     Dict[str, str],  # by_slug: slug -> alt
@@ -115,29 +241,41 @@ def load_alt_mapping(csv_path: Path) -> Tuple[
         col0: new relative path (for rewrite), e.g. /photos/.../x.jpg
         col1: alt
         col2: original link (url or path), e.g. https://.../x.ashx
-    """
-    by_relpath, by_basename, by_slug = {}, {}, {}
-    by_orig_map: Dict[str, Tuple[str, str]] = {}
-    alt_by_origpath, alt_by_origbase = {}, {}
 
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV not found: {csv_path}")
+    Rows are read one at a time, and every distinct alt text is stored once and
+    shared by all the mappings that point to it (captioning exports repeat them).
 
-    with csv_path.open(newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-
-    if not rows:
-        return by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase
-
-    # Detect and skip a header-like first row
-    start_idx = 0
-    if len(rows[0]) >= 2 and ("alt" in (rows[0][1] or "").lower() or "image" in (rows[0][0] or "").lower()):
-        start_idx = 1
-
-    for row in rows[start_idx:]:
+    csv_path may be a list of CSVs, merged in the same single pass. Within a CSV
+    the last row for a key wins; across CSVs, precedence="last" lets later files
+    override earlier ones and "first" lets earlier files win. With a conflicts
+    list, every key given different values is appended to it (one entry per
+    value that lost), with the file each value came from.
+    """
+    paths = [csv_path] if isinstance(csv_path, Path) else list(csv_path)
+    if precedence not in ("first", "last"):
+        raise ValueError(f"precedence must be 'first' or 'last', not {precedence!r}")
+    log = _ConflictLog() if conflicts is not None else None
+    if log is not None:
+        maps = [_TrackedMap(name, log) for name in MAPPING_NAMES]
+    else:
+        maps = [{} for _ in MAPPING_NAMES]
+    by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase = maps
+    alts: Dict[str, str] = {}
+
+    for path in paths:
+        if not path.exists():
+            raise FileNotFoundError(f"CSV not found: {path}")
+
+    # Last write wins, so "first" precedence is reading the files back to front
+    order = list(enumerate(paths))
+    if precedence == "first":
+        order.reverse()
+    rows = ((i, row) for i, path in order for row in _iter_mapping_rows(path))
+    for index, row in rows:
         if not row or len(row) < 2:
             continue
+        if log is not None:
+            log.source = index
 
         # 2-column mode
         if len(row) == 2 or (len(row) >= 3 and not (row[2] or "").strip()):
@@ -145,16 +283,16 @@ def load_alt_mapping(csv_path: Path) -> Tuple[
             alt = (row[1] or "").strip()
             if not raw_path or not alt:
                 continue
+            alt = alts.setdefault(alt, alt)
 
             parts = urlsplit(raw_path)
-            rel = parts.path if parts.scheme else raw_path
-            rel = path_only(rel)
+            rel = path_only(parts.path) if parts.scheme else unquote(parts.path)
 
             # Map by exact relative path if it looks like an image path or starts with /
             if rel and (rel.startswith("/") or is_image_path(rel)):
                 by_relpath[rel] = alt
 
-            b = basename(raw_path)
+            b = _path_name(_norm_parts(parts))
             if b:
                 by_basename[b.lower()] = alt
                 sl = to_slug(b)
@@ -169,6 +307,7 @@ def load_alt_mapping(csv_path: Path) -> Tuple[
             orig_path = path_only(orig_raw)
             if not alt or not orig_path:
                 continue
+            alt = alts.setdefault(alt, alt)
 
             # record mapping from original path -> alt
             alt_by_origpath[orig_path] = alt
@@ -193,8 +332,80 @@ def load_alt_mapping(csv_path: Path) -> Tuple[
                 if sl:
                     by_slug[sl] = alt
 
+    if log is not None:
+        for (name, key), seen in log.seen.items():
+            m = maps[MAPPING_NAMES.index(name)]
+            kept = m[key]
+            for value, source in seen.items():
+                if value != kept:
+                    conflicts.append(MappingConflict(
+                        name, key, _conflict_value(kept), str(paths[m.origin[key]]),
+                        _conflict_value(value), str(paths[source])))
+        maps = [dict(m) for m in maps]
+        by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase = maps
     return by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase
 
+def _iter_mapping_rows(csv_path: Path) -> Iterator[List[str]]:
+    """The CSV's rows, read one at a time, minus a header-like first row."""
+    with csv_path.open(newline="", encoding="utf-8") as f:
+        first = True
+        for row in csv.reader(f):
+            # Detect and skip a header-like first row
+            if first and len(row) >= 2 and ("alt" in (row[1] or "").lower() or "image" in (row[0] or "").lower()):
+                first = False
+                continue
+            first = False
+            yield row
+
+# Bump when load_alt_mapping's output for the same CSV changes
+MAPPING_CACHE_VERSION = 1
+
+def load_alt_mapping_cached(
+    csv_path: Union[Path, Sequence[Path]],
+    cache_path: Path,
+    *,
+    precedence: str = "last",
+    conflicts: Optional[List[MappingConflict]] = None,
+) -> Tuple[tuple, str]:
+    """
+    load_alt_mapping, persisted in a marshal file keyed by the CSVs' sha256 (and
+    their order and precedence). Returns (mappings, fingerprint of the mappings).
+    A missing, stale or unreadable cache is rebuilt from the CSVs; failing to save
+    it only warns. Conflicts, when asked for, are cached along with the mappings.
+    """
+    paths = [csv_path] if isinstance(csv_path, Path) else list(csv_path)
+    for path in paths:
+        if not path.exists():
+            raise FileNotFoundError(f"CSV not found: {path}")
+    key = (MAPPING_CACHE_VERSION, marshal.version, precedence, conflicts is not None,
+           tuple(str(p) for p in paths), tuple(_file_sha256(p) for p in paths))
+    try:
+        # loads() on the whole file is several times faster than load() on the stream
+        cached_key, maps, fingerprint, cached_conflicts = marshal.loads(cache_path.read_bytes())
+        if cached_key == key:
+            if conflicts is not None:
+                conflicts.extend(MappingConflict(*c) for c in cached_conflicts)
+            return maps, fingerprint
+    except Exception:
+        pass
+
+    found: Optional[List[MappingConflict]] = [] if conflicts is not None else None
+    maps = load_alt_mapping(paths, precedence=precedence, conflicts=found)
+    fingerprint = _mapping_fingerprint(maps)
+    if found is not None:
+        conflicts.extend(found)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = (key, maps, fingerprint, [tuple(c) for c in found or ()])
+        _atomic_write_bytes(cache_path, marshal.dumps(payload))
+    except Exception as e:
+        print(f"[WARN] Could not save mapping cache: {e}")
+    return maps, fingerprint
+
+def _mapping_fingerprint(maps: tuple) -> str:
+    payload = json.dumps(list(maps), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 # ------------- JSON writers -------------
 
 def _tiptap_has_attrs_src(node: dict) -> bool:
@@ -215,10 +426,9 @@ def set_alt_in_node(node: Any, alt: str, *, force: bool = False) -> bool:
     # Prefer explicit image-node handling
     if node.get("type") == "image":
         if _tiptap_has_attrs_src(node):
-            attrs = dict(node["attrs"])
+            attrs = node["attrs"]
             if attrs.get("alt") != alt:
                 attrs["alt"] = alt
-                node["attrs"] = attrs
                 changed = True
             return changed
         elif "src" in node and (force or is_image_path(str(node.get("src")))):
@@ -260,14 +470,13 @@ def set_src_and_alt_in_node(node: Any, new_src: str, alt: str) -> bool:
     # Prefer explicit image-node handling
     if node.get("type") == "image":
         if _tiptap_has_attrs_src(node):
-            attrs = dict(node["attrs"])
+            attrs = node["attrs"]
             if attrs.get("src") != new_src:
                 attrs["src"] = new_src
                 changed = True
             if attrs.get("alt") != alt:
                 attrs["alt"] = alt
                 changed = True
-            node["attrs"] = attrs
             return changed
         elif "src" in node:
             if node.get("src") != new_src:
@@ -310,302 +519,3202 @@ def set_src_and_alt_in_node(node: Any, new_src: str, alt: str) -> bool:
 
 # ------------- Matching helpers -------------
 
-def match_alt_for_src(
-    img_src: str,
-    by_relpath: Dict[str, str],
-    by_basename: Dict[str, str],
-    by_slug: Dict[str, str],
-    alt_by_origpath: Dict[str, str],
-    alt_by_origbase: Dict[str, str],
-) -> str:
-    """Find an alt for a given src without rewriting the src."""
-    if not img_src:
-        return ""
-    k_rel = path_only(img_src)
-    k_base = basename(img_src).lower()
-    k_slug = to_slug(k_base)
-
-    # Prefer explicit original-link mappings first (when present)
-    if k_rel in alt_by_origpath:
-        return alt_by_origpath[k_rel]
-    if k_base in alt_by_origbase:
-        return alt_by_origbase[k_base]
-
-    if k_rel in by_relpath:
-        return by_relpath[k_rel]
-    if k_base in by_basename:
-        return by_basename[k_base]
-    if k_slug in by_slug:
-        return by_slug[k_slug]
-    return ""
+def _trigrams(s: str) -> set:
+    padded = f"  {s} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance of a and b, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+class FuzzyIndex:
+    """
+    Trigram index over the CSV slugs, for approximate slug lookups.
+
+    A query only looks at slugs sharing trigrams with it (via the posting lists),
+    and only those sharing enough of them to possibly be within the edit distance
+    are compared character by character; the CSV is never scanned row by row.
+    """
+
+    def __init__(self, slugs: Iterable[str]):
+        self.slugs: List[str] = sorted({s for s in slugs if s})
+        self.postings: Dict[str, List[int]] = {}
+        for i, slug in enumerate(self.slugs):
+            for gram in _trigrams(slug):
+                self.postings.setdefault(gram, []).append(i)
+
+    def _shared(self, query: str) -> Dict[int, int]:
+        """Slug index -> number of distinct trigrams it shares with query."""
+        counts: Dict[int, int] = {}
+        for gram in _trigrams(query):
+            for i in self.postings.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+        return counts
+
+    def best(self, query: str, max_dist: int) -> Optional[str]:
+        """
+        The single closest slug within max_dist edits (capped at a quarter of the
+        query's length, so short slugs never match loosely). None when there is no
+        such slug, or when several are equally close.
+        """
+        max_dist = min(max_dist, len(query) // 4)
+        if max_dist <= 0:
+            return None
+        # Each edit destroys at most 3 of the query's trigrams
+        need = len(_trigrams(query)) - 3 * max_dist
+        found: List[Tuple[int, str]] = []
+        for i, shared in self._shared(query).items():
+            if shared >= need:
+                slug = self.slugs[i]
+                d = _edit_distance(query, slug, max_dist)
+                if d <= max_dist:
+                    found.append((d, slug))
+        if not found:
+            return None
+        found.sort()
+        if len(found) > 1 and found[1][0] == found[0][0]:
+            return None
+        return found[0][1]
+
+    def suggest(self, query: str, k: int = 3, pool: int = 20) -> List[Tuple[str, int]]:
+        """Up to k (slug, edit distance) near misses, closest first."""
+        if not query:
+            return []
+        shared = self._shared(query)
+        top = heapq.nlargest(pool, shared.items(), key=lambda kv: (kv[1], -kv[0]))
+        limit = max(2, len(query) // 2)
+        ranked = []
+        for i, _count in top:
+            slug = self.slugs[i]
+            d = _edit_distance(query, slug, limit)
+            if d <= limit:
+                ranked.append((d, slug))
+        ranked.sort()
+        return [(slug, d) for d, slug in ranked[:k]]
+
+class AltMatch(NamedTuple):
+    alt: str                             # "" when no mapping matched
+    tier: str                            # origpath | origbase | relpath | basename | slug | fuzzy | ""
+    rewrite: Optional[Tuple[str, str]]   # (new_rel_path, alt) when the src is a CSV "original link"
+    known: bool                          # looks like an image, or any mapping knows this src
+
+class AltMatcher:
+    """
+    The six CSV mappings compiled into one object.
+
+    match(src) normalizes the src once (path, basename, slug), runs every lookup,
+    and memoizes the result per distinct src string in a bounded cache, so
+    documents that repeat the same image references only pay for them once.
+
+    With fuzzy=N, a src whose slug has no exact entry takes the alt of the one
+    CSV slug within N edits (see FuzzyIndex.best), as the "fuzzy" tier.
+    """
+
+    def __init__(
+        self,
+        by_relpath: Dict[str, str],
+        by_basename: Dict[str, str],
+        by_slug: Dict[str, str],
+        by_orig_map: Dict[str, Tuple[str, str]],
+        alt_by_origpath: Dict[str, str],
+        alt_by_origbase: Dict[str, str],
+        *,
+        cache_size: int = 65536,
+        fuzzy: int = 0,
+    ):
+        self.by_relpath = by_relpath
+        self.by_basename = by_basename
+        self.by_slug = by_slug
+        self.by_orig_map = by_orig_map
+        self.alt_by_origpath = alt_by_origpath
+        self.alt_by_origbase = alt_by_origbase
+        self.cache_size = cache_size
+        self.fuzzy = fuzzy
+        self.fuzzy_index = FuzzyIndex(by_slug) if fuzzy > 0 else None
+        self._slug_names: Optional[Dict[str, str]] = None
+        self._cache: Dict[str, AltMatch] = {}
+        self._maps_fingerprint: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_csv(
+        cls,
+        csv_path: Union[Path, Sequence[Path]],
+        *,
+        cache_path: Optional[Path] = None,
+        precedence: str = "last",
+        conflicts: Optional[List[MappingConflict]] = None,
+        **kwargs,
+    ) -> "AltMatcher":
+        """
+        Load one CSV or several (see load_alt_mapping); with a cache_path, via the
+        binary mapping cache (see load_alt_mapping_cached).
+        """
+        if cache_path is None:
+            maps = load_alt_mapping(csv_path, precedence=precedence, conflicts=conflicts)
+            return cls(*maps, **kwargs)
+        maps, fingerprint = load_alt_mapping_cached(csv_path, cache_path, precedence=precedence,
+                                                    conflicts=conflicts)
+        matcher = cls(*maps, **kwargs)
+        matcher._maps_fingerprint = fingerprint
+        return matcher
+
+    def fingerprint(self) -> str:
+        """Stable hash of the loaded mappings; equal fingerprints always match identically."""
+        if self._fingerprint is None:
+            if self._maps_fingerprint is None:
+                self._maps_fingerprint = _mapping_fingerprint(
+                    (self.by_relpath, self.by_basename, self.by_slug,
+                     self.by_orig_map, self.alt_by_origpath, self.alt_by_origbase))
+            fingerprint = self._maps_fingerprint
+            if self.fuzzy > 0:
+                fingerprint = hashlib.sha256(f"{fingerprint}:fuzzy={self.fuzzy}".encode("utf-8")).hexdigest()
+            self._fingerprint = fingerprint
+        return self._fingerprint
+
+    def __getstate__(self) -> dict:
+        # Ship the mappings to worker processes without the warm cache
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def match(self, src: str) -> AltMatch:
+        hit = self._cache.get(src)
+        if hit is not None:
+            return hit
+        result = self._match_uncached(src)
+        if len(self._cache) >= self.cache_size:
+            # evict the oldest entry (dicts keep insertion order); tolerant of
+            # concurrent callers (service threads) evicting at the same time
+            try:
+                self._cache.pop(next(iter(self._cache)), None)
+            except (RuntimeError, StopIteration):
+                pass
+        self._cache[src] = result
+        return result
+
+    def _match_uncached(self, src: str) -> AltMatch:
+        k_rel = path_only(src)
+        k_base = basename(src).lower()
+        k_slug = to_slug(k_base)
+
+        rewrite = self.by_orig_map.get(k_rel)
+        known = (is_image_path(src) or
+                 rewrite is not None or
+                 k_rel in self.alt_by_origpath or
+                 k_base in self.alt_by_origbase or
+                 k_base in self.by_basename or
+                 k_slug in self.by_slug)
+
+        alt, tier = "", ""
+        if src:
+            # Prefer explicit original-link mappings first (when present)
+            if k_rel in self.alt_by_origpath:
+                alt, tier = self.alt_by_origpath[k_rel], "origpath"
+            elif k_base in self.alt_by_origbase:
+                alt, tier = self.alt_by_origbase[k_base], "origbase"
+            elif k_rel in self.by_relpath:
+                alt, tier = self.by_relpath[k_rel], "relpath"
+            elif k_base in self.by_basename:
+                alt, tier = self.by_basename[k_base], "basename"
+            elif k_slug in self.by_slug:
+                alt, tier = self.by_slug[k_slug], "slug"
+            elif self.fuzzy_index is not None:
+                near = self.fuzzy_index.best(k_slug, self.fuzzy)
+                if near is not None:
+                    alt, tier = self.by_slug[near], "fuzzy"
+        return AltMatch(alt, tier, rewrite, known)
+
+    def suggest(self, src: str, k: int = 3) -> List[Tuple[str, str, int]]:
+        """Near-miss CSV entries for an unmatched src: (csv_name, alt, edit_distance)."""
+        if self.fuzzy_index is None:
+            self.fuzzy_index = FuzzyIndex(self.by_slug)
+        if self._slug_names is None:
+            # Show suggestions as a CSV file name where one maps to the slug
+            self._slug_names = {}
+            for base in sorted(self.by_basename):
+                self._slug_names.setdefault(to_slug(base), base)
+        return [(self._slug_names.get(slug, slug), self.by_slug[slug], d)
+                for slug, d in self.fuzzy_index.suggest(to_slug(basename(src).lower()), k)]
+
+# ------------- Instrumentation -------------
+
+MATCH_TIERS = ("origpath", "origbase", "relpath", "basename", "slug", "fuzzy", "rewrite")
+
+class RunMetrics:
+    """
+    Opt-in wall-clock time per stage plus counters, collected per file and merged
+    into one object per run. Stage times are summed over files (and over workers).
+    """
+
+    def __init__(self, slowest_n: int = 10):
+        self.slowest_n = slowest_n
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {
+            "files": 0,
+            "latin1_fallbacks": 0,
+            "streamed_files": 0,
+            "nodes_visited": 0,
+            "pruned_shapes": 0,
+        }
+        self.tiers: Dict[str, int] = dict.fromkeys(MATCH_TIERS, 0)
+        self.slowest: List[Tuple[float, str]] = []  # min-heap of the slowest files
+
+    def lap(self, stage: str, since: float) -> float:
+        """Add the time since `since` to stage; return now, for the next lap."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - since)
+        return now
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def file_done(self, path: str, seconds: float) -> None:
+        self.counters["files"] += 1
+        item = (seconds, path)
+        if len(self.slowest) < self.slowest_n:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def merge(self, other: "RunMetrics") -> None:
+        for k, v in other.stages.items():
+            self.stages[k] = self.stages.get(k, 0.0) + v
+        for k, v in other.counters.items():
+            if k != "files":
+                self.count(k, v)
+        for k, v in other.tiers.items():
+            self.tiers[k] = self.tiers.get(k, 0) + v
+        for seconds, path in other.slowest:
+            self.file_done(path, seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "stages_seconds": {k: round(v, 6) for k, v in sorted(self.stages.items(), key=lambda kv: -kv[1])},
+            "counters": dict(self.counters),
+            "match_tiers": dict(self.tiers),
+            "slowest_files": [
+                {"file": path, "seconds": round(seconds, 6)}
+                for seconds, path in sorted(self.slowest, reverse=True)
+            ],
+        }
 
 # ------------- Core walker -------------
 
-def update_image_alts_in_json(
-    data: Any,
-    by_relpath: Dict[str, str],
-    by_basename: Dict[str, str],
-    by_slug: Dict[str, str],
-    by_orig_map: Dict[str, Tuple[str, str]],
-    alt_by_origpath: Dict[str, str],
-    alt_by_origbase: Dict[str, str],
-    *,
+def _update_image_node(
+    data: dict,
+    matcher: AltMatcher,
     rewrite_src: bool,
-    updates: Optional[List[Tuple[str, str, Optional[str]]]] = None,  # (old_src, alt, new_src_if_rewritten)
-) -> Tuple[Any, bool]:
+    updates: List[Tuple[str, str, Optional[str]]],
+    metrics: Optional[RunMetrics] = None,
+    misses: Optional[List[str]] = None,
+) -> bool:
     """
-    Traverse JSON, possibly rewrite src (if rewrite_src=True and CSV maps it),
-    and set alt text. Returns (new_data, changed?).
+    Apply the CSV mapping to a single dict node (not its children).
+    Only reads the image/imageSrc/type/attrs/src keys of the node.
+    Image srcs no mapping knows are appended to misses, when given.
     """
     changed = False
-    if updates is None:
-        updates = []
+    target_src = None
 
-    if isinstance(data, dict):
-        target_src = None
+    # Identify a src-bearing node
+    if "image" in data and isinstance(data["image"], dict) and "src" in data["image"]:
+        target_src = data["image"]["src"]
 
-        # Identify a src-bearing node
-        if "image" in data and isinstance(data["image"], dict) and "src" in data["image"]:
-            target_src = data["image"]["src"]
-
-        elif "imageSrc" in data:
-            target_src = data.get("imageSrc")
-
-        elif data.get("type") == "image":
-            attrs = data.get("attrs")
-            # TipTap shape first
-            if isinstance(attrs, dict) and "src" in attrs:
-                target_src = attrs.get("src")
-            # Fallback: many docs use top-level src/alt with type:"image"
-            elif "src" in data:
-                target_src = data.get("src")
+    elif "imageSrc" in data:
+        target_src = data.get("imageSrc")
 
+    elif data.get("type") == "image":
+        attrs = data.get("attrs")
+        # TipTap shape first
+        if isinstance(attrs, dict) and "src" in attrs:
+            target_src = attrs.get("src")
+        # Fallback: many docs use top-level src/alt with type:"image"
         elif "src" in data:
-            candidate = data.get("src")
-            k_rel  = path_only(str(candidate))
-            k_base = basename(str(candidate)).lower()
-            k_slug = to_slug(k_base)
-            # Accept if it looks like an image OR we can match via any mapping (including basename/slug)
-            if (is_image_path(str(candidate)) or
-                k_rel in by_orig_map or
-                k_rel in alt_by_origpath or
-                k_base in alt_by_origbase or
-                k_base in by_basename or
-                k_slug in by_slug):
-                target_src = candidate
-
-        # Now act on the src if present
-        if target_src:
-            old_src = str(target_src)
-            k_rel = path_only(old_src)
-
-            # Prefer rewrite when toggled and mapping exists
-            if rewrite_src and k_rel in by_orig_map:
-                new_rel, alt = by_orig_map[k_rel]
-                if set_src_and_alt_in_node(data, new_rel, alt):
-                    changed = True
-                    updates.append((old_src, alt, new_rel))
-            else:
-                # Just set alt (try orig-link maps first, then normal maps)
-                alt = match_alt_for_src(old_src, by_relpath, by_basename, by_slug, alt_by_origpath, alt_by_origbase)
-                if alt:
-                    # force=True allows alt update even if src isn't a "known image" ext
-                    if set_alt_in_node(data, alt, force=True):
-                        changed = True
-                        updates.append((old_src, alt, None))
-
-        # Recurse
-        for k, v in list(data.items()):
-            new_v, ch = update_image_alts_in_json(
-                v, by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase,
-                rewrite_src=rewrite_src, updates=updates
-            )
-            if ch:
-                data[k] = new_v
+            target_src = data.get("src")
+
+    elif "src" in data:
+        candidate = data.get("src")
+        # Accept if it looks like an image OR we can match via any mapping (including basename/slug)
+        if matcher.match(str(candidate)).known:
+            target_src = candidate
+
+    # Now act on the src if present
+    if target_src:
+        old_src = str(target_src)
+        match = matcher.match(old_src)
+
+        # Prefer rewrite when toggled and mapping exists
+        if rewrite_src and match.rewrite is not None:
+            if metrics is not None:
+                metrics.tiers["rewrite"] += 1
+            new_rel, alt = match.rewrite
+            if set_src_and_alt_in_node(data, new_rel, alt):
                 changed = True
-        return data, changed
-
-    elif isinstance(data, list):
-        out = []
-        any_changed = False
-        for item in data:
-            new_item, ch = update_image_alts_in_json(
-                item, by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase,
-                rewrite_src=rewrite_src, updates=updates
-            )
-            out.append(new_item)
-            any_changed = any_changed or ch
-        return out, any_changed
+                updates.append((old_src, alt, new_rel))
+        else:
+            # Just set alt (try orig-link maps first, then normal maps)
+            alt = match.alt
+            if alt:
+                if metrics is not None:
+                    metrics.tiers[match.tier] += 1
+                # force=True allows alt update even if src isn't a "known image" ext
+                if set_alt_in_node(data, alt, force=True):
+                    changed = True
+                    updates.append((old_src, alt, None))
+            elif misses is not None:
+                misses.append(old_src)
+    return changed
 
-    else:
-        return data, False
+class _PruneMark:
+    """Stack entry: prune this image node once its whole subtree has been walked."""
+    __slots__ = ("node",)
 
-# ------------- Post-processing (prune duplicates) -------------
+    def __init__(self, node: dict):
+        self.node = node
 
-def _prune_duplicate_image_shapes(data: Any) -> Tuple[Any, bool]:
+def _prune_image_node(node: dict) -> bool:
     """
     Remove redundant TipTap attrs when they exactly duplicate top-level image fields.
     Only prunes nodes with type:"image" that have both shapes present and identical.
     """
+    if node.get("type") == "image" and "src" in node and isinstance(node.get("attrs"), dict):
+        a = node["attrs"]
+        if "src" in a:
+            same_src = a.get("src") == node.get("src")
+            same_alt = a.get("alt") == node.get("alt")
+            if same_src and same_alt:
+                del node["attrs"]
+                return True
+    return False
+
+def walk_image_nodes(
+    data: Any,
+    matcher: Optional[AltMatcher],
+    *,
+    rewrite_src: bool = False,
+    updates: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+    prune: bool = True,
+    metrics: Optional[RunMetrics] = None,
+    ops: Optional[List[PatchOp]] = None,
+    misses: Optional[List[str]] = None,
+) -> bool:
+    """
+    Update alts/srcs and prune duplicate image shapes in one pass, in place.
+    Returns changed?.
+
+    Uses an explicit stack instead of recursion (no depth limit) and never copies
+    containers. Nodes are updated in document pre-order, so updates come out in the
+    same order as a recursive walk; pruning happens once a node's subtree is done,
+    which gives the same result as a separate prune pass after all updates.
+    matcher=None only prunes. With an ops list, every touched field is also
+    recorded as (op, json_pointer, old, new). Unmatched image srcs go to misses.
+    """
+    if updates is None:
+        updates = []
+    if ops is not None:
+        return _walk_image_nodes_tracked(data, matcher, rewrite_src, updates, prune, metrics, ops, misses)
     changed = False
+    visited = pruned = 0
+    stack = [data]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    while stack:
+        node = pop()
+        if isinstance(node, dict):
+            visited += 1
+            if matcher is not None and _update_image_node(node, matcher, rewrite_src, updates, metrics, misses):
+                changed = True
+            if prune and node.get("type") == "image" and "src" in node and isinstance(node.get("attrs"), dict):
+                push(_PruneMark(node))
+            extend(reversed(node.values()))
+        elif isinstance(node, list):
+            extend(reversed(node))
+        elif node.__class__ is _PruneMark:
+            if _prune_image_node(node.node):
+                pruned += 1
+                changed = True
+    if metrics is not None:
+        metrics.count("nodes_visited", visited)
+        metrics.count("pruned_shapes", pruned)
+    return changed
+
+# Fields the node-level update can set, as paths from the node
+_TRACKED_FIELDS = (("alt",), ("src",), ("imageAlt",), ("imageSrc",),
+                   ("attrs", "alt"), ("attrs", "src"), ("image", "alt"), ("image", "src"))
+_MISSING = object()
+
+def _pointer_token(key: Any) -> str:
+    key = str(key)
+    if "~" in key or "/" in key:
+        return key.replace("~", "~0").replace("/", "~1")
+    return key
+
+def _tracked_fields(node: dict) -> List[Any]:
+    """Values at _TRACKED_FIELDS (in that order), _MISSING where absent."""
+    get = node.get
+    attrs, image = get("attrs"), get("image")
+    attrs_get = attrs.get if isinstance(attrs, dict) else _missing_get
+    image_get = image.get if isinstance(image, dict) else _missing_get
+    return [get("alt", _MISSING), get("src", _MISSING), get("imageAlt", _MISSING), get("imageSrc", _MISSING),
+            attrs_get("alt", _MISSING), attrs_get("src", _MISSING), image_get("alt", _MISSING), image_get("src", _MISSING)]
+
+def _missing_get(_key: str, default: Any) -> Any:
+    return default
 
-    if isinstance(data, dict):
-        if data.get("type") == "image" and "src" in data and isinstance(data.get("attrs"), dict):
-            a = data["attrs"]
-            if "src" in a:
-                same_src = a.get("src") == data.get("src")
-                same_alt = a.get("alt") == data.get("alt")
-                if same_src and same_alt:
-                    data.pop("attrs", None)
+def _link_pointer(link: Optional[tuple]) -> str:
+    """JSON Pointer of a (parent_link, key) chain, built only for the fields that changed."""
+    tokens = []
+    while link is not None:
+        link, key = link
+        tokens.append(_pointer_token(key))
+    tokens.append("")
+    return "/".join(reversed(tokens))
+
+def _key_position(node: dict, path: Tuple[str, ...]) -> Tuple[int, ...]:
+    pos = []
+    for k in path:
+        keys = list(node) if isinstance(node, dict) else []
+        pos.append(keys.index(k) if k in keys else len(keys))
+        node = node.get(k) if isinstance(node, dict) else None
+    return tuple(pos)
+
+def _record_field_ops(node: dict, before: List[Any], ptr: str, ops: List[PatchOp]) -> None:
+    """Append an op for each tracked field of node (at ptr) that differs from before."""
+    # Emit in the node's key order so applying the "add" ops
+    # reproduces the member order the rewrite produced.
+    diffs = sorted(
+        (_key_position(node, path), path, old, new)
+        for path, old, new in zip(_TRACKED_FIELDS, before, _tracked_fields(node))
+        if old is not new and (old is _MISSING or new is _MISSING or old != new)
+    )
+    for _pos, path, old, new in diffs:
+        op = "add" if old is _MISSING else "replace"
+        ops.append((op, ptr + "/" + "/".join(path), None if old is _MISSING else old, new))
+
+def _walk_image_nodes_tracked(
+    data: Any,
+    matcher: Optional[AltMatcher],
+    rewrite_src: bool,
+    updates: List[Tuple[str, str, Optional[str]]],
+    prune: bool,
+    metrics: Optional[RunMetrics],
+    ops: List[PatchOp],
+    misses: Optional[List[str]] = None,
+) -> bool:
+    """
+    walk_image_nodes that also records each touched field as a JSON Pointer op.
+    Stack entries carry a (parent_link, key) chain rather than a pointer string,
+    and fields are only snapshotted on nodes _update_image_node can act on.
+    """
+    changed = False
+    visited = pruned = 0
+    stack: List[Tuple[Any, Optional[tuple]]] = [(data, None)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node, link = pop()
+        if isinstance(node, dict):
+            visited += 1
+            if matcher is not None and ("src" in node or "imageSrc" in node or "image" in node or
+                                        node.get("type") == "image"):
+                before = _tracked_fields(node)
+                if _update_image_node(node, matcher, rewrite_src, updates, metrics, misses):
                     changed = True
-        for k, v in list(data.items()):
-            new_v, ch = _prune_duplicate_image_shapes(v)
-            if ch:
-                data[k] = new_v
+                    _record_field_ops(node, before, _link_pointer(link), ops)
+            if prune and node.get("type") == "image" and "src" in node and isinstance(node.get("attrs"), dict):
+                push((_PruneMark(node), link))
+            # Scalars can't hold image nodes: only containers get a stack entry (and a link)
+            for k, v in reversed(node.items()):
+                if isinstance(v, (dict, list)):
+                    push((v, (link, k)))
+        elif isinstance(node, list):
+            for i in range(len(node) - 1, -1, -1):
+                if isinstance(node[i], (dict, list)):
+                    push((node[i], (link, i)))
+        elif node.__class__ is _PruneMark:
+            attrs = node.node.get("attrs")
+            if _prune_image_node(node.node):
+                pruned += 1
                 changed = True
-        return data, changed
+                ops.append(("remove", _link_pointer(link) + "/attrs", attrs, None))
+    if metrics is not None:
+        metrics.count("nodes_visited", visited)
+        metrics.count("pruned_shapes", pruned)
+    return changed
 
-    if isinstance(data, list):
-        out = []
-        for item in data:
-            new_item, ch = _prune_duplicate_image_shapes(item)
-            out.append(new_item)
-            changed = changed or ch
-        return out, changed
+def patch_ops_to_json(ops: List[PatchOp]) -> List[dict]:
+    """RFC 6902 JSON Patch operations for recorded ops."""
+    out = []
+    for op, ptr, _old, new in ops:
+        out.append({"op": op, "path": ptr} if op == "remove" else {"op": op, "path": ptr, "value": new})
+    return out
 
+def update_image_alts_in_json(
+    data: Any,
+    matcher: AltMatcher,
+    *,
+    rewrite_src: bool,
+    updates: Optional[List[Tuple[str, str, Optional[str]]]] = None,  # (old_src, alt, new_src_if_rewritten)
+) -> Tuple[Any, bool]:
+    """
+    Traverse JSON, possibly rewrite src (if rewrite_src=True and CSV maps it),
+    and set alt text. Returns (new_data, changed?); data is updated in place.
+    """
+    changed = walk_image_nodes(data, matcher, rewrite_src=rewrite_src, updates=updates, prune=False)
     return data, changed
 
+# ------------- Post-processing (prune duplicates) -------------
+
+def _prune_duplicate_image_shapes(data: Any) -> Tuple[Any, bool]:
+    """
+    Remove redundant TipTap attrs when they exactly duplicate top-level image fields,
+    anywhere in the document. Returns (data, changed?); data is pruned in place.
+    """
+    return data, walk_image_nodes(data, None)
+
+# ------------- Snapshot backups -------------
+
+BACKUP_DIRNAME = "backup_jsonFiles"
+
+class SnapshotBackup:
+    """
+    Lazy, deduplicated backups of the files a run is about to rewrite.
+
+      backup_jsonFiles/objects/ab/<sha256>.json   one copy per distinct original content
+      backup_jsonFiles/snapshots/<stamp>/<rel>    that run's originals, linked to the objects
+
+    save() is called right before a file is replaced, so untouched files cost
+    nothing. Objects and snapshot entries are hard links where the filesystem
+    allows it (plain copies otherwise); that is safe because this script always
+    replaces files via a rename and never writes into an existing inode.
+    """
+
+    def __init__(self, backup_dir: Path, json_root: Path, stamp: str):
+        self.backup_dir = backup_dir
+        self.json_root = json_root
+        self.snapshot_dir = backup_dir / "snapshots" / stamp
+
+    @classmethod
+    def start(cls, backup_dir: Path, json_root: Path) -> "SnapshotBackup":
+        """Reserve a new timestamped snapshot folder."""
+        stamp = base = time.strftime("%Y%m%d-%H%M%S")
+        n = 0
+        while True:
+            try:
+                (backup_dir / "snapshots" / stamp).mkdir(parents=True)
+                return cls(backup_dir, json_root, stamp)
+            except FileExistsError:
+                n += 1
+                stamp = f"{base}-{n}"
+
+    def finish(self) -> bool:
+        """Drop the snapshot folder if nothing was saved. Returns True if it was kept."""
+        try:
+            self.snapshot_dir.rmdir()
+            return False
+        except OSError:
+            return True
+
+    def save(self, path: Path, data: Optional[bytes] = None) -> bool:
+        """
+        Record path's current content, or data if the caller already read it. The
+        file is only linked in while its bytes are still data: a file edited since
+        it was read ahead (pipelined runs) gets data written as its object instead.
+        """
+        try:
+            digest = hashlib.sha256(data).hexdigest() if data is not None else _file_sha256(path)
+            obj = self.backup_dir / "objects" / digest[:2] / f"{digest}.json"
+            if not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                if data is None or _file_sha256(path) == digest:
+                    _link_or_copy(path, obj)
+                else:
+                    _atomic_write_bytes(obj, data)
+            target = self.snapshot_dir / path.relative_to(self.json_root)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(obj, target)
+            return True
+        except Exception as e:
+            print(f"[WARN] Backup failed: {path.name} ({e})")
+            return False
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link src to dst, or copy it when links aren't possible; an existing dst is kept."""
+    try:
+        os.link(src, dst)
+        return
+    except FileExistsError:
+        return
+    except OSError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=str(dst.parent), prefix=f".{dst.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def list_snapshots(backup_dir: Path) -> List[str]:
+    """Snapshot names, oldest first."""
+    snapshots = backup_dir / "snapshots"
+    if not snapshots.is_dir():
+        return []
+    # "<stamp>" then "<stamp>-1", "<stamp>-2", ... for runs started within the same second
+    return sorted((p.name for p in snapshots.iterdir() if p.is_dir()),
+                  key=lambda name: (name[:15], int(name[16:]) if name[16:].isdigit() else 0))
+
+def restore_snapshot(
+    name: Optional[str] = None,
+    *,
+    json_root: Optional[Path] = None,
+    backup_dir: Optional[Path] = None,
+) -> dict:
+    """
+    Copy the files of a snapshot ("latest" or None for the newest) back into
+    jsonFiles/ (or json_root). The files being overwritten are themselves saved
+    to a new snapshot first, so a restore can be undone the same way.
+    """
+    json_root = Path(json_root) if json_root else find_json_root()
+    backup_dir = Path(backup_dir) if backup_dir else _script_dir() / BACKUP_DIRNAME
+    names = list_snapshots(backup_dir)
+    if name in (None, "", "latest"):
+        name = names[-1] if names else None
+    if name is None or name not in names:
+        print(f"[WARN] No snapshot {name!r} in {backup_dir.name}/snapshots (available: {', '.join(names) or 'none'})")
+        return {"snapshot": name, "restored_files": []}
+
+    source = backup_dir / "snapshots" / name
+    undo = SnapshotBackup.start(backup_dir, json_root)
+    restored = []
+    for src in sorted(p for p in source.rglob("*") if p.is_file()):
+        rel = src.relative_to(source)
+        dst = json_root / rel
+        if dst.exists():
+            if filecmp.cmp(src, dst, shallow=False):
+                continue
+            if not undo.save(dst):
+                continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write_bytes(dst, src.read_bytes())
+        restored.append(rel.as_posix())
+    kept = undo.finish()
+
+    print(f"Restored:   {len(restored)} files from {backup_dir.name}/snapshots/{name}")
+    if kept:
+        print(f"Undo:       ALT_RESTORE={undo.snapshot_dir.name}")
+    return {"snapshot": name, "restored_files": restored,
+            "undo_snapshot": undo.snapshot_dir.name if kept else None}
+
+# ------------- Streaming rewrite (large files) -------------
+
+# Members a node's own update/prune step may read or rewrite. Their values are
+# materialized (strings or small image dicts); every other member is streamed
+# straight through. "attrs" is only touched on type:"image" nodes, so it is
+# materialized unless the node's type is already known to be something else.
+_STREAM_NODE_KEYS = frozenset(("src", "alt", "imageSrc", "imageAlt", "image"))
+
+_STREAM_CHUNK = 1 << 16          # characters read per refill
+_STREAM_SPOOL_BYTES = 1 << 20    # held output per open image node before spilling to disk
+
+_WS_RE = re.compile(r"[ \t\n\r]*")
+_SCALAR_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null|NaN|-?Infinity")
+
+class _StreamFallback(Exception):
+    """The document can't be streamed byte-identically (e.g. duplicate keys)."""
+
+def _dumps(value: Any, depth: int = 0) -> str:
+    """Serialize a value exactly as json.dumps(indent=2) would at the given nesting depth."""
+    s = json.dumps(value, ensure_ascii=False, indent=2)
+    if depth and isinstance(value, (dict, list)):
+        s = s.replace("\n", "\n" + "  " * depth)
+    return s
+
+class _JsonReader:
+    """Pull tokenizer over a text stream; holds only a small window of the input."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(_STREAM_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at end of input)."""
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"Expecting {ch!r} at offset {self.pos}")
+        self.pos += 1
+
+    def read_string(self) -> str:
+        # self.buf[self.pos] is the opening quote; find the closing one first so a
+        # long string is scanned once, not once per refill
+        i = self.pos + 1
+        while True:
+            j = self.buf.find('"', i)
+            if j < 0:
+                i = len(self.buf) - self.pos
+                if not self._fill():
+                    raise ValueError("Unterminated string")
+                continue
+            k = j - 1
+            while self.buf[k] == "\\":
+                k -= 1
+            if (j - 1 - k) % 2 == 0:
+                break
+            i = j + 1
+        value, self.pos = json.decoder.scanstring(self.buf, self.pos + 1, True)
+        return value
+
+    def read_scalar(self) -> Any:
+        if self.peek() == '"':
+            return self.read_string()
+        while True:
+            m = _SCALAR_RE.match(self.buf, self.pos)
+            # a number cut by the window edge ("1.", "1e+") may still continue
+            if (m is None or len(self.buf) - m.end() < 3) and self._fill():
+                continue
+            break
+        if m is None:
+            raise ValueError(f"Expecting value at offset {self.pos}")
+        self.pos = m.end()
+        return json.loads(m.group())
+
+    def read_value(self) -> Any:
+        """Materialize the next value (used for the small members of image nodes)."""
+        c = self.peek()
+        if c == "{":
+            self.pos += 1
+            obj: Dict[str, Any] = {}
+            if self.peek() == "}":
+                self.pos += 1
+                return obj
+            while True:
+                if self.peek() != '"':
+                    raise ValueError(f"Expecting property name at offset {self.pos}")
+                key = self.read_string()
+                self.expect(":")
+                obj[key] = self.read_value()
+                c = self.peek()
+                self.pos += 1
+                if c == "}":
+                    return obj
+                if c != ",":
+                    raise ValueError(f"Expecting ',' delimiter at offset {self.pos}")
+        if c == "[":
+            self.pos += 1
+            arr: List[Any] = []
+            if self.peek() == "]":
+                self.pos += 1
+                return arr
+            while True:
+                arr.append(self.read_value())
+                c = self.peek()
+                self.pos += 1
+                if c == "]":
+                    return arr
+                if c != ",":
+                    raise ValueError(f"Expecting ',' delimiter at offset {self.pos}")
+        return self.read_scalar()
+
+class _CountingSink:
+    """Text sink that tracks how many characters were written to it."""
+    __slots__ = ("f", "n")
+
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+
+    def write(self, s: str) -> None:
+        self.n += len(s)
+        self.f.write(s)
+
+class _NullSink:
+    def write(self, s: str) -> None:
+        pass
+
+class _StreamFrame:
+    """An open object/array in the output. Objects that hold an image member buffer
+    their remaining output (spool) until the closing brace, when the node is decided."""
+    __slots__ = ("is_dict", "depth", "sink", "count", "started", "self_marker", "op_marker", "link",
+                 "keys", "type_state", "proxy", "spool", "segments", "markers")
+
+    def __init__(self, is_dict: bool, depth: int, sink, self_marker: int,
+                 op_marker: int = 0, link: Optional[tuple] = None):
+        self.is_dict = is_dict
+        self.depth = depth
+        self.sink = sink
+        self.count = 0                    # members already written to sink
+        self.started = False
+        self.self_marker = self_marker    # len(updates) when the node opened
+        self.op_marker = op_marker        # len(ops) when the node opened (when recording ops)
+        self.link = link                  # (parent_link, key) chain, when recording ops
+        self.keys: set = set()
+        self.type_state: Optional[str] = None   # None | "image" | "other"
+        self.proxy: Dict[str, Any] = {}   # materialized image-related members (+ scalar type)
+        self.spool: Optional[_CountingSink] = None
+        self.segments: List[Any] = []     # int: start of a streamed member in spool; str: proxy key
+        self.markers: List[Tuple[int, int, str]] = []  # (len(updates), len(ops), key) for container proxy members
+
+class _StreamRewriter:
+    """
+    Rewrite a JSON document from a _JsonReader to a text sink, producing exactly
+    json.dumps(new_data, ensure_ascii=False, indent=2) of what the in-memory path
+    would produce, and the same updates in the same order. With an ops list, the
+    touched fields are recorded as _walk_image_nodes_tracked records them.
+    """
+
+    def __init__(self, reader: _JsonReader, matcher: AltMatcher, rewrite_src: bool,
+                 updates: List[Tuple[str, str, Optional[str]]],
+                 metrics: Optional[RunMetrics] = None,
+                 misses: Optional[List[str]] = None,
+                 ops: Optional[List[PatchOp]] = None):
+        self.reader = reader
+        self.matcher = matcher
+        self.rewrite_src = rewrite_src
+        self.updates = updates
+        self.metrics = metrics
+        self.misses = misses
+        self.ops = ops
+        self.changed = False
+
+    def run(self, out) -> None:
+        r = self.reader
+        stack: List[_StreamFrame] = []
+        self._begin_value(out, 0, stack)
+        while stack:
+            fr = stack[-1]
+            c = r.peek()
+            closing = "}" if fr.is_dict else "]"
+            if c == closing:
+                r.pos += 1
+                stack.pop()
+                self._close(fr)
+                continue
+            if fr.started:
+                if c != ",":
+                    raise ValueError(f"Expecting ',' delimiter at offset {r.pos}")
+                r.pos += 1
+            fr.started = True
+            if fr.is_dict:
+                self._member(fr, stack)
+            else:
+                fr.sink.write(("[\n" if fr.count == 0 else ",\n") + "  " * (fr.depth + 1))
+                fr.count += 1
+                self._begin_value(fr.sink, fr.depth + 1, stack, fr, fr.count - 1)
+
+    def _begin_value(self, sink, depth: int, stack: List[_StreamFrame],
+                     parent: Optional[_StreamFrame] = None, key: Any = None) -> None:
+        r = self.reader
+        c = r.peek()
+        if c == "{" or c == "[":
+            r.pos += 1
+            if self.ops is None:
+                stack.append(_StreamFrame(c == "{", depth, sink, len(self.updates)))
+            else:
+                link = (parent.link, key) if parent is not None else None
+                stack.append(_StreamFrame(c == "{", depth, sink, len(self.updates), len(self.ops), link))
+        else:
+            sink.write(_dumps(r.read_scalar()))
+
+    def _member(self, fr: _StreamFrame, stack: List[_StreamFrame]) -> None:
+        r = self.reader
+        if r.peek() != '"':
+            raise ValueError(f"Expecting property name at offset {r.pos}")
+        key = r.read_string()
+        r.expect(":")
+        if key in fr.keys:
+            # json.loads keeps the first position and the last value; not worth replicating
+            raise _StreamFallback(f"duplicate key {key!r}")
+        fr.keys.add(key)
+
+        if key in _STREAM_NODE_KEYS or (key == "attrs" and fr.type_state != "other"):
+            value = r.read_value()
+            fr.proxy[key] = value
+            if isinstance(value, (dict, list)):
+                fr.markers.append((len(self.updates), len(self.ops) if self.ops is not None else 0, key))
+            if fr.spool is None:
+                spool = tempfile.SpooledTemporaryFile(
+                    max_size=_STREAM_SPOOL_BYTES, mode="w+", encoding="utf-8", newline=""
+                )
+                fr.spool = _CountingSink(spool)
+            fr.segments.append(key)
+            return
+
+        c = r.peek()
+        if key == "type" and c != "{" and c != "[":
+            value = r.read_scalar()
+            fr.proxy["type"] = value
+            fr.type_state = "image" if value == "image" else "other"
+            self._member_sink(fr, key).write(_dumps(value))
+            return
+        if key == "type":
+            fr.type_state = "other"
+        self._begin_value(self._member_sink(fr, key), fr.depth + 1, stack, fr, key)
+
+    def _member_sink(self, fr: _StreamFrame, key: str):
+        """Write a streamed member's '"key": ' prefix and return the sink for its value."""
+        if fr.spool is None:
+            fr.sink.write(("{\n" if fr.count == 0 else ",\n") + "  " * (fr.depth + 1) + _dumps(key) + ": ")
+            fr.count += 1
+            return fr.sink
+        fr.segments.append(fr.spool.n)
+        fr.spool.write(_dumps(key) + ": ")
+        return fr.spool
+
+    def _close(self, fr: _StreamFrame) -> None:
+        ind = "  " * fr.depth
+        if fr.is_dict and self.metrics is not None:
+            self.metrics.count("nodes_visited")
+        if not fr.is_dict or fr.spool is None:
+            if fr.count == 0:
+                fr.sink.write("{}" if fr.is_dict else "[]")
+            else:
+                fr.sink.write("\n" + ind + ("}" if fr.is_dict else "]"))
+            return
+
+        # Same order as the in-memory walker: the node itself, then its children in key
+        # order. Streamed children already logged their updates; slot ours in around them.
+        proxy = fr.proxy
+        ops = self.ops
+        own: List[Tuple[str, str, Optional[str]]] = []
+        own_ops: List[PatchOp] = []
+        ptr = _link_pointer(fr.link) if ops is not None else ""
+        before = _tracked_fields(proxy) if ops is not None else None
+        if _update_image_node(proxy, self.matcher, self.rewrite_src, own, self.metrics, self.misses):
+            self.changed = True
+            if ops is not None:
+                _record_field_ops(proxy, before, ptr, own_ops)
+        inserts = [(fr.self_marker, own)]
+        op_inserts = [(fr.op_marker, own_ops)]
+        for marker, op_marker, key in fr.markers:
+            sub: List[Tuple[str, str, Optional[str]]] = []
+            if ops is None:
+                if walk_image_nodes(proxy[key], self.matcher, rewrite_src=self.rewrite_src, updates=sub,
+                                    metrics=self.metrics, misses=self.misses):
+                    self.changed = True
+            else:
+                sub_ops: List[PatchOp] = []
+                if _walk_image_nodes_tracked(proxy[key], self.matcher, self.rewrite_src, sub, True,
+                                             self.metrics, sub_ops, self.misses):
+                    self.changed = True
+                prefix = ptr + "/" + _pointer_token(key)
+                op_inserts.append((op_marker, [(op, prefix + p, old, new) for op, p, old, new in sub_ops]))
+            inserts.append((marker, sub))
+        for marker, sub in reversed(inserts):
+            if sub:
+                self.updates[marker:marker] = sub
+        if ops is not None:
+            for marker, sub_ops in reversed(op_inserts):
+                if sub_ops:
+                    ops[marker:marker] = sub_ops
+        attrs = proxy.get("attrs")
+        if _prune_image_node(proxy):
+            if self.metrics is not None:
+                self.metrics.count("pruned_shapes")
+            self.changed = True
+            if ops is not None:
+                ops.append(("remove", ptr + "/attrs", attrs, None))
+
+        out = fr.sink
+        count = fr.count
+        ind1 = "  " * (fr.depth + 1)
+        spool = fr.spool.f
+        spool.seek(0)
+        starts = [seg for seg in fr.segments if isinstance(seg, int)]
+        ends = iter(starts[1:] + [fr.spool.n])
+        for seg in fr.segments:
+            if isinstance(seg, int):
+                out.write(("{\n" if count == 0 else ",\n") + ind1)
+                remaining = next(ends) - seg
+                while remaining > 0:
+                    chunk = spool.read(min(remaining, _STREAM_CHUNK))
+                    if not chunk:
+                        raise ValueError("Spooled output truncated")
+                    out.write(chunk)
+                    remaining -= len(chunk)
+                count += 1
+            elif seg in proxy:
+                out.write(("{\n" if count == 0 else ",\n") + ind1 + _dumps(seg) + ": " + _dumps(proxy[seg], fr.depth + 1))
+                count += 1
+        # Keys the update added (e.g. a missing alt) go last, as dict insertion would put them
+        for key, value in proxy.items():
+            if key not in fr.keys:
+                out.write(("{\n" if count == 0 else ",\n") + ind1 + _dumps(key) + ": " + _dumps(value, fr.depth + 1))
+                count += 1
+        out.write("{}" if count == 0 else "\n" + ind + "}")
+        spool.close()
+
+def _process_json_file_streaming(
+    path: Path,
+    matcher: AltMatcher,
+    *,
+    write: bool,
+    rewrite_src: bool,
+    metrics: Optional[RunMetrics] = None,
+    backup: Optional[SnapshotBackup] = None,
+    misses: Optional[List[str]] = None,
+    ops: Optional[List[PatchOp]] = None,
+) -> Optional[Tuple[bool, List[Tuple[str, str, Optional[str]]]]]:
+    """
+    Streaming variant of process_json_file: output is written to a temp file next
+    to the original and swapped in only if something changed. Returns None if the
+    document can't be streamed (invalid JSON, undecodable as UTF-8, duplicate keys),
+    in which case the caller falls back to the in-memory path.
+    """
+    updates: List[Tuple[str, str, Optional[str]]] = []
+    own_misses: Optional[List[str]] = [] if misses is not None else None
+    own_ops: Optional[List[PatchOp]] = [] if ops is not None else None
+    tmp_path: Optional[str] = None
+    out = None
+    try:
+        with path.open("r", encoding="utf-8", newline="") as f:
+            if write:
+                fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+                out = open(fd, "w", encoding="utf-8")
+            else:
+                out = _NullSink()
+            reader = _JsonReader(f)
+            rewriter = _StreamRewriter(reader, matcher, rewrite_src, updates, metrics, own_misses, own_ops)
+            rewriter.run(out)
+            if reader.peek() != "":
+                raise ValueError(f"Extra data at offset {reader.pos}")
+            out.write("\n")
+        if write:
+            out.close()
+            if rewriter.changed and not filecmp.cmp(tmp_path, path, shallow=False):
+                if backup is not None and backup.save(path) and metrics is not None:
+                    metrics.count("backed_up_files")
+                shutil.copymode(path, tmp_path)
+                os.replace(tmp_path, path)
+                tmp_path = None
+    except Exception:
+        return None
+    finally:
+        if write and out is not None and not out.closed:
+            out.close()
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    if misses is not None:
+        misses.extend(own_misses)
+    if ops is not None:
+        ops.extend(own_ops)
+    return rewriter.changed, updates
+
 # ------------- File processing -------------
 
+def _encode_text(text: str) -> bytes:
+    """Bytes that path.write_text(text, encoding="utf-8") would have written."""
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write through a temp file in the same folder and rename it over path, keeping its mode."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with open(fd, "wb") as f:
+            f.write(data)
+        if path.exists():
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+# ---- Prefilter: documents the walker provably leaves unchanged ----
+
+# Every string value of a "src"/"imageSrc" member: a superset of the srcs the walker acts on
+_SRC_VALUE_RE = re.compile(r'"(?:src|imageSrc)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_SRC_KEY_RE = re.compile(r'"(?:src|imageSrc)"')
+_IMAGE_TYPE_RE = re.compile(r'"type"\s*:\s*"image"')
+
+def _has_src_tokens(raw_bytes: bytes) -> bool:
+    """
+    False when no member can be named "src" or "imageSrc": every image shape the
+    walker updates or prunes has one. Both names end in rc", so one scan covers
+    them; a \\u escape could spell either, so it counts as a possible token too.
+    """
+    return b'rc"' in raw_bytes or (b"\\" in raw_bytes and b"\\u" in raw_bytes)
+
+def _srcs_cannot_change(raw_bytes: bytes, text: str, matcher: AltMatcher, rewrite_src: bool) -> bool:
+    """
+    True when every src/imageSrc member holds a string the mapping has no alt
+    (and, with rewrite_src, no rewrite) for, and no type:"image" node could have
+    duplicate attrs to prune: the walk would change nothing.
+    """
+    if (b"\\" in raw_bytes and b"\\u" in raw_bytes) or ('"attrs"' in text and _IMAGE_TYPE_RE.search(text)):
+        return False
+    # Files that do change usually have a mapped src early on: check srcs as they are found
+    found = 0
+    for value_match in _SRC_VALUE_RE.finditer(text):
+        value = value_match.group(1)
+        if "\\" in value:
+            try:
+                value = json.loads(f'"{value}"')
+            except ValueError:
+                return False
+        m = matcher.match(value)
+        if m.alt or (rewrite_src and m.rewrite is not None):
+            return False
+        found += 1
+    # A non-string src, or "src" used as a value: let the walker decide
+    return found == len(_SRC_KEY_RE.findall(text))
+
+class DocumentCache:
+    """
+    Outcomes of the documents already processed in this run, by content hash, so
+    byte-identical files (locale copies, mirrored pages) are parsed, walked and
+    serialized once: (changed, output bytes or None, updates, ops, misses).
+    Output bytes count against max_bytes; past it, new changed documents are no
+    longer cached and are simply processed again when repeated.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._results: Dict[bytes, tuple] = {}
+
+    @staticmethod
+    def key(raw_bytes: bytes) -> bytes:
+        return hashlib.sha256(raw_bytes).digest()
+
+    def get(self, key: bytes) -> Optional[tuple]:
+        return self._results.get(key)
+
+    def put(self, key: bytes, changed: bool, out: Optional[bytes], updates: List[Update],
+            ops: Optional[List[PatchOp]], misses: Optional[List[str]]) -> None:
+        cost = len(out) if out is not None else 0
+        if self.size + cost > self.max_bytes:
+            return
+        self.size += cost
+        self._results[key] = (changed, out, tuple(updates),
+                              tuple(ops) if ops is not None else None,
+                              tuple(misses) if misses is not None else None)
+
+def _write_output(
+    path: Path,
+    out: bytes,
+    raw_bytes: bytes,
+    *,
+    backup: Optional[SnapshotBackup],
+    write_behind: Optional["_WriteBehind"],
+    metrics: Optional[RunMetrics],
+    t: float,
+) -> None:
+    """Replace path with out (backup first), unless the bytes are unchanged."""
+    if out != raw_bytes and write_behind is not None:
+        write_behind.put(path, out, raw_bytes)
+    elif out != raw_bytes:
+        if backup is not None and backup.save(path, raw_bytes) and metrics is not None:
+            metrics.count("backed_up_files")
+        _atomic_write_bytes(path, out)
+        if metrics is not None:
+            metrics.lap("write", t)
+    elif metrics is not None:
+        metrics.count("identical_writes_skipped")
+
 def process_json_file(
     path: Path,
-    by_relpath: Dict[str, str],
-    by_basename: Dict[str, str],
-    by_slug: Dict[str, str],
-    by_orig_map: Dict[str, Tuple[str, str]],
-    alt_by_origpath: Dict[str, str],
-    alt_by_origbase: Dict[str, str],
+    matcher: AltMatcher,
     *,
     write: bool,
-    rewrite_src: bool
+    rewrite_src: bool,
+    stream_min_bytes: Optional[int] = None,
+    metrics: Optional[RunMetrics] = None,
+    ops: Optional[List[PatchOp]] = None,
+    backup: Optional[SnapshotBackup] = None,
+    raw_bytes: Optional[bytes] = None,
+    write_behind: Optional["_WriteBehind"] = None,
+    misses: Optional[List[str]] = None,
+    dedupe: Optional[DocumentCache] = None,
+    prefilter: bool = False,
 ) -> Tuple[bool, List[Tuple[str, str, Optional[str]]]]:
+    """
+    Update one JSON file in place. The new content is written atomically, and only
+    when its bytes differ from what is on disk. Files of at least stream_min_bytes
+    are rewritten by the streaming path (same output bytes, bounded memory).
+    Stage times and counters go to metrics, and touched fields to ops, when given.
+    With a backup, the original is saved to its snapshot just before being replaced.
+
+    raw_bytes is the file's content when it was already read ahead (never streamed);
+    with a write_behind, the new content is queued for it instead of written here.
+    Image srcs that no mapping knows are appended to misses, when given.
+    With a dedupe cache, a file whose bytes were already processed this run
+    reuses that outcome instead of being parsed again. With prefilter, files with
+    no src/imageSrc tokens are not decoded or parsed at all, and files whose srcs
+    the mapping has nothing for are not parsed (this second check needs matcher
+    lookups only, so it is skipped when misses are collected).
+    """
+    t = time.perf_counter() if metrics is not None else 0.0
+    if (raw_bytes is None and stream_min_bytes is not None and
+            path.stat().st_size >= stream_min_bytes):
+        result = _process_json_file_streaming(
+            path, matcher, write=write, rewrite_src=rewrite_src, metrics=metrics, backup=backup,
+            misses=misses, ops=ops
+        )
+        if result is not None:
+            if metrics is not None:
+                metrics.lap("stream", t)
+                metrics.count("streamed_files")
+            return result
+
     updates: List[Tuple[str, str, Optional[str]]] = []
+    if raw_bytes is None:
+        raw_bytes = path.read_bytes()
+        if metrics is not None:
+            t = metrics.lap("read", t)
+    elif metrics is not None:
+        metrics.count("read_ahead_files")
+    if prefilter and not _has_src_tokens(raw_bytes):
+        if metrics is not None:
+            metrics.lap("prefilter", t)
+            metrics.count("prefiltered_files")
+        return False, updates
+    key = None
+    if dedupe is not None:
+        key = dedupe.key(raw_bytes)
+        hit = dedupe.get(key)
+        if hit is not None:
+            changed, out, known_updates, known_ops, known_misses = hit
+            updates.extend(known_updates)
+            if ops is not None:
+                ops.extend(known_ops or ())
+            if misses is not None:
+                misses.extend(known_misses or ())
+            if metrics is not None:
+                t = metrics.lap("dedupe", t)
+                metrics.count("duplicate_files")
+            if changed and write:
+                _write_output(path, out, raw_bytes, backup=backup, write_behind=write_behind, metrics=metrics, t=t)
+            return changed, updates
     try:
-        raw = path.read_text(encoding="utf-8")
-    except Exception:
-        raw = path.read_text(encoding="latin-1")
+        raw = raw_bytes.decode("utf-8")
+    except UnicodeDecodeError:
+        raw = raw_bytes.decode("latin-1")
+        if metrics is not None:
+            metrics.count("latin1_fallbacks")
+    if metrics is not None:
+        t = metrics.lap("decode", t)
+    if prefilter and misses is None and _srcs_cannot_change(raw_bytes, raw, matcher, rewrite_src):
+        if metrics is not None:
+            metrics.lap("prefilter", t)
+            metrics.count("prefiltered_files")
+        return False, updates
     try:
         data = json.loads(raw)
     except Exception as e:
         print(f"[WARN] Skipping non-JSON or invalid JSON: {path.name} ({e})")
         return False, updates
+    if metrics is not None:
+        t = metrics.lap("parse", t)
 
-    new_data, changed = update_image_alts_in_json(
-        data, by_relpath, by_basename, by_slug, by_orig_map, alt_by_origpath, alt_by_origbase,
-        rewrite_src=rewrite_src, updates=updates
-    )
-
-    # Clean up any identical duplicate shapes introduced by earlier runs
-    new_data, pruned = _prune_duplicate_image_shapes(new_data)
-    if pruned:
-        changed = True
+    # Set alts/srcs and clean up identical duplicate shapes from earlier runs, in one pass
+    changed = walk_image_nodes(data, matcher, rewrite_src=rewrite_src, updates=updates,
+                               metrics=metrics, ops=ops, misses=misses)
+    if metrics is not None:
+        t = metrics.lap("walk", t)
 
+    out = None
     if changed and write:
-        path.write_text(json.dumps(new_data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        out = _encode_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+        if metrics is not None:
+            t = metrics.lap("serialize", t)
+    if dedupe is not None:
+        dedupe.put(key, changed, out, updates, ops, misses)
+    if out is not None:
+        _write_output(path, out, raw_bytes, backup=backup, write_behind=write_behind, metrics=metrics, t=t)
     return changed, updates
 
-def update_alts_rel(dry_run: bool = False, backup: bool = False, rewrite_src: bool = False) -> dict:
+# ------------- Library API -------------
+
+class DocumentUpdate(NamedTuple):
+    document: Any         # the updated document (bytes for update_json_bytes)
+    changed: bool
+    updates: List[Tuple[str, str, Optional[str]]]  # (old_src, alt, new_src or None), deduped, in document order
+
+def update_document(data: Any, matcher: AltMatcher, *, rewrite_src: bool = False) -> DocumentUpdate:
+    """
+    Apply the mapping to an already-parsed JSON document, in place; no file or
+    report I/O. Build the matcher once (AltMatcher.from_csv) and reuse it: its
+    match cache makes repeated srcs across calls nearly free.
+    """
+    updates: List[Tuple[str, str, Optional[str]]] = []
+    changed = walk_image_nodes(data, matcher, rewrite_src=rewrite_src, updates=updates)
+    return DocumentUpdate(data, changed, list(dict.fromkeys(updates)))
+
+def update_json_bytes(raw: Union[bytes, str], matcher: AltMatcher, *, rewrite_src: bool = False) -> DocumentUpdate:
+    """
+    update_document for serialized JSON: the document comes back as the bytes the
+    updater would write to disk (the input, encoded, when nothing changed).
+    Raises ValueError for invalid JSON.
+    """
+    if isinstance(raw, str):
+        text, raw = raw, raw.encode("utf-8")
+    else:
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode("latin-1")
+    data = json.loads(text)
+    _, changed, updates = update_document(data, matcher, rewrite_src=rewrite_src)
+    if changed:
+        raw = _encode_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+    return DocumentUpdate(raw, changed, updates)
+
+# ------------- Incremental manifest -------------
+
+# Bump when matching/rewriting semantics change so old manifests are ignored
+MANIFEST_VERSION = 1
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(manifest_path: Path, fingerprint: str, rewrite_src: bool) -> Dict[str, dict]:
+    """
+    Return the per-file entries recorded by a previous run, keyed by path relative
+    to the JSON root. Returns {} if there is no manifest, or if it was made with a
+    different mapping or rewrite setting (every file must then be reprocessed).
+    """
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    if (not isinstance(data, dict) or
+        data.get("version") != MANIFEST_VERSION or
+        data.get("mapping") != fingerprint or
+        data.get("rewrite_src") != bool(rewrite_src)):
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+def save_manifest(manifest_path: Path, fingerprint: str, rewrite_src: bool, files: Dict[str, dict]) -> None:
+    data = {
+        "version": MANIFEST_VERSION,
+        "mapping": fingerprint,
+        "rewrite_src": bool(rewrite_src),
+        "files": files,
+    }
+    manifest_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+def process_json_file_incremental(
+    path: Path,
+    matcher: AltMatcher,
+    entry: Optional[dict],
+    *,
+    write: bool,
+    rewrite_src: bool,
+    stream_min_bytes: Optional[int] = None,
+    metrics: Optional[RunMetrics] = None,
+    ops: Optional[List[PatchOp]] = None,
+    backup: Optional[SnapshotBackup] = None,
+    raw_bytes: Optional[bytes] = None,
+    write_behind: Optional["_WriteBehind"] = None,
+    misses: Optional[List[str]] = None,
+    dedupe: Optional[DocumentCache] = None,
+    prefilter: bool = False,
+) -> Tuple[bool, List[Update], Optional[dict], bool]:
+    """
+    Like process_json_file, but first consult the manifest entry from the last run.
+    Returns (changed, updates, new_entry, cached).
+
+    A file is skipped ("cached") when its size and mtime (or, failing that, its
+    content hash) match the entry, and the recorded outcome can be replayed:
+    either the file needed no changes, or this is a dry run. Files rewritten by
+    this run get no entry, so the next run re-verifies them once. When ops (or
+    misses) are requested, an entry is only replayed if it recorded them.
+    """
+    t = time.perf_counter() if metrics is not None else 0.0
+    st = path.stat()
+    digest = None
+    replayable = (entry and (misses is None or "misses" in entry) and
+                  (not entry.get("changed") or (not write and (ops is None or "ops" in entry))))
+    if replayable and entry.get("size") == st.st_size:
+        if entry.get("mtime_ns") != st.st_mtime_ns:
+            digest = hashlib.sha256(raw_bytes).hexdigest() if raw_bytes is not None else _file_sha256(path)
+        if digest is None or digest == entry.get("sha256"):
+            if digest is not None:
+                entry = dict(entry, mtime_ns=st.st_mtime_ns)
+            updates = [tuple(u) for u in entry.get("updates", [])]
+            if ops is not None:
+                ops.extend(tuple(op) for op in entry.get("ops", []))
+            if misses is not None:
+                misses.extend(entry["misses"])
+            if metrics is not None:
+                metrics.lap("manifest", t)
+                metrics.count("cached_files")
+            return bool(entry.get("changed")), updates, entry, True
+
+    if digest is None:
+        digest = hashlib.sha256(raw_bytes).hexdigest() if raw_bytes is not None else _file_sha256(path)
+    if metrics is not None:
+        metrics.lap("manifest", t)
+    changed, updates = process_json_file(
+        path, matcher, write=write, rewrite_src=rewrite_src, stream_min_bytes=stream_min_bytes,
+        metrics=metrics, ops=ops, backup=backup, raw_bytes=raw_bytes, write_behind=write_behind,
+        misses=misses, dedupe=dedupe, prefilter=prefilter
+    )
+    new_entry = None
+    if not (changed and write):
+        new_entry = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+            "changed": changed,
+            "updates": [list(u) for u in updates],
+        }
+        if ops:
+            new_entry["ops"] = [list(op) for op in ops]
+        if misses is not None:
+            new_entry["misses"] = list(dict.fromkeys(misses))
+    return changed, updates, new_entry, False
+
+# ------------- Parallel execution -------------
+
+class FileOptions(NamedTuple):
+    """Per-file settings shared by the serial loop and the pool workers."""
+    write: bool
+    rewrite_src: bool
+    incremental: bool = False
+    stream_min_bytes: Optional[int] = None
+    metrics: bool = False
+    ops: bool = False  # record touched fields as JSON Pointer ops (patch, dry-run and preview runs)
+    backup: Optional[SnapshotBackup] = None
+    misses: bool = False
+    dedupe: Optional[DocumentCache] = None  # each pool worker gets its own copy
+    prefilter: bool = False
+
+class FileResult(NamedTuple):
+    changed: bool
+    updates: List[Update]
+    entry: Optional[dict]            # new manifest entry (incremental runs)
+    cached: bool                     # skipped thanks to the manifest
+    metrics: Optional[RunMetrics]    # this file's timings/counters (metrics runs)
+    ops: Optional[List[PatchOp]]     # touched fields as JSON Pointer ops (see FileOptions.ops)
+    misses: Optional[List[str]]      # image srcs no mapping knows (fuzzy runs)
+
+# Per-process state for pool workers: (matcher, FileOptions), set once by the initializer
+_worker_state: Optional[tuple] = None
+
+def _init_worker(matcher: AltMatcher, opts: FileOptions) -> None:
+    global _worker_state
+    _worker_state = (matcher, opts)
+
+def _process_one(
+    path: Path,
+    entry: Optional[dict],
+    matcher: AltMatcher,
+    opts: FileOptions,
+    raw_bytes: Optional[bytes] = None,
+    write_behind: Optional["_WriteBehind"] = None,
+) -> FileResult:
+    metrics = RunMetrics() if opts.metrics else None
+    ops: Optional[List[PatchOp]] = [] if opts.ops else None
+    misses: Optional[List[str]] = [] if opts.misses else None
+    t = time.perf_counter() if metrics is not None else 0.0
+    if opts.incremental:
+        changed, updates, new_entry, cached = process_json_file_incremental(
+            path, matcher, entry, write=opts.write, rewrite_src=opts.rewrite_src,
+            stream_min_bytes=opts.stream_min_bytes, metrics=metrics, ops=ops, backup=opts.backup,
+            raw_bytes=raw_bytes, write_behind=write_behind, misses=misses, dedupe=opts.dedupe,
+            prefilter=opts.prefilter
+        )
+    else:
+        changed, updates = process_json_file(
+            path, matcher, write=opts.write, rewrite_src=opts.rewrite_src,
+            stream_min_bytes=opts.stream_min_bytes, metrics=metrics, ops=ops, backup=opts.backup,
+            raw_bytes=raw_bytes, write_behind=write_behind, misses=misses, dedupe=opts.dedupe,
+            prefilter=opts.prefilter
+        )
+        new_entry, cached = None, False
+    if metrics is not None:
+        metrics.file_done(str(path), time.perf_counter() - t)
+    return FileResult(changed, updates, new_entry, cached, metrics, ops, misses)
+
+def _process_in_worker(path: Path, entry: Optional[dict]) -> FileResult:
+    return _process_one(path, entry, *_worker_state)
+
+def _resolve_workers(workers: int) -> int:
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+class _WriteBehind:
+    """
+    Background writer for the pipelined run: the processing stage queues
+    (path, new_bytes, original_bytes) and moves on; this thread saves the backup
+    and does the atomic write. put() blocks once `depth` writes are pending.
+    """
+
+    def __init__(self, depth: int, backup: Optional[SnapshotBackup] = None, metrics: bool = False):
+        self.queue: "queue.Queue[Optional[Tuple[Path, bytes, bytes]]]" = queue.Queue(maxsize=max(1, depth))
+        self.backup = backup
+        self.metrics = RunMetrics() if metrics else None
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name="alt-text-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, path: Path, data: bytes, original: bytes) -> None:
+        if self.error is not None:
+            raise self.error
+        self.queue.put((path, data, original))
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so put() never blocks forever
+            path, data, original = item
+            t = time.perf_counter()
+            try:
+                if self.backup is not None and self.backup.save(path, original) and self.metrics is not None:
+                    self.metrics.count("backed_up_files")
+                _atomic_write_bytes(path, data)
+            except BaseException as e:
+                self.error = e
+            if self.metrics is not None:
+                self.metrics.lap("write", t)
+
+    def close(self) -> None:
+        """Wait for the queued writes; re-raise the first one that failed."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+def _read_ahead(path: Path, entry: Optional[dict], opts: FileOptions) -> Optional[bytes]:
+    """
+    Prefetch a file's bytes for the pipelined run. Returns None (the file is then
+    read as usual) when it will be streamed, when the manifest will most likely
+    let it be skipped, or when reading fails (so the error surfaces in order).
+    """
+    try:
+        st = path.stat()
+        if opts.stream_min_bytes is not None and st.st_size >= opts.stream_min_bytes:
+            return None
+        if (opts.incremental and entry and entry.get("size") == st.st_size and
+                entry.get("mtime_ns") == st.st_mtime_ns):
+            return None
+        return path.read_bytes()
+    except OSError:
+        return None
+
+def _iter_file_results(
+    paths: List[Path],
+    entries: List[Optional[dict]],
+    matcher: AltMatcher,
+    opts: FileOptions,
+    *,
+    workers: int,
+    readahead: int = 0,
+    write_behind: Optional[_WriteBehind] = None,
+) -> Iterator[FileResult]:
+    """
+    Yield a FileResult per path, in the same order as paths.
+    The matcher is handed to each worker once (via the pool initializer), not per file.
+
+    In a single-process run with readahead > 0, up to that many files are read by
+    background threads while the current one is processed, and writes go to
+    write_behind (if given), so disk/network latency overlaps with parsing.
+    """
+    workers = min(_resolve_workers(workers), len(paths))
+    if workers <= 1 and readahead > 0:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=readahead, thread_name_prefix="alt-text-reader") as readers:
+            pending: deque = deque()
+            todo = iter(zip(paths, entries))
+            for path, entry in todo:
+                pending.append((path, entry, readers.submit(_read_ahead, path, entry, opts)))
+                if len(pending) >= readahead:
+                    break
+            while pending:
+                path, entry, fut = pending.popleft()
+                for next_path, next_entry in todo:
+                    pending.append((next_path, next_entry, readers.submit(_read_ahead, next_path, next_entry, opts)))
+                    break
+                yield _process_one(path, entry, matcher, opts, fut.result(), write_behind)
+        return
+    if workers <= 1:
+        for path, entry in zip(paths, entries):
+            yield _process_one(path, entry, matcher, opts)
+        return
+
+    # Small chunks keep workers balanced; large enough to amortize the IPC round trip
+    chunksize = max(1, min(64, len(paths) // (workers * 8)))
+    from concurrent.futures import ProcessPoolExecutor  # pulls in multiprocessing; only parallel runs pay for it
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(matcher, opts),
+    ) as pool:
+        yield from pool.map(_process_in_worker, paths, entries, chunksize=chunksize)
+
+# ------------- Reports -------------
+
+class ReportWriter:
+    """
+    Streams per-file updates to disk as they come in, so memory stays flat however
+    many changes a run makes:
+
+      alt-text-update-report.csv     one row per (json_file, old_src, new_alt, new_src)
+      alt-text-update-details.jsonl  one line per file: {"file": ..., "updates": [[old_src, alt, new_src], ...]}
+
+    Both are written to temp files and renamed into place by close(); abort()
+    discards them, leaving the previous run's reports intact.
+    """
+
+    CSV_NAME = "alt-text-update-report.csv"
+    DETAILS_NAME = "alt-text-update-details.jsonl"
+
+    def __init__(self, reports_dir: Path):
+        self.reports_dir = reports_dir
+        self.details_path = reports_dir / self.DETAILS_NAME
+        self.files = 0      # files with at least one update
+        self.updates = 0    # report rows
+        self._tmp: List[Tuple[str, Path]] = []
+        self._csv_file = self._open(reports_dir / self.CSV_NAME)
+        self._details_file = self._open(self.details_path)
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(["json_file", "old_src", "new_alt", "new_src_if_rewritten"])
+
+    def _open(self, path: Path):
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+        self._tmp.append((tmp, path))
+        return os.fdopen(fd, "w", newline="", encoding="utf-8")
+
+    def add(self, json_file: str, updates: List[Tuple[str, str, Optional[str]]], position: Optional[int] = None) -> None:
+        """position (shard runs) is the file's index in the full scan, kept for merge_shard_reports."""
+        self.files += 1
+        self.updates += len(updates)
+        self._csv.writerows([json_file, old_src, alt, new_src or ""] for old_src, alt, new_src in updates)
+        item = {"file": json_file, "updates": updates}
+        if position is not None:
+            item["position"] = position
+        self._details_file.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._csv_file.close()
+        self._details_file.close()
+        for tmp, path in self._tmp:
+            os.replace(tmp, path)
+
+    def abort(self) -> None:
+        self._csv_file.close()
+        self._details_file.close()
+        for tmp, _ in self._tmp:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+def _write_jsonl_item(out, item: dict, position: Optional[int] = None) -> None:
+    """One line of a per-file JSONL report; position as in ReportWriter.add."""
+    if position is not None:
+        item["position"] = position
+    out.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+def write_reports(reports_dir: Path, summary: dict) -> None:
+    """Save the summary JSON and, when it lists unmatched srcs, the unmatched CSV."""
+    (reports_dir / "alt-text-update-summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if "unmatched" in summary:
+        try:
+            with (reports_dir / "alt-text-unmatched.csv").open("w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(["unmatched_src", "json_files", "suggested_csv_entry", "suggested_alt", "edit_distance"])
+                for item in summary["unmatched"]:
+                    for sug in item["suggestions"] or [{"csv": "", "alt": "", "distance": ""}]:
+                        w.writerow([item["src"], item["files"], sug["csv"], sug["alt"], sug["distance"]])
+        except Exception as e:
+            print(f"[WARN] Could not write unmatched report: {e}")
+
+def write_conflicts_report(path: Path, conflicts: List[MappingConflict]) -> None:
+    """One row per (key, losing value) the merged CSVs disagreed on."""
+    try:
+        with path.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(MappingConflict._fields)
+            w.writerows(conflicts)
+    except Exception as e:
+        print(f"[WARN] Could not write conflicts report: {e}")
+
+# ------------- Dry-run preview -------------
+
+PREVIEW_NAME = "alt-text-preview.jsonl"
+PREVIEW_FORMATS = {"html": "alt-text-preview.html", "diff": "alt-text-preview.diff"}
+
+def preview_changes(ops: List[PatchOp]) -> List[dict]:
+    """
+    Recorded ops as preview entries: {"path": json_pointer, "old": ..., "new": ...},
+    without "old" for an added field and without "new" for a removed one.
+    """
+    changes = []
+    for op, ptr, old, new in ops:
+        change = {"path": ptr}
+        if op != "add":
+            change["old"] = old
+        if op != "remove":
+            change["new"] = new
+        changes.append(change)
+    return changes
+
+def iter_preview(preview_path: Path) -> Iterator[Tuple[str, List[dict]]]:
+    """(json_file, changes) per line of a preview stream."""
+    with preview_path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                yield item["file"], item["changes"]
+
+def _preview_value(change: dict, side: str) -> Optional[str]:
+    return json.dumps(change[side], ensure_ascii=False) if side in change else None
+
+def _render_preview_diff(items: Iterable[Tuple[str, List[dict]]], out) -> None:
+    """Unified-diff style: one hunk per touched field, headed by its JSON Pointer."""
+    for json_file, changes in items:
+        out.write(f"--- {json_file}\n+++ {json_file}\n")
+        for change in changes:
+            out.write(f"@@ {change['path']} @@\n")
+            for side, sign in (("old", "-"), ("new", "+")):
+                value = _preview_value(change, side)
+                if value is not None:
+                    out.write(f"{sign}{value}\n")
+
+_PREVIEW_HTML_HEAD = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Alt-text preview</title>
+<style>
+body { font: 14px system-ui, sans-serif; margin: 2em; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 2em; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: left; vertical-align: top; }
+td.old { background: #fee; } td.new { background: #efe; }
+code { font-size: 12px; word-break: break-all; }
+</style></head><body>
+<h1>Alt-text preview</h1>
+"""
+
+def _render_preview_html(items: Iterable[Tuple[str, List[dict]]], out) -> None:
+    """One table per file: field (JSON Pointer), value before, value after."""
+    out.write(_PREVIEW_HTML_HEAD)
+    files = total = 0
+    for json_file, changes in items:
+        files += 1
+        total += len(changes)
+        out.write(f"<h2><code>{html.escape(json_file)}</code></h2>\n<table>\n"
+                  "<tr><th>Field</th><th>Before</th><th>After</th></tr>\n")
+        for change in changes:
+            old, new = (html.escape(_preview_value(change, side) or "") for side in ("old", "new"))
+            out.write(f'<tr><td><code>{html.escape(change["path"])}</code></td>'
+                      f'<td class="old">{old}</td><td class="new">{new}</td></tr>\n')
+        out.write("</table>\n")
+    out.write(f"<p>{total} changes in {files} files.</p>\n</body></html>\n")
+
+def render_preview(preview_path: Path, fmt: str) -> Path:
+    """
+    Render a preview stream as HTML or a unified-diff style text next to it, line
+    by line: only the touched fields are ever formatted, never whole documents.
+    """
+    if fmt not in PREVIEW_FORMATS:
+        raise ValueError(f"Unknown preview format {fmt!r} (expected one of: {', '.join(PREVIEW_FORMATS)})")
+    out_path = preview_path.parent / PREVIEW_FORMATS[fmt]
+    render = _render_preview_html if fmt == "html" else _render_preview_diff
+    with out_path.open("w", encoding="utf-8") as out:
+        render(iter_preview(preview_path), out)
+    return out_path
+
+def update_alts_rel(
+    dry_run: bool = False,
+    backup: bool = False,
+    rewrite_src: bool = False,
+    workers: int = 1,
+    incremental: bool = False,
+    stream_min_bytes: Optional[int] = None,
+    metrics: bool = False,
+    metrics_file: Optional[Path] = None,
+    patch: bool = False,
+    pipeline: int = 0,
+    fuzzy: int = 0,
+    mapping_cache: bool = False,
+    csv_sources: Union[str, Sequence[Path], None] = None,
+    precedence: str = "last",
+    matcher: Optional[AltMatcher] = None,
+    conflicts: Optional[List[MappingConflict]] = None,
+    only: Optional[Iterable[str]] = None,
+    json_root: Optional[Path] = None,
+    reports_dir: Optional[Path] = None,
+    backup_dir: Optional[Path] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    dedupe: bool = True,
+    prefilter: bool = True,
+    preview: Optional[str] = None,
+) -> dict:
     """
     Use relative locations:
 
       CSV file:     ./alt-text-output.csv  (or the only *.csv in folder)
       JSON folder:  ./jsonFiles
 
+    With workers > 1 (or 0 for one per CPU) files are processed in a process pool;
+    results are merged in scan order, so the reports are identical to a serial run.
+
+    With incremental=True, files recorded in reports/alt-text-manifest.json as
+    unchanged since the last run (same bytes, same CSV mapping) are not reparsed;
+    they are counted as "cached" and their recorded updates are replayed.
+
+    Files of at least stream_min_bytes are rewritten by a streaming tokenizer
+    instead of being loaded whole; the output bytes are identical.
+
+    With metrics=True (or a metrics_file) the summary gains a "metrics" entry:
+    time per stage, nodes visited, match hits per tier and the slowest files.
+
+    With patch=True no JSON file is rewritten; instead each changed file gets one
+    line in reports/alt-text-update-patch.jsonl holding the RFC 6902 JSON Patch
+    (replace/add/remove ops on just the touched alt/src fields).
+
+    With backup=True each file's original is saved right before it is rewritten,
+    into a new timestamped snapshot under backup_jsonFiles/snapshots/ (identical
+    contents are stored once, in backup_jsonFiles/objects/). See restore_snapshot.
+
+    With pipeline=N (single-process runs) up to N files are read ahead by
+    background threads and up to N rewritten files are queued for a background
+    writer, so I/O latency overlaps with parsing; results stay in scan order.
+
+    With fuzzy=N, srcs with no exact match take the alt of the one CSV slug
+    within N edits, and the image srcs still unmatched are listed in the summary
+    ("unmatched") and reports/alt-text-unmatched.csv with their closest entries.
+
+    With mapping_cache=True the parsed CSV is kept in reports/alt-text-mapping.cache
+    and reloaded from there while the CSV's content is unchanged.
+
+    csv_sources names several CSVs instead (see find_csv_sources), merged with the
+    given precedence ("last": later files win, "first": earlier files win). Keys
+    the CSVs give different alts are listed in reports/alt-text-csv-conflicts.csv.
+    A matcher already loaded from those CSVs (watch mode) can be passed in, with
+    the conflicts found while loading it.
+
+    only restricts the run to those paths (relative to jsonFiles/) instead of
+    scanning the whole tree; see update_alts_targeted.
+
+    json_root, reports_dir and backup_dir replace jsonFiles/, reports/ and
+    backup_jsonFiles/ next to the script; csv_sources may also be a list of paths.
+
+    With shard=(k, n) only the files whose relative path hashes to shard k of n
+    are processed (see shard_of), and reports go to reports/shards/<k>-of-<n>/;
+    merge_shard_reports combines the n shards into the reports of a single run.
+
+    With dedupe=True (the default) byte-identical files are processed once per
+    run (per worker) and the outcome reused for each copy; see DocumentCache.
+    With prefilter=True (the default) files that provably need no change are
+    recognized from their bytes and not parsed; see process_json_file.
+
+    Dry runs (and runs given a preview format) stream each changed file's touched
+    fields, as JSON Pointers with their old and new values, to
+    reports/alt-text-preview.jsonl; preview="html" or "diff" then renders it to
+    alt-text-preview.html / .diff (see render_preview). Files of at least
+    stream_min_bytes are still streamed in these runs, and in patch runs.
+
     Returns a dict summary and saves a report CSV/JSON to ./reports.
     """
     script_dir = _script_dir()
-    csv_path = find_csv()
-    json_root = find_json_root()
-
-    (by_relpath, by_basename, by_slug,
-     by_orig_map, alt_by_origpath, alt_by_origbase) = load_alt_mapping(csv_path)
+    csv_paths = resolve_csv_paths(csv_sources)
+    if not csv_paths:
+        raise FileNotFoundError(f"No CSV found for: {csv_sources}")
+    csv_path = csv_paths[0]
+    json_root = Path(json_root) if json_root else find_json_root()
+    reports_dir = Path(reports_dir) if reports_dir else script_dir / "reports"
+    backup_dir = Path(backup_dir) if backup_dir else script_dir / BACKUP_DIRNAME
+    if shard is not None:
+        reports_dir = shard_reports_dir(reports_dir, *shard)
+
+    run_metrics = RunMetrics() if (metrics or metrics_file) else None
+    run_start = t = time.perf_counter()
+    cache_path = reports_dir / "alt-text-mapping.cache" if mapping_cache else None
+    if matcher is None:
+        conflicts = [] if len(csv_paths) > 1 else None
+        matcher = AltMatcher.from_csv(csv_paths, cache_path=cache_path, precedence=precedence,
+                                      conflicts=conflicts, fuzzy=fuzzy)
+    if run_metrics is not None:
+        run_metrics.lap("csv_load", t)
 
     total_files = 0
     changed_files = 0
-    details = {}
-
-    if backup and not dry_run:
-      # backup entire jsonFiles folder (shallow copy of files)
-      backup_dir = script_dir / "backup_jsonFiles"
-      backup_dir.mkdir(exist_ok=True)
-      for p in json_root.rglob("*.json"):
-          rel = p.relative_to(json_root)
-          target = backup_dir / rel
-          target.parent.mkdir(parents=True, exist_ok=True)
-          try:
-              shutil.copy2(p, target)
-          except Exception as e:
-              print(f"[WARN] Backup failed: {p.name} ({e})")
-
-    for path in json_root.rglob("*.json"):
-        total_files += 1
-        changed, updates = process_json_file(
-            path,
-            by_relpath, by_basename, by_slug,
-            by_orig_map, alt_by_origpath, alt_by_origbase,
-            write=not dry_run,
-            rewrite_src=rewrite_src
-        )
-        if updates:
-            # dedupe (old_src, alt, new_src) per file while keeping order
-            dedup = list(dict.fromkeys(updates))
-            details[str(path)] = dedup
-        if changed:
-            changed_files += 1
+    cached_files = 0
+    unmatched: Dict[str, int] = {}  # src -> number of files it appears in
+
+    manifest_path = reports_dir / "alt-text-manifest.json"
+    old_entries = load_manifest(manifest_path, matcher.fingerprint(), rewrite_src) if incremental else {}
+    new_entries: Dict[str, dict] = {}
+
+    # Originals are saved lazily, just before each file is rewritten
+    snapshot = None
+    if backup and not (dry_run or patch):
+        snapshot = SnapshotBackup.start(backup_dir, json_root)
+
+    if only is None:
+        paths = list(json_root.rglob("*.json"))
+    else:
+        paths = [p for p in (json_root / rel for rel in sorted(set(only))) if p.is_file()]
+        new_entries.update(old_entries)
+    rel_keys = [p.relative_to(json_root).as_posix() for p in paths]
+    positions: List[Optional[int]] = [None] * len(paths)
+    if shard is not None:
+        # Every shard scans the whole tree, so each file's scan position is known for the merge
+        k, n = shard
+        picked = [i for i, rel in enumerate(rel_keys) if shard_of(rel, n) == k]
+        paths, rel_keys, positions = [paths[i] for i in picked], [rel_keys[i] for i in picked], picked
+    patch_path = reports_dir / "alt-text-update-patch.jsonl"
+    patch_out = None
+    if patch:
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        patch_out = patch_path.open("w", encoding="utf-8")
+    preview_path = reports_dir / PREVIEW_NAME
+    preview_out = None
+    if dry_run or preview:
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        preview_out = preview_path.open("w", encoding="utf-8")
+
+    opts = FileOptions(
+        write=not (dry_run or patch),
+        rewrite_src=rewrite_src,
+        incremental=incremental,
+        stream_min_bytes=stream_min_bytes,
+        metrics=run_metrics is not None,
+        ops=patch or preview_out is not None,
+        backup=snapshot,
+        misses=fuzzy > 0,
+        dedupe=DocumentCache() if dedupe else None,
+        prefilter=prefilter,
+    )
+    pipelined = pipeline > 0 and min(_resolve_workers(workers), len(paths)) <= 1
+    write_behind = None
+    if pipelined and opts.write:
+        write_behind = _WriteBehind(pipeline, backup=snapshot, metrics=run_metrics is not None)
+    results = _iter_file_results(
+        paths, [old_entries.get(k) for k in rel_keys], matcher, opts, workers=workers,
+        readahead=pipeline if pipelined else 0, write_behind=write_behind
+    )
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    report = ReportWriter(reports_dir)
+    try:
+        for path, rel_key, position, (changed, updates, entry, cached, file_metrics, ops, misses) in zip(
+                paths, rel_keys, positions, results):
+            total_files += 1
+            if ops and patch_out is not None:
+                _write_jsonl_item(patch_out, {"file": str(path), "patch": patch_ops_to_json(ops)}, position)
+            if ops and preview_out is not None:
+                _write_jsonl_item(preview_out, {"file": str(path), "changes": preview_changes(ops)}, position)
+            if file_metrics is not None:
+                run_metrics.merge(file_metrics)
+            if cached:
+                cached_files += 1
+            if entry is not None:
+                new_entries[rel_key] = entry
+            if updates:
+                # dedupe (old_src, alt, new_src) per file while keeping order
+                report.add(str(path), list(dict.fromkeys(updates)), position)
+            if changed:
+                changed_files += 1
+            for src in dict.fromkeys(misses or ()):
+                unmatched[src] = unmatched.get(src, 0) + 1
+    except BaseException:
+        report.abort()
+        raise
+    finally:
+        if write_behind is not None:
+            # All writes (and their backups) land before reports, manifest and snapshot are finalized
+            write_behind.close()
+    report.close()
+    if write_behind is not None and run_metrics is not None:
+        run_metrics.merge(write_behind.metrics)
 
     summary = {
-        "csv": str(csv_path),
+        "csv": str(csv_path) if len(csv_paths) == 1 else [str(p) for p in csv_paths],
         "json_root": str(json_root),
         "total_json_files_scanned": total_files,
         "changed_files": changed_files,
         "rewrite_src_enabled": bool(rewrite_src),
-        "details": details,
+        "updated_files": report.files,
+        "updates": report.updates,
+        "details_file": str(report.details_path),
     }
-
+    if conflicts is not None:
+        summary["csv_precedence"] = precedence
+        summary["csv_conflicts"] = len(conflicts)
+    if patch_out is not None:
+        patch_out.close()
+        summary["patch_file"] = str(patch_path)
+    if preview_out is not None:
+        preview_out.close()
+        summary["preview_file"] = str(preview_path)
+        if preview:
+            summary["preview"] = str(render_preview(preview_path, preview))
+    if snapshot is not None and snapshot.finish():
+        summary["backup_snapshot"] = str(snapshot.snapshot_dir)
+    if incremental:
+        summary["cached_files"] = cached_files
+    if only is not None:
+        summary["targeted"] = True
+    if shard is not None:
+        summary["shard"] = list(shard)
+    if run_metrics is not None:
+        summary["metrics"] = dict(
+            wall_seconds=round(time.perf_counter() - run_start, 6),
+            workers=min(_resolve_workers(workers), max(1, len(paths))),
+            pipeline=pipeline if pipelined else 0,
+            **run_metrics.to_dict(),
+        )
+    if fuzzy > 0:
+        summary["unmatched"] = [
+            {"src": src, "files": n,
+             "suggestions": [{"csv": name, "alt": alt, "distance": d} for name, alt, d in matcher.suggest(src)]}
+            for src, n in sorted(unmatched.items(), key=lambda kv: (-kv[1], kv[0]))
+        ]
 
     # Save reports
-    reports_dir = script_dir / "reports"
-    reports_dir.mkdir(exist_ok=True)
-    (reports_dir / "alt-text-update-summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
-
-    # CSV report (flat)
-    try:
-        import io
-        out_csv = io.StringIO()
-        w = csv.writer(out_csv)
-        w.writerow(["json_file", "old_src", "new_alt", "new_src_if_rewritten"])
-        for fpath, triples in details.items():
-            for old_src, alt, new_src in triples:
-                w.writerow([fpath, old_src, alt, new_src or ""])
-        (reports_dir / "alt-text-update-report.csv").write_text(out_csv.getvalue(), encoding="utf-8")
-    except Exception as e:
-        print(f"[WARN] Could not write CSV report: {e}")
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    if incremental:
+        save_manifest(manifest_path, matcher.fingerprint(), rewrite_src, new_entries)
+    write_reports(reports_dir, summary)
+    if conflicts is not None:
+        write_conflicts_report(reports_dir / "alt-text-csv-conflicts.csv", conflicts)
+    if metrics_file:
+        Path(metrics_file).write_text(json.dumps(summary["metrics"], indent=2, ensure_ascii=False), encoding="utf-8")
 
     # Console summary
+    shown_reports = _display_path(reports_dir, script_dir)
     print("Alt-text Updater")
     print("----------------")
-    print(f"CSV:        {csv_path.name if csv_path.exists() else '(missing)'}")
-    print(f"JSON root:  {json_root.relative_to(script_dir) if json_root.exists() else '(missing jsonFiles/)'}")
-    print(f"Scanned:    {total_files} JSON files")
+    if len(csv_paths) == 1:
+        print(f"CSV:        {csv_path.name if csv_path.exists() else '(missing)'}")
+    else:
+        print(f"CSV:        {len(csv_paths)} files, {precedence} wins ({', '.join(p.name for p in csv_paths)})")
+        if conflicts is not None:
+            print(f"Conflicts:  {len(conflicts)} alts overridden by another CSV row ({shown_reports}/alt-text-csv-conflicts.csv)")
+    print(f"JSON root:  {_display_path(json_root, script_dir) if json_root.exists() else f'(missing {json_root.name}/)'}")
+    print(f"Scanned:    {total_files} JSON files" + (f" (shard {shard[0]} of {shard[1]})" if shard else ""))
     print(f"Updated:    {changed_files} files")
+    if incremental:
+        print(f"Cached:     {cached_files} files (unchanged since last run)")
+    if run_metrics is not None:
+        print(f"Time:       {summary['metrics']['wall_seconds']:.2f}s (per-stage breakdown in summary.json)")
     print(f"Rewrite:    {'ON' if rewrite_src else 'OFF'}")
-    if details:
-        print(f"Report:     reports/alt-text-update-report.csv")
+    if patch:
+        print(f"Patch:      {shown_reports}/{patch_path.name} (JSON files left untouched)")
+    if "preview" in summary:
+        print(f"Preview:    {shown_reports}/{Path(summary['preview']).name} (changed fields, old and new values)")
+    elif preview_out is not None:
+        print(f"Preview:    {shown_reports}/{PREVIEW_NAME} (changed fields, old and new values)")
+    if fuzzy > 0:
+        print(f"Unmatched:  {len(unmatched)} image srcs (suggestions in {shown_reports}/alt-text-unmatched.csv)")
+    if "backup_snapshot" in summary:
+        print(f"Backup:     {_display_path(snapshot.snapshot_dir, script_dir)} (undo with ALT_RESTORE=latest)")
+    if report.files:
+        print(f"Report:     {shown_reports}/{ReportWriter.CSV_NAME} ({report.updates} updates; per file in {ReportWriter.DETAILS_NAME})")
     else:
         print("Report:     (no changes; summary.json saved)")
 
     return summary
 
+# ------------- Sharded runs -------------
+
+# Order of the summary keys in a single run, so a merged summary matches it exactly
+_SUMMARY_ORDER = ("csv", "json_root", "total_json_files_scanned", "changed_files", "rewrite_src_enabled",
+                  "updated_files", "updates", "details_file", "csv_precedence", "csv_conflicts", "patch_file",
+                  "preview_file", "preview", "backup_snapshot", "cached_files", "targeted", "metrics", "unmatched")
+_SUMMARY_SUMS = ("total_json_files_scanned", "changed_files", "updated_files", "updates", "cached_files")
+
+def shard_of(rel_path: str, n: int) -> int:
+    """Shard (0..n-1) of a path relative to json_root: same answer on every host and Python version."""
+    digest = hashlib.sha1(rel_path.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n
+
+def shard_reports_dir(reports_dir: Path, k: int, n: int) -> Path:
+    if not 0 <= k < n:
+        raise ValueError(f"Shard {k} is outside 0..{n - 1}")
+    return reports_dir / "shards" / f"{k}-of-{n}"
+
+def _iter_positioned(path: Path) -> Iterator[Tuple[int, dict]]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                yield item.pop("position"), item
+
+def merge_shard_reports(n: int, *, reports_dir: Optional[Path] = None) -> dict:
+    """
+    Combine the reports of shards 0..n-1 (reports/shards/<k>-of-<n>/) into the
+    reports a single run over the whole tree writes: summary, report CSV, details
+    JSONL, unmatched and conflicts CSVs, the patch file of patch runs and the
+    preview of dry runs.
+    Files come out in scan order; counts are summed. Per-shard metrics and backup
+    snapshots can't be combined into one, so the summary lists them per shard.
+    """
+    reports_dir = Path(reports_dir) if reports_dir else _script_dir() / "reports"
+    shard_dirs = [shard_reports_dir(reports_dir, k, n) for k in range(n)]
+    summaries = []
+    for k, d in enumerate(shard_dirs):
+        path = d / "alt-text-update-summary.json"
+        if not path.exists():
+            raise FileNotFoundError(f"Shard {k} of {n} has no summary yet ({path})")
+        summaries.append(json.loads(path.read_text(encoding="utf-8")))
+    for key in ("csv", "json_root", "rewrite_src_enabled"):
+        if len({json.dumps(s.get(key)) for s in summaries}) > 1:
+            print(f"[WARN] Shards were run with different {key} values; using shard 0's")
+
+    report = ReportWriter(reports_dir)
+    try:
+        streams = [_iter_positioned(d / ReportWriter.DETAILS_NAME) for d in shard_dirs]
+        for _, item in heapq.merge(*streams, key=lambda pi: pi[0]):
+            report.add(item["file"], [tuple(u) for u in item["updates"]])
+    except BaseException:
+        report.abort()
+        raise
+    report.close()
+
+    merged: Dict[str, Any] = {}
+    keys = list(dict.fromkeys(k for s in summaries for k in s if k != "shard"))
+    keys.sort(key=lambda k: _SUMMARY_ORDER.index(k) if k in _SUMMARY_ORDER else len(_SUMMARY_ORDER))
+    for key in keys:
+        values = [s[key] for s in summaries if key in s]
+        if key in _SUMMARY_SUMS:
+            merged[key] = sum(values)
+        elif key == "details_file":
+            merged[key] = str(report.details_path)
+        elif key in ("patch_file", "preview_file"):
+            path = reports_dir / Path(values[0]).name
+            streams = [_iter_positioned(d / path.name) for d in shard_dirs if (d / path.name).exists()]
+            with path.open("w", encoding="utf-8") as out:
+                for _, item in heapq.merge(*streams, key=lambda pi: pi[0]):
+                    _write_jsonl_item(out, item)
+            merged[key] = str(path)
+        elif key == "preview":
+            merged[key] = str(render_preview(reports_dir / PREVIEW_NAME, Path(values[0]).suffix[1:]))
+        elif key == "backup_snapshot":
+            snapshots = list(dict.fromkeys(values))
+            merged[key] = snapshots[0] if len(snapshots) == 1 else snapshots
+        elif key == "metrics":
+            merged[key] = {"shards": values}
+        elif key == "unmatched":
+            found: Dict[str, dict] = {}
+            for item in (item for v in values for item in v):
+                if item["src"] in found:
+                    found[item["src"]]["files"] += item["files"]
+                else:
+                    found[item["src"]] = dict(item)
+            merged[key] = sorted(found.values(), key=lambda item: (-item["files"], item["src"]))
+        else:
+            merged[key] = values[0]
+
+    conflicts = shard_dirs[0] / "alt-text-csv-conflicts.csv"
+    if conflicts.exists():
+        shutil.copyfile(conflicts, reports_dir / conflicts.name)
+    write_reports(reports_dir, merged)
+
+    print(f"Merged:     {n} shards -> {merged.get('total_json_files_scanned', 0)} JSON files scanned, "
+          f"{merged.get('changed_files', 0)} updated")
+    print(f"Report:     {_display_path(reports_dir / ReportWriter.CSV_NAME, _script_dir())} ({report.updates} updates)")
+    return merged
+
+# ------------- JSON Lines batches -------------
+
+JSONL_CHUNK = 256  # records per task handed to a worker
+
+class JsonlChunkResult(NamedTuple):
+    lines: List[bytes]             # output lines, newline-terminated, one per input line
+    changed: int                   # records rewritten
+    updates: int                   # (old_src, alt, new_src) updates, deduped per record
+    errors: List[Tuple[int, str]]  # (index in chunk, message) of records passed through as invalid JSON
+    blank: int = 0                 # blank lines passed through (not records)
+
+def _update_jsonl_chunk(lines: List[bytes], matcher: AltMatcher, rewrite_src: bool) -> JsonlChunkResult:
+    """
+    Update + prune each record; unchanged and invalid records and blank lines are
+    passed through byte for byte, so output line N always belongs to input line N.
+    """
+    out: List[bytes] = []
+    changed = n_updates = blank = 0
+    errors: List[Tuple[int, str]] = []
+    for i, line in enumerate(lines):
+        body = line.rstrip(b"\r\n")
+        if not body.strip():
+            blank += 1
+            out.append(body + b"\n")
+            continue
+        try:
+            try:
+                text = body.decode("utf-8")
+            except UnicodeDecodeError:
+                text = body.decode("latin-1")
+            result = update_document(json.loads(text), matcher, rewrite_src=rewrite_src)
+            record = json.dumps(result.document, ensure_ascii=False).encode("utf-8") if result.changed else None
+        except (ValueError, RecursionError) as e:
+            errors.append((i, str(e) if isinstance(e, ValueError) else "nested too deeply"))
+            out.append(body + b"\n")
+            continue
+        n_updates += len(result.updates)
+        if record is not None:
+            changed += 1
+            out.append(record + b"\n")
+        else:
+            out.append(body + b"\n")
+    return JsonlChunkResult(out, changed, n_updates, errors, blank)
+
+def _update_jsonl_in_worker(lines: List[bytes]) -> JsonlChunkResult:
+    matcher, opts = _worker_state
+    return _update_jsonl_chunk(lines, matcher, opts.rewrite_src)
+
+def _iter_jsonl_results(
+    chunks: Iterable[List[bytes]],
+    matcher: AltMatcher,
+    rewrite_src: bool,
+    workers: int,
+) -> Iterator[JsonlChunkResult]:
+    """
+    Results per chunk, in input order. With several workers at most 2 chunks per
+    worker are in flight, so memory stays bounded however long the stream is.
+    """
+    workers = _resolve_workers(workers)
+    if workers <= 1:
+        for chunk in chunks:
+            yield _update_jsonl_chunk(chunk, matcher, rewrite_src)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(matcher, FileOptions(write=False, rewrite_src=rewrite_src)),
+    ) as pool:
+        pending: deque = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_update_jsonl_in_worker, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def update_jsonl(
+    source: Union[str, Path] = "-",
+    dest: Union[str, Path] = "-",
+    *,
+    rewrite_src: bool = False,
+    workers: int = 1,
+    fuzzy: int = 0,
+    mapping_cache: bool = False,
+    csv_sources: Union[str, Sequence[Path], None] = None,
+    precedence: str = "last",
+    reports_dir: Optional[Path] = None,
+    matcher: Optional[AltMatcher] = None,
+    chunk_size: int = JSONL_CHUNK,
+) -> dict:
+    """
+    Apply the mapping (and the duplicate-shape prune) to a JSON Lines stream:
+    one document per line from source ("-" = stdin), one line per document to
+    dest ("-" = stdout), in the same order. Nothing else touches the disk.
+
+    Records are processed in chunks of chunk_size, in parallel with workers > 1.
+    Unchanged records are copied through byte for byte; changed ones are written
+    compactly (UTF-8, no indentation). Blank lines are kept, and invalid lines
+    (including ones nested too deeply to parse) are passed through with a
+    warning. A file dest is replaced atomically once the stream is complete.
+    Progress and the summary go to stderr, so stdout carries only records.
+    """
+    if matcher is None:
+        csv_paths = resolve_csv_paths(csv_sources)
+        reports_dir = Path(reports_dir) if reports_dir else _script_dir() / "reports"
+        cache_path = reports_dir / "alt-text-mapping.cache" if mapping_cache else None
+        matcher = AltMatcher.from_csv(csv_paths, cache_path=cache_path, precedence=precedence, fuzzy=fuzzy)
+
+    src = sys.stdin.buffer if str(source) == "-" else open(source, "rb")
+    tmp = None
+    if str(dest) == "-":
+        dst = sys.stdout.buffer
+    else:
+        dest = Path(dest)
+        fd, tmp = tempfile.mkstemp(dir=str(dest.parent), prefix=f".{dest.name}.", suffix=".tmp")
+        dst = os.fdopen(fd, "wb")
+
+    records = changed = n_updates = invalid = 0
+    offset = 0
+    t = time.perf_counter()
+    try:
+        lines = iter(src)
+        chunks = iter(lambda: list(itertools.islice(lines, chunk_size)), [])
+        for result in _iter_jsonl_results(chunks, matcher, rewrite_src, workers):
+            dst.writelines(result.lines)
+            dst.flush()
+            for i, message in result.errors:
+                print(f"[WARN] Line {offset + i + 1}: invalid JSON, passed through ({message})", file=sys.stderr)
+            records += len(result.lines) - result.blank
+            changed += result.changed
+            n_updates += result.updates
+            invalid += len(result.errors)
+            offset += chunk_size
+        if tmp is not None:
+            dst.close()
+            os.replace(tmp, dest)
+            tmp = None
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if tmp is not None:
+            dst.close()
+            os.unlink(tmp)
+
+    summary = {"records": records, "changed_records": changed, "updates": n_updates,
+               "invalid_records": invalid, "seconds": round(time.perf_counter() - t, 6)}
+    print(f"JSONL:      {records} records, {changed} updated ({n_updates} updates, {invalid} invalid) "
+          f"in {summary['seconds']:.2f}s", file=sys.stderr)
+    return summary
+
+# ------------- Watch mode -------------
+
+def extract_srcs(text: str) -> set:
+    """The src strings referenced anywhere in a JSON document's text."""
+    srcs = set()
+    for m in _SRC_VALUE_RE.finditer(text):
+        value = m.group(1)
+        if "\\" in value:
+            try:
+                value = json.loads(f'"{value}"')
+            except ValueError:
+                continue
+        srcs.add(value)
+    return srcs
+
+def _read_json_text(path: Path) -> str:
+    raw = path.read_bytes()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+class SrcIndex:
+    """Reverse index for watch mode: src -> files referencing it, and file -> its srcs."""
+
+    def __init__(self):
+        self.files_by_src: Dict[str, set] = {}
+        self.srcs_by_file: Dict[str, set] = {}
+
+    def set_file(self, rel: str, srcs: set) -> None:
+        self.drop_file(rel)
+        self.srcs_by_file[rel] = srcs
+        for src in srcs:
+            self.files_by_src.setdefault(src, set()).add(rel)
+
+    def drop_file(self, rel: str) -> None:
+        for src in self.srcs_by_file.pop(rel, ()):
+            files = self.files_by_src.get(src)
+            if files is not None:
+                files.discard(rel)
+                if not files:
+                    del self.files_by_src[src]
+
+    def files_for(self, srcs: Iterable[str]) -> List[str]:
+        found = set()
+        for src in srcs:
+            found.update(self.files_by_src.get(src, ()))
+        return sorted(found)
+
+def _scan_json_tree(json_root: Path) -> Dict[str, Tuple[int, int]]:
+    """rel path -> (size, mtime_ns) for every *.json under json_root; stats only, no reads."""
+    found: Dict[str, Tuple[int, int]] = {}
+    stack = [(json_root, "")]
+    while stack:
+        folder, prefix = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for e in entries:
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append((Path(e.path), prefix + e.name + "/"))
+                elif e.name.endswith(".json") and e.is_file():
+                    st = e.stat()
+                    found[prefix + e.name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+    return found
+
+def _csv_signature(paths: List[Path]) -> tuple:
+    sig = []
+    for p in paths:
+        try:
+            st = p.stat()
+            sig.append((str(p), st.st_size, st.st_mtime_ns))
+        except OSError:
+            sig.append((str(p), None, None))
+    return tuple(sig)
+
+def _match_outcome(matcher: AltMatcher, src: str, rewrite_src: bool) -> tuple:
+    """What the walker would do with src: the parts of a match that reach the JSON."""
+    m = matcher.match(src)
+    return (m.alt, m.known, m.rewrite if rewrite_src else None)
+
+def watch(
+    dry_run: bool = False,
+    backup: bool = False,
+    rewrite_src: bool = False,
+    *,
+    interval: float = 1.0,
+    polls: Optional[int] = None,
+    stream_min_bytes: Optional[int] = None,
+    fuzzy: int = 0,
+    mapping_cache: bool = False,
+    csv_sources: Union[str, Sequence[Path], None] = None,
+    precedence: str = "last",
+    json_root: Optional[Path] = None,
+    reports_dir: Optional[Path] = None,
+    backup_dir: Optional[Path] = None,
+) -> None:
+    """
+    Long-running mode: one full run, then poll every `interval` seconds (forever,
+    or `polls` times) and reprocess only what changed:
+
+      - a new or modified JSON file is processed on its own;
+      - when the CSV changes, the new mapping is compared with the old one for
+        every src in the reverse index (src -> files), and only the files holding
+        a src whose outcome changed are reprocessed. The tree is not rescanned.
+
+    Each reprocessed file is logged to reports/alt-text-watch-log.jsonl.
+    Stop with Ctrl+C.
+    """
+    script_dir = _script_dir()
+    json_root = Path(json_root) if json_root else find_json_root()
+    reports_dir = Path(reports_dir) if reports_dir else script_dir / "reports"
+    backup_dir = Path(backup_dir) if backup_dir else script_dir / BACKUP_DIRNAME
+    cache_path = reports_dir / "alt-text-mapping.cache" if mapping_cache else None
+
+    def sources() -> List[Path]:
+        return resolve_csv_paths(csv_sources)
+
+    csv_paths = sources()
+    csv_sig = _csv_signature(csv_paths)
+    conflicts: Optional[List[MappingConflict]] = [] if len(csv_paths) > 1 else None
+    matcher = AltMatcher.from_csv(csv_paths, cache_path=cache_path, precedence=precedence,
+                                  conflicts=conflicts, fuzzy=fuzzy)
+    update_alts_rel(dry_run=dry_run, backup=backup, rewrite_src=rewrite_src,
+                    stream_min_bytes=stream_min_bytes, fuzzy=fuzzy, csv_sources=csv_sources,
+                    precedence=precedence, matcher=matcher, conflicts=conflicts, json_root=json_root,
+                    reports_dir=reports_dir, backup_dir=backup_dir)
+
+    # Reverse index and file stats, taken after the full run's writes
+    index = SrcIndex()
+    stats = _scan_json_tree(json_root)
+    for rel in stats:
+        try:
+            index.set_file(rel, extract_srcs(_read_json_text(json_root / rel)))
+        except OSError:
+            pass
+
+    snapshot = SnapshotBackup.start(backup_dir, json_root) if backup and not dry_run else None
+    opts = FileOptions(write=not dry_run, rewrite_src=rewrite_src,
+                       stream_min_bytes=stream_min_bytes, backup=snapshot)
+    log_path = reports_dir / "alt-text-watch-log.jsonl"
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Watching:   {_display_path(json_root, script_dir)}/ and {', '.join(p.name for p in csv_paths)} "
+          f"every {interval:g}s ({len(index.files_by_src)} srcs in {len(stats)} files indexed; Ctrl+C to stop)")
+
+    def reprocess(rels: List[str], reason: str) -> None:
+        with log_path.open("a", encoding="utf-8") as log:
+            for rel in rels:
+                path = json_root / rel
+                try:
+                    result = _process_one(path, None, matcher, opts)
+                    st = path.stat()
+                    stats[rel] = (st.st_size, st.st_mtime_ns)
+                    index.set_file(rel, extract_srcs(_read_json_text(path)))
+                except OSError as e:
+                    print(f"[WARN] Could not process {rel} ({e})")
+                    continue
+                updates = list(dict.fromkeys(result.updates))
+                log.write(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "reason": reason,
+                                      "file": rel, "changed": result.changed, "updates": updates},
+                                     ensure_ascii=False) + "\n")
+                if result.changed:
+                    print(f"[{reason}] {rel}: {len(updates)} update(s)" + (" (dry run)" if dry_run else ""))
+
+    n = 0
+    try:
+        while polls is None or n < polls:
+            n += 1
+            time.sleep(interval)
+
+            # CSV edits: diff old vs new outcome per indexed src
+            new_paths = sources()
+            new_sig = _csv_signature(new_paths)
+            if new_sig != csv_sig:
+                conflicts = [] if len(new_paths) > 1 else None
+                try:
+                    new_matcher = AltMatcher.from_csv(new_paths, cache_path=cache_path, precedence=precedence,
+                                                      conflicts=conflicts, fuzzy=fuzzy)
+                except Exception as e:
+                    print(f"[WARN] Could not reload CSV, keeping the previous mapping ({e})")
+                else:
+                    if conflicts is not None:
+                        write_conflicts_report(reports_dir / "alt-text-csv-conflicts.csv", conflicts)
+                    affected = [src for src in index.files_by_src
+                                if _match_outcome(matcher, src, rewrite_src) != _match_outcome(new_matcher, src, rewrite_src)]
+                    matcher, csv_paths = new_matcher, new_paths
+                    rels = index.files_for(affected)
+                    print(f"[csv] mapping reloaded: {len(affected)} srcs changed, {len(rels)} files to update")
+                    reprocess(rels, "csv")
+                csv_sig = new_sig
+
+            # JSON edits: new or modified files, and deletions
+            current = _scan_json_tree(json_root)
+            for rel in [r for r in stats if r not in current]:
+                del stats[rel]
+                index.drop_file(rel)
+            reprocess(sorted(rel for rel, st in current.items() if stats.get(rel) != st), "json")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if snapshot is not None and snapshot.finish():
+            print(f"Backup:     {_display_path(snapshot.snapshot_dir, script_dir)}")
+
+# ------------- Reference index (SQLite) -------------
+
+INDEX_VERSION = "1"
+
+class ImageRef(NamedTuple):
+    shape: str            # image (x.image.src) | imageSrc | tiptap (type:image attrs.src) | node (type:image src) | src
+    pointer: str          # JSON Pointer of the src value
+    src: str
+    alt: Optional[str]    # current alt next to it; None when there is none
+
+def iter_image_refs(data: Any) -> Iterator[ImageRef]:
+    """
+    Every src the walker would look at, in document order, with the alt stored
+    beside it. Plain "src" members are all reported (the walker only acts on them
+    when they look like images or the CSV knows them; see the index queries).
+    """
+    stack: List[Tuple[Any, str]] = [(data, "")]
+    nested: set = set()   # image/attrs srcs already reported by their parent node
+    while stack:
+        node, ptr = stack.pop()
+        if isinstance(node, dict):
+            image, attrs = node.get("image"), node.get("attrs")
+            if isinstance(image, dict) and "src" in image:
+                ref = ("image", ptr + "/image/src", image.get("src"), image.get("alt"))
+            elif "imageSrc" in node:
+                ref = ("imageSrc", ptr + "/imageSrc", node.get("imageSrc"), node.get("imageAlt"))
+            elif node.get("type") == "image" and isinstance(attrs, dict) and "src" in attrs:
+                ref = ("tiptap", ptr + "/attrs/src", attrs.get("src"), attrs.get("alt"))
+            elif "src" in node:
+                shape = "node" if node.get("type") == "image" else "src"
+                ref = (shape, ptr + "/src", node.get("src"), node.get("alt"))
+            else:
+                ref = None
+            if ref is not None and ref[2]:
+                shape, pointer, src, alt = ref
+                if shape in ("image", "tiptap"):
+                    nested.add(pointer)
+                if pointer in nested and shape == "src":
+                    nested.discard(pointer)
+                else:
+                    yield ImageRef(shape, pointer, str(src), alt if isinstance(alt, str) else None)
+            stack.extend((v, ptr + "/" + _pointer_token(k)) for k, v in reversed(node.items()))
+        elif isinstance(node, list):
+            stack.extend((node[i], f"{ptr}/{i}") for i in range(len(node) - 1, -1, -1))
+
+def open_index(db_path: Path) -> sqlite3.Connection:
+    db = sqlite3.connect(str(db_path))
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT);
+        CREATE TABLE IF NOT EXISTS refs (
+            path TEXT, pointer TEXT, shape TEXT, src TEXT, src_path TEXT, alt TEXT, is_image INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS refs_src_path ON refs(src_path);
+        CREATE INDEX IF NOT EXISTS refs_path ON refs(path);
+    """)
+    row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != INDEX_VERSION:
+        with db:
+            db.execute("DELETE FROM refs")
+            db.execute("DELETE FROM files")
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+    return db
+
+def update_index(db: sqlite3.Connection, json_root: Path) -> dict:
+    """
+    Bring the index up to date with json_root: only files whose size/mtime (and
+    then content hash) changed are re-read; deleted files are removed.
+    Returns the number of files and removed files, and the reindexed ("changed") paths.
+    """
+    current = _scan_json_tree(json_root)
+    known = {path: (size, mtime_ns, sha) for path, size, mtime_ns, sha in db.execute("SELECT * FROM files")}
+    removed = 0
+    changed: List[str] = []
+    with db:
+        for rel in known.keys() - current.keys():
+            db.execute("DELETE FROM refs WHERE path = ?", (rel,))
+            db.execute("DELETE FROM files WHERE path = ?", (rel,))
+            removed += 1
+        for rel in sorted(current):
+            size, mtime_ns = current[rel]
+            old = known.get(rel)
+            if old is not None and old[:2] == (size, mtime_ns):
+                continue
+            path = json_root / rel
+            try:
+                raw = path.read_bytes()
+            except OSError as e:
+                print(f"[WARN] Could not index {rel} ({e})")
+                continue
+            digest = hashlib.sha256(raw).hexdigest()
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (rel, size, mtime_ns, digest))
+            if old is not None and old[2] == digest:
+                continue
+            db.execute("DELETE FROM refs WHERE path = ?", (rel,))
+            changed.append(rel)
+            try:
+                text = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                text = raw.decode("latin-1")
+            try:
+                data = json.loads(text)
+            except Exception as e:
+                print(f"[WARN] Skipping non-JSON or invalid JSON: {path.name} ({e})")
+                continue
+            db.executemany(
+                "INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((rel, r.pointer, r.shape, r.src, path_only(r.src), r.alt, int(is_image_path(r.src)))
+                 for r in iter_image_refs(data)),
+            )
+    return {"files": len(current), "changed": changed, "removed": removed}
+
+def index_files_using(db: sqlite3.Connection, src: str) -> List[Tuple[str, str, str, Optional[str]]]:
+    """(file, pointer, shape, alt) of every reference to src (compared by URL path)."""
+    return db.execute(
+        "SELECT path, pointer, shape, alt FROM refs WHERE src_path = ? ORDER BY path, pointer",
+        (path_only(src),),
+    ).fetchall()
+
+def index_files_for_srcs(db: sqlite3.Connection, srcs: Iterable[str]) -> List[str]:
+    """Files holding any of the exact src strings."""
+    found = set()
+    for src in srcs:
+        found.update(path for (path,) in db.execute("SELECT DISTINCT path FROM refs WHERE src = ?", (src,)))
+    return sorted(found)
+
+def index_missing_alt(db: sqlite3.Connection) -> List[Tuple[str, str, str, str]]:
+    """(file, pointer, shape, src) of image references whose alt is missing or empty."""
+    return db.execute(
+        "SELECT path, pointer, shape, src FROM refs "
+        "WHERE (alt IS NULL OR alt = '') AND (shape != 'src' OR is_image = 1) ORDER BY path, pointer"
+    ).fetchall()
+
+def index_unmapped(db: sqlite3.Connection, matcher: AltMatcher) -> List[Tuple[str, int]]:
+    """(src, number of files) for image srcs the CSV has no alt for, most used first."""
+    rows = db.execute(
+        "SELECT src, MAX(shape != 'src' OR is_image = 1), COUNT(DISTINCT path) FROM refs GROUP BY src"
+    ).fetchall()
+    out = []
+    for src, is_image_ref, n in rows:
+        m = matcher.match(src)
+        if not m.alt and (is_image_ref or m.known):
+            out.append((src, n))
+    out.sort(key=lambda item: (-item[1], item[0]))
+    return out
+
+def run_index(
+    query: Optional[str] = None,
+    csv_sources: Union[str, Sequence[Path], None] = None,
+    precedence: str = "last",
+    *,
+    json_root: Optional[Path] = None,
+    reports_dir: Optional[Path] = None,
+) -> None:
+    """
+    Update reports/alt-text-index.sqlite, then optionally answer a query, as CSV on stdout:
+      uses:<src>   files and pointers referencing src
+      no-alt       image references with no alt
+      no-csv       image srcs the CSV has no alt for
+    """
+    script_dir = _script_dir()
+    reports_dir = Path(reports_dir) if reports_dir else script_dir / "reports"
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    db_path = reports_dir / "alt-text-index.sqlite"
+    db = open_index(db_path)
+    try:
+        stats = update_index(db, Path(json_root) if json_root else find_json_root())
+        print(f"Index:      {_display_path(db_path, script_dir)} ({stats['files']} files, "
+              f"{len(stats['changed'])} reindexed, {stats['removed']} removed)", file=sys.stderr)
+        if not query:
+            return
+        w = csv.writer(sys.stdout)
+        if query.startswith("uses:"):
+            w.writerow(["json_file", "pointer", "shape", "alt"])
+            w.writerows(index_files_using(db, query[len("uses:"):]))
+        elif query == "no-alt":
+            w.writerow(["json_file", "pointer", "shape", "src"])
+            w.writerows(index_missing_alt(db))
+        elif query == "no-csv":
+            csv_paths = resolve_csv_paths(csv_sources)
+            matcher = AltMatcher.from_csv(csv_paths, precedence=precedence)
+            w.writerow(["src", "json_files"])
+            w.writerows(index_unmapped(db, matcher))
+        else:
+            print(f"[WARN] Unknown index query {query!r} (use uses:<src>, no-alt or no-csv)", file=sys.stderr)
+    finally:
+        db.close()
+
+TARGETED_STATE_VERSION = 1
+
+def _load_targeted_state(state_path: Path, settings: tuple) -> Optional[tuple]:
+    """(mappings, {file: sha256}) of the last targeted run with the same settings, or None."""
+    try:
+        saved_settings, maps, hashes = marshal.loads(state_path.read_bytes())
+    except Exception:
+        return None
+    return (maps, hashes) if saved_settings == settings else None
+
+def update_alts_targeted(
+    dry_run: bool = False,
+    backup: bool = False,
+    rewrite_src: bool = False,
+    *,
+    fuzzy: int = 0,
+    mapping_cache: bool = False,
+    csv_sources: Union[str, Sequence[Path], None] = None,
+    precedence: str = "last",
+    json_root: Optional[Path] = None,
+    reports_dir: Optional[Path] = None,
+    **kwargs,
+) -> dict:
+    """
+    update_alts_rel over only the files a change can affect, found through the
+    reference index instead of parsing the whole tree:
+
+      - files that are new, or whose bytes changed, since the last targeted run;
+      - files referencing a src whose outcome (alt, known, rewrite) differs
+        between the previous run's mapping (reports/alt-text-targeted.state)
+        and the current one. Comparing outcomes per src covers every tier at
+        once (orig path/basename, relpath, basename, slug, fuzzy).
+
+    The first run, or one with other rewrite/fuzzy settings, processes every file.
+    The state only advances on runs that write, so dry runs can be repeated.
+    Other keyword arguments go to update_alts_rel.
+    """
+    reports_dir = Path(reports_dir) if reports_dir else _script_dir() / "reports"
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    json_root = Path(json_root) if json_root else find_json_root()
+    csv_paths = resolve_csv_paths(csv_sources)
+    if not csv_paths:
+        raise FileNotFoundError(f"No CSV found for: {csv_sources}")
+    cache_path = reports_dir / "alt-text-mapping.cache" if mapping_cache else None
+    conflicts: Optional[List[MappingConflict]] = [] if len(csv_paths) > 1 else None
+    matcher = AltMatcher.from_csv(csv_paths, cache_path=cache_path, precedence=precedence,
+                                  conflicts=conflicts, fuzzy=fuzzy)
+
+    state_path = reports_dir / "alt-text-targeted.state"
+    settings = (TARGETED_STATE_VERSION, marshal.version, bool(rewrite_src), fuzzy)
+    db = open_index(reports_dir / "alt-text-index.sqlite")
+    try:
+        update_index(db, json_root)
+        hashes = dict(db.execute("SELECT path, sha256 FROM files"))
+        state = _load_targeted_state(state_path, settings)
+        only: Optional[List[str]] = None
+        if state is None:
+            print("Targeted:   no previous mapping for these settings; processing every file")
+        else:
+            old_maps, old_hashes = state
+            edited = [rel for rel, digest in hashes.items() if old_hashes.get(rel) != digest]
+            old_matcher = AltMatcher(*old_maps, fuzzy=fuzzy)
+            affected: List[str] = []
+            if old_matcher.fingerprint() != matcher.fingerprint():
+                affected = [src for (src,) in db.execute("SELECT DISTINCT src FROM refs")
+                            if _match_outcome(old_matcher, src, rewrite_src) != _match_outcome(matcher, src, rewrite_src)]
+            only = sorted(set(index_files_for_srcs(db, affected)).union(edited))
+            print(f"Targeted:   {len(affected)} srcs changed, {len(edited)} files edited; "
+                  f"{len(only)} of {len(hashes)} files to process")
+
+        summary = update_alts_rel(dry_run=dry_run, backup=backup, rewrite_src=rewrite_src, fuzzy=fuzzy,
+                                  csv_sources=csv_sources, precedence=precedence, matcher=matcher,
+                                  conflicts=conflicts, only=only, json_root=json_root, reports_dir=reports_dir, **kwargs)
+
+        if not (dry_run or kwargs.get("patch")):
+            update_index(db, json_root)  # take in the files just rewritten
+            maps = (matcher.by_relpath, matcher.by_basename, matcher.by_slug,
+                    matcher.by_orig_map, matcher.alt_by_origpath, matcher.alt_by_origbase)
+            hashes = dict(db.execute("SELECT path, sha256 FROM files"))
+            _atomic_write_bytes(state_path, marshal.dumps((settings, maps, hashes)))
+    finally:
+        db.close()
+    return summary
+
+# ------------- HTTP service -------------
+
+class AltService:
+    """
+    One warm matcher shared by all requests. current() reloads it when the CSVs'
+    size/mtime change (checked at most every check_interval seconds); requests in
+    flight keep the matcher they started with. A failed reload keeps the old one.
+    """
+
+    def __init__(
+        self,
+        csv_sources: Union[str, Sequence[Path], None] = None,
+        *,
+        precedence: str = "last",
+        fuzzy: int = 0,
+        rewrite_src: bool = False,
+        cache_path: Optional[Path] = None,
+        check_interval: float = 1.0,
+    ):
+        self.csv_sources = csv_sources
+        self.precedence = precedence
+        self.fuzzy = fuzzy
+        self.rewrite_src = rewrite_src
+        self.cache_path = cache_path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self.csv_paths = resolve_csv_paths(csv_sources)
+        self._sig = _csv_signature(self.csv_paths)
+        self.matcher = self._load(self.csv_paths)
+
+    def _load(self, csv_paths: List[Path]) -> AltMatcher:
+        return AltMatcher.from_csv(csv_paths, cache_path=self.cache_path,
+                                   precedence=self.precedence, fuzzy=self.fuzzy)
+
+    def current(self) -> AltMatcher:
+        now = time.monotonic()
+        if now - self._checked < self.check_interval or not self._lock.acquire(blocking=False):
+            return self.matcher  # another thread is already checking/reloading
+        try:
+            self._checked = now
+            csv_paths = resolve_csv_paths(self.csv_sources)
+            sig = _csv_signature(csv_paths)
+            if sig != self._sig:
+                try:
+                    self.matcher = self._load(csv_paths)
+                    self.csv_paths = csv_paths
+                    self.reloads += 1
+                    print(f"[service] mapping reloaded from {', '.join(p.name for p in csv_paths)}")
+                except Exception as e:
+                    print(f"[WARN] Could not reload CSV, keeping the previous mapping ({e})")
+                self._sig = sig
+        finally:
+            self._lock.release()
+        return self.matcher
+
+    def apply(self, body: bytes, rewrite_src: Optional[bool] = None) -> dict:
+        """
+        Response for one page JSON; raises ValueError for invalid JSON and
+        RecursionError for a document nested too deeply to parse.
+        """
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            text = body.decode("latin-1")
+        result = update_document(json.loads(text), self.current(),
+                                 rewrite_src=self.rewrite_src if rewrite_src is None else rewrite_src)
+        return {
+            "document": result.document,
+            "changed": result.changed,
+            "updates": [{"old_src": old, "alt": alt, "new_src": new} for old, alt, new in result.updates],
+        }
+
+    def health(self) -> dict:
+        matcher = self.current()
+        return {"status": "ok", "csv": [str(p) for p in self.csv_paths],
+                "fingerprint": matcher.fingerprint(), "reloads": self.reloads}
+
+def make_server(service: AltService, host: str = "127.0.0.1", port: int = 8765):
+    """
+    A threading HTTP server (one thread per connection, keep-alive) around service:
+
+      POST /apply[?rewrite_src=0|1]  body: page JSON -> {"document", "changed", "updates"}
+      GET  /health                   -> {"status", "csv", "fingerprint", "reloads"}
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def _send(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlsplit(self.path).path == "/health":
+                self._send(200, service.health())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                self.close_connection = True  # the body's end is unknown, so the connection can't be reused
+                self._send(400, {"error": f"invalid Content-Length: {self.headers.get('Content-Length')!r}"})
+                return
+            body = self.rfile.read(length)
+            if url.path != "/apply":
+                self._send(404, {"error": "not found"})
+                return
+            flag = parse_qs(url.query).get("rewrite_src", [None])[-1]
+            rewrite_src = None if flag is None else flag.lower() in ("1","true","yes")
+            try:
+                self._send(200, service.apply(body, rewrite_src))
+            except ValueError as e:
+                self._send(400, {"error": f"invalid JSON: {e}"})
+            except RecursionError:
+                self._send(400, {"error": "invalid JSON: nested too deeply"})
+            except Exception as e:
+                # Always answer: an unhandled error would drop the connection without a reply
+                print(f"[WARN] /apply failed: {e!r}")
+                self._send(500, {"error": f"internal error: {e}"})
+
+        def log_message(self, format, *args):
+            pass  # per-request logging would dominate the latency
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+def serve(
+    address: str = "127.0.0.1:8765",
+    *,
+    csv_sources: Union[str, Sequence[Path], None] = None,
+    precedence: str = "last",
+    fuzzy: int = 0,
+    rewrite_src: bool = False,
+    mapping_cache: bool = False,
+    reports_dir: Optional[Path] = None,
+) -> None:
+    """Run the HTTP service on [host:]port until Ctrl+C (see make_server)."""
+    host, _, port = address.rpartition(":")
+    reports_dir = Path(reports_dir) if reports_dir else _script_dir() / "reports"
+    service = AltService(csv_sources, precedence=precedence, fuzzy=fuzzy, rewrite_src=rewrite_src,
+                         cache_path=reports_dir / "alt-text-mapping.cache" if mapping_cache else None)
+    server = make_server(service, host or "127.0.0.1", int(port))
+    print(f"Serving:    http://{server.server_address[0]}:{server.server_address[1]}/apply "
+          f"({', '.join(p.name for p in service.csv_paths)}; Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# ------------- Profiling -------------
+
+PROFILE_NAME = "alt-text-profile.txt"
+PROFILE_STATS_NAME = "alt-text-profile.pstats"
+PROFILE_MODES = ("cprofile", "sample")
+
+class StackSampler:
+    """
+    Low-overhead statistical profiler: every `interval` seconds of wall-clock time
+    (so waits on disk or network count too) it looks at the profiled thread's
+    Python stack and counts, per function, the samples it was running in ("self")
+    or anywhere on the stack ("total"). The profiled code is not instrumented, so
+    the run keeps close to its normal speed.
+
+    On the main thread of a POSIX system the samples come from a SIGALRM interval
+    timer, whose handler is given the interrupted frame. Elsewhere (Windows) a
+    background thread reads sys._current_frames(); it can only do so once it holds
+    the GIL, which skews its samples towards calls that release it (file I/O).
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Dict[str, int] = {}
+        self.total_counts: Dict[str, int] = {}
+        self._names: Dict[Any, str] = {}  # code object -> "file.py:line(function)"
+        self._thread_id = threading.get_ident()
+        self._signal = None
+        self._old_handler = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        import signal
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            self._signal = signal
+            self._old_handler = signal.signal(signal.SIGALRM, lambda _signum, frame: self._record(frame))
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        else:
+            self._thread = threading.Thread(target=self._run, name="alt-text-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._signal is not None:
+            self._signal.setitimer(self._signal.ITIMER_REAL, 0)
+            self._signal.signal(self._signal.SIGALRM, self._old_handler)
+        else:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._record(sys._current_frames().get(self._thread_id))
+
+    def _name(self, code) -> str:
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+        return name
+
+    def _record(self, frame) -> None:
+        if frame is None:
+            return
+        self.samples += 1
+        name = self._name(frame.f_code)
+        self.self_counts[name] = self.self_counts.get(name, 0) + 1
+        seen = set()
+        while frame is not None:
+            name = self._name(frame.f_code)
+            if name not in seen:  # recursive functions count once per sample
+                seen.add(name)
+                self.total_counts[name] = self.total_counts.get(name, 0) + 1
+            frame = frame.f_back
+
+    def report(self, top: int = 40) -> str:
+        """Functions ranked by own samples, then by total samples, with shares of the run."""
+        lines = [f"{self.samples} samples, one every {self.interval * 1000:g} ms of wall-clock time", ""]
+        for title, counts in (("Own time (function running)", self.self_counts),
+                              ("Total time (function or its callees running)", self.total_counts)):
+            lines += [title, f"{'samples':>9} {'share':>7} {'~seconds':>9}  function"]
+            for name, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:top]:
+                share = n / self.samples if self.samples else 0.0
+                lines.append(f"{n:>9} {share:>7.1%} {n * self.interval:>9.3f}  {name}")
+            lines.append("")
+        return "\n".join(lines)
+
+def profile_run(mode: str, run=None, *, top: int = 40, **kwargs) -> Optional[dict]:
+    """
+    Call run(**kwargs) (update_alts_rel by default, or update_alts_targeted) under
+    a profiler and write a ranked profile to reports/alt-text-profile.txt: the
+    functions that took the most time, then the run's stage times and slowest
+    files (metrics are always collected here).
+
+    mode "cprofile" uses the stdlib deterministic profiler: exact call counts, but
+    a slower run; its raw stats also go to alt-text-profile.pstats (open with
+    pstats or snakeviz). mode "sample" uses StackSampler. Only this process is
+    profiled, not pool workers. The profile is written even when the run is
+    interrupted (Ctrl+C), so a run that is taking too long can be stopped and
+    inspected. Runs without this pay nothing: nothing is hooked into the code.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r} (expected one of: {', '.join(PROFILE_MODES)})")
+    run = run or update_alts_rel
+    reports_dir = Path(kwargs["reports_dir"]) if kwargs.get("reports_dir") else _script_dir() / "reports"
+    if kwargs.get("shard"):
+        reports_dir = shard_reports_dir(reports_dir, *kwargs["shard"])
+    if _resolve_workers(kwargs.get("workers", 1)) > 1:
+        print("[WARN] Profiling this process only; files handled by worker processes are not in the profile "
+              "(use --workers 1)")
+    kwargs["metrics"] = True
+
+    summary = None
+    start = time.perf_counter()
+    if mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            summary = profiler.runcall(run, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            reports_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(reports_dir / PROFILE_STATS_NAME))
+            _write_profile(reports_dir, mode, wall, _cprofile_report(profiler, top), summary)
+    else:
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            summary = run(**kwargs)
+        finally:
+            sampler.stop()
+            wall = time.perf_counter() - start
+            reports_dir.mkdir(parents=True, exist_ok=True)
+            _write_profile(reports_dir, mode, wall, sampler.report(top), summary)
+    return summary
+
+def _cprofile_report(profiler, top: int) -> str:
+    import io
+    import pstats
+    buf = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buf).strip_dirs()
+    for order, title in (("tottime", "Own time (tottime)"), ("cumulative", "Total time (cumtime)")):
+        buf.write(f"{title}\n")
+        stats.sort_stats(order).print_stats(top)
+    return buf.getvalue()
+
+def _write_profile(reports_dir: Path, mode: str, wall: float, functions: str, summary: Optional[dict]) -> None:
+    """The ranked profile text: functions first, then stage times and slowest files from the run's metrics."""
+    path = reports_dir / PROFILE_NAME
+    lines = [f"Alt-text profile ({mode}): {wall:.3f}s wall-clock"
+             + ("" if summary is not None else " (run did not finish)"), "", functions.rstrip(), ""]
+    metrics = (summary or {}).get("metrics")
+    if metrics:
+        lines += ["Stages (seconds, summed over files)"]
+        lines += [f"{seconds:>12.6f}  {stage}" for stage, seconds in metrics["stages_seconds"].items()]
+        lines += ["", "Slowest files (seconds)"]
+        lines += [f"{item['seconds']:>12.6f}  {item['file']}" for item in metrics["slowest_files"]]
+        lines.append("")
+    path.write_text("\n".join(lines), encoding="utf-8")
+    shown = _display_path(reports_dir, _script_dir())
+    extra = f", raw stats in {PROFILE_STATS_NAME}" if mode == "cprofile" else ""
+    print(f"Profile:    {shown}/{PROFILE_NAME} (functions, stages and slowest files ranked{extra})")
+
 # ---------------- Runner ----------------
 
 def _in_notebook():
@@ -615,11 +3724,177 @@ def _in_notebook():
     except NameError:
         return False
 
-def main():
-    dry_run = (os.environ.get("ALT_DRY_RUN", "0").lower() in ("1","true","yes"))
-    backup  = (os.environ.get("ALT_BACKUP", "0").lower() in ("1","true","yes"))
-    rewrite = (os.environ.get("ALT_REWRITE_SRC", "0").lower() in ("1","true","yes"))
-    update_alts_rel(dry_run=dry_run, backup=backup, rewrite_src=rewrite)
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "0").lower() in ("1","true","yes")
+
+def _env_profile() -> Optional[str]:
+    """ALT_PROFILE: 1 means cProfile; a mode name picks that mode."""
+    value = os.environ.get("ALT_PROFILE", "").strip().lower()
+    if value in ("", "0", "false", "no"):
+        return None
+    return "cprofile" if value in ("1", "true", "yes") else value
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise SystemExit(f"{name} expects a whole number, got {value!r}") from None
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise SystemExit(f"{name} expects a number, got {value!r}") from None
+
+def build_arg_parser():
+    """Command-line options; each defaults to its ALT_* environment variable."""
+    import argparse
+    p = argparse.ArgumentParser(
+        description="Update image alt text in JSON files from a CSV mapping.",
+        epilog="Every option defaults to the ALT_* environment variable named in brackets. "
+               "Without --csv/--json-root/--reports-dir, paths are next to this script.",
+    )
+    paths = p.add_argument_group("paths")
+    paths.add_argument("--csv", action="append", metavar="PATH",
+                       help="CSV file, folder of *.csv or glob; repeat for several [ALT_CSV]")
+    paths.add_argument("--json-root", type=Path, metavar="DIR", help="folder of *.json files (default: jsonFiles/)")
+    paths.add_argument("--reports-dir", type=Path, metavar="DIR", help="reports, caches and index (default: reports/)")
+    paths.add_argument("--backup-dir", type=Path, metavar="DIR", help="snapshot store (default: backup_jsonFiles/)")
+
+    run = p.add_argument_group("run")
+    run.add_argument("--dry-run", action="store_true", default=_env_flag("ALT_DRY_RUN"), help="preview only [ALT_DRY_RUN]")
+    run.add_argument("--backup", action="store_true", default=_env_flag("ALT_BACKUP"), help="snapshot originals [ALT_BACKUP]")
+    run.add_argument("--rewrite-src", action="store_true", default=_env_flag("ALT_REWRITE_SRC"),
+                     help="rewrite srcs to the CSV's paths [ALT_REWRITE_SRC]")
+    run.add_argument("--workers", type=int, default=_env_int("ALT_WORKERS", 1), metavar="N",
+                     help="worker processes, 0 = one per CPU [ALT_WORKERS]")
+    run.add_argument("--incremental", action="store_true", default=_env_flag("ALT_INCREMENTAL"),
+                     help="skip files unchanged since the last run [ALT_INCREMENTAL]")
+    run.add_argument("--stream-min-bytes", type=int, default=_env_int("ALT_STREAM_MIN_BYTES", None), metavar="N",
+                     help="stream files of N bytes or more [ALT_STREAM_MIN_BYTES]")
+    run.add_argument("--pipeline", type=int, default=_env_int("ALT_PIPELINE", 0), metavar="N",
+                     help="read ahead / write behind N files [ALT_PIPELINE]")
+    run.add_argument("--shard", metavar="K/N", default=os.environ.get("ALT_SHARD", "").strip() or None,
+                     help="process only shard K (0..N-1) of N, by path hash [ALT_SHARD]")
+    run.add_argument("--no-dedupe", dest="dedupe", action="store_false",
+                     default=os.environ.get("ALT_DEDUPE", "1").lower() in ("1","true","yes"),
+                     help="process byte-identical files separately [ALT_DEDUPE=0]")
+    run.add_argument("--no-prefilter", dest="prefilter", action="store_false",
+                     default=os.environ.get("ALT_PREFILTER", "1").lower() in ("1","true","yes"),
+                     help="parse every file, even ones that cannot need changes [ALT_PREFILTER=0]")
+    run.add_argument("--fuzzy", type=int, default=_env_int("ALT_FUZZY", 0), metavar="N",
+                     help="accept slugs within N typos [ALT_FUZZY]")
+    run.add_argument("--mapping-cache", action="store_true", default=_env_flag("ALT_MAPPING_CACHE"),
+                     help="cache the parsed CSV [ALT_MAPPING_CACHE]")
+    run.add_argument("--precedence", choices=("first", "last"),
+                     default=os.environ.get("ALT_CSV_PRECEDENCE", "last").strip().lower() or "last",
+                     help="which CSV wins when several give an alt [ALT_CSV_PRECEDENCE]")
+
+    out = p.add_argument_group("output")
+    out.add_argument("--patch", action="store_true", default=_env_flag("ALT_PATCH"),
+                     help="write a JSON Patch file instead of the JSON files [ALT_PATCH]")
+    out.add_argument("--preview", choices=tuple(PREVIEW_FORMATS),
+                     default=os.environ.get("ALT_PREVIEW", "").strip().lower() or None,
+                     help="render the changed fields as HTML or a unified diff in reports/ [ALT_PREVIEW]")
+    out.add_argument("--jsonl-out", metavar="PATH", default=os.environ.get("ALT_JSONL_OUT", "").strip() or "-",
+                     help='where --jsonl-in records go ("-" = stdout, the default) [ALT_JSONL_OUT]')
+    out.add_argument("--metrics", action="store_true", default=_env_flag("ALT_METRICS"),
+                     help="add stage timings to the summary [ALT_METRICS]")
+    out.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILE_MODES, default=_env_profile(),
+                     help="profile the run (cprofile, or sample for a low-overhead sampler) and write a "
+                          "ranked profile to reports/ [ALT_PROFILE]")
+    out.add_argument("--metrics-file", type=Path, default=os.environ.get("ALT_METRICS_FILE") or None, metavar="PATH",
+                     help="also write the metrics here [ALT_METRICS_FILE]")
+
+    modes = p.add_argument_group("modes").add_mutually_exclusive_group()
+    modes.add_argument("--restore", metavar="NAME", default=os.environ.get("ALT_RESTORE", "").strip() or None,
+                       help='restore a snapshot ("latest" or its name) and exit [ALT_RESTORE]')
+    modes.add_argument("--targeted", action="store_true", default=_env_flag("ALT_TARGETED"),
+                       help="only files a CSV or JSON change can affect [ALT_TARGETED]")
+    modes.add_argument("--watch", action="store_true", default=_env_flag("ALT_WATCH"),
+                       help="keep running and reprocess changes [ALT_WATCH]")
+    modes.add_argument("--index", action="store_true", default=_env_flag("ALT_INDEX"),
+                       help="only refresh the image reference index [ALT_INDEX]")
+    modes.add_argument("--serve", metavar="[HOST:]PORT", default=os.environ.get("ALT_SERVE", "").strip() or None,
+                       help="run the HTTP service (POST /apply) [ALT_SERVE]")
+    modes.add_argument("--merge-shards", type=int, metavar="N", default=_env_int("ALT_MERGE_SHARDS", None),
+                       help="combine the reports of shards 0..N-1 into one run's reports [ALT_MERGE_SHARDS]")
+    modes.add_argument("--jsonl-in", metavar="PATH", default=os.environ.get("ALT_JSONL_IN", "").strip() or None,
+                       help='update a JSON Lines stream ("-" = stdin) instead of jsonFiles/ [ALT_JSONL_IN]')
+    modes.add_argument("--query", metavar="Q", default=os.environ.get("ALT_INDEX_QUERY", "").strip() or None,
+                       help="refresh the index and answer uses:<src> | no-alt | no-csv [ALT_INDEX_QUERY]")
+    p.add_argument("--interval", type=float, default=_env_float("ALT_WATCH_INTERVAL", 1.0),
+                   metavar="S", help="seconds between checks in watch mode [ALT_WATCH_INTERVAL]")
+    return p
+
+def main(argv: Optional[Sequence[str]] = None):
+    args = build_arg_parser().parse_args(argv)
+    # Explicit --csv entries are relative to the working directory; ALT_CSV to the script's folder
+    if args.csv:
+        csv_sources: Union[str, Sequence[Path], None] = os.pathsep.join(os.path.abspath(c) for c in args.csv)
+    else:
+        csv_sources = os.environ.get("ALT_CSV") or None
+    where = dict(json_root=args.json_root, reports_dir=args.reports_dir)
+
+    shard = None
+    if args.shard:
+        try:
+            k, n = (int(x) for x in args.shard.split("/"))
+            shard_reports_dir(Path("."), k, n)
+        except ValueError:
+            raise SystemExit(f"--shard expects K/N with 0 <= K < N, got {args.shard!r}")
+        shard = (k, n)
+        if args.targeted:
+            raise SystemExit("--shard can't be combined with --targeted (its state is per tree, not per shard)")
+
+    if args.preview and args.preview not in PREVIEW_FORMATS:
+        # argparse only checks choices given on the command line, not ALT_PREVIEW
+        raise SystemExit(f"ALT_PREVIEW expects one of: {', '.join(PREVIEW_FORMATS)}, got {args.preview!r}")
+    if args.profile and args.profile not in PROFILE_MODES:
+        raise SystemExit(f"ALT_PROFILE expects 1 or one of: {', '.join(PROFILE_MODES)}, got {args.profile!r}")
+
+    if args.restore:
+        restore_snapshot(args.restore, json_root=args.json_root, backup_dir=args.backup_dir)
+        return
+    if args.query or args.index:
+        run_index(args.query, csv_sources=csv_sources, precedence=args.precedence, **where)
+        return
+    if args.merge_shards:
+        merge_shard_reports(args.merge_shards, reports_dir=args.reports_dir)
+        return
+    if args.jsonl_in:
+        update_jsonl(args.jsonl_in, args.jsonl_out, rewrite_src=args.rewrite_src, workers=args.workers,
+                     fuzzy=args.fuzzy, mapping_cache=args.mapping_cache, csv_sources=csv_sources,
+                     precedence=args.precedence, reports_dir=args.reports_dir)
+        return
+    if args.serve:
+        serve(args.serve, csv_sources=csv_sources, precedence=args.precedence, fuzzy=args.fuzzy,
+              rewrite_src=args.rewrite_src, mapping_cache=args.mapping_cache, reports_dir=args.reports_dir)
+        return
+    if args.watch:
+        watch(dry_run=args.dry_run, backup=args.backup, rewrite_src=args.rewrite_src,
+              interval=args.interval, stream_min_bytes=args.stream_min_bytes,
+              fuzzy=args.fuzzy, mapping_cache=args.mapping_cache, csv_sources=csv_sources,
+              precedence=args.precedence, backup_dir=args.backup_dir, **where)
+        return
+    run = update_alts_targeted if args.targeted else update_alts_rel
+    options = dict(
+        dry_run=args.dry_run, backup=args.backup, rewrite_src=args.rewrite_src, workers=args.workers,
+        incremental=args.incremental, stream_min_bytes=args.stream_min_bytes,
+        metrics=args.metrics, metrics_file=args.metrics_file,
+        patch=args.patch, pipeline=args.pipeline, fuzzy=args.fuzzy, mapping_cache=args.mapping_cache,
+        csv_sources=csv_sources, precedence=args.precedence, backup_dir=args.backup_dir, shard=shard,
+        dedupe=args.dedupe, prefilter=args.prefilter, preview=args.preview, **where)
+    if args.profile:
+        profile_run(args.profile, run, **options)
+    else:
+        run(**options)
 
 if __name__ == "__main__":
     main()